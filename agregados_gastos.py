@@ -0,0 +1,206 @@
+"""
+Agregados de gasto para Control de Gastos.
+
+Vista materializada del libro de compras con:
+  - el gasto (importe, cantidad y número de compras) por mes × familia ×
+    proveedor;
+  - la serie de precios unitarios de cada producto, ordenada por fecha.
+Se construye una vez al cargar el libro y después se actualiza solo con las
+filas añadidas o corregidas, así que los paneles de gasto y las comparativas
+entre periodos consultan unos pocos miles de celdas en vez de reagrupar todo
+el historial.
+"""
+import threading
+from bisect import bisect_left, insort
+
+import numpy as np
+import pandas as pd
+
+from libro_compras import obtener_libro
+
+DIMENSIONES = ('mes', 'familia', 'proveedor')
+MEDIDAS = ('importe', 'cantidad', 'compras')
+SIN_FECHA = ''
+
+# Las fechas de las series se guardan como enteros (ns); como en precios.py,
+# las filas sin fecha cuentan como las más recientes
+_SIN_FECHA = np.iinfo(np.int64).max
+
+
+def _mes(valor):
+    """
+    'YYYY-MM' de una fecha, un texto de fecha o un mes ya en ese formato.
+    """
+    if valor is None:
+        return None
+    if isinstance(valor, str) and len(valor) == 7:
+        return valor
+    return pd.Timestamp(valor).strftime('%Y-%m')
+
+
+def _texto_mes(numero):
+    return SIN_FECHA if numero < 0 else f'{numero // 100:04d}-{numero % 100:02d}'
+
+
+def _medidas(df):
+    # El mes se agrupa como número (AAAAMM) y solo se formatea cada grupo
+    fechas = df['_fecha']
+    return pd.DataFrame({
+        'mes': (fechas.dt.year * 100 + fechas.dt.month).fillna(-1).astype(int).to_numpy(),
+        'familia': df['_familia'].to_numpy(),
+        'proveedor': df['_proveedor'].to_numpy(),
+        'importe': pd.to_numeric(df['Importe'], errors='coerce').fillna(0.0).to_numpy(),
+        'cantidad': pd.to_numeric(df['Cantidad'], errors='coerce').fillna(0.0).to_numpy(),
+        'compras': 1})
+
+
+class AgregadosGastos:
+
+    def __init__(self, libro=None):
+        self.libro = libro
+        self._lock = threading.RLock()
+        self.reconstruir(None)
+
+    # --- Mantenimiento (protocolo de vistas del libro) ---
+
+    def reconstruir(self, df):
+        with self._lock:
+            self._celdas = {}
+            self._series = {}
+            self._tabla = None
+            if df is not None and len(df):
+                self._sumar(df, 1)
+                self._crear_series(df)
+
+    def agregar(self, df_nuevas):
+        with self._lock:
+            self._sumar(df_nuevas, 1)
+            for fila in self._filas_serie(df_nuevas):
+                insort(self._series.setdefault(fila[0], []), fila[1:])
+
+    def corregir(self, antes, despues):
+        with self._lock:
+            self._sumar(antes, -1)
+            self._sumar(despues, 1)
+            for fila in self._filas_serie(antes):
+                serie = self._series.get(fila[0], [])
+                pos = bisect_left(serie, fila[1:3])
+                if pos < len(serie) and serie[pos][:2] == fila[1:3]:
+                    del serie[pos]
+            for fila in self._filas_serie(despues):
+                insort(self._series.setdefault(fila[0], []), fila[1:])
+
+    def _sumar(self, df, signo):
+        grupos = _medidas(df).groupby(list(DIMENSIONES), sort=False).sum()
+        for (mes, familia, proveedor), (importe, cantidad, compras) in zip(grupos.index, grupos.to_numpy()):
+            clave = (_texto_mes(mes), familia, proveedor)
+            celda = self._celdas.setdefault(clave, [0.0, 0.0, 0])
+            celda[0] += signo * importe
+            celda[1] += signo * cantidad
+            celda[2] += signo * int(compras)
+            if celda[2] <= 0:
+                del self._celdas[clave]
+        self._tabla = None
+
+    @staticmethod
+    def _filas_serie(df):
+        """
+        (producto, fecha, id, proveedor, precio) de cada fila; las tuplas
+        sin el producto se ordenan por fecha y, a igual fecha, por alta.
+        """
+        fechas = df['_fecha'].to_numpy(dtype='datetime64[ns]')
+        fechas = np.where(np.isnat(fechas), _SIN_FECHA, fechas.view(np.int64))
+        precios = pd.to_numeric(df['Precio Unitario'], errors='coerce').to_numpy(dtype=float)
+        return zip(df['_producto'], fechas.tolist(), df['_id'].tolist(), df['_proveedor'], precios.tolist())
+
+    def _crear_series(self, df):
+        # En bloque: se ordena una vez por (producto, fecha, id) y se corta por producto
+        codigos, productos = pd.factorize(df['_producto'])
+        filas = list(self._filas_serie(df))
+        orden = np.lexsort((df['_id'].to_numpy(), [f[1] for f in filas], codigos))
+        cortes = np.flatnonzero(np.diff(codigos[orden])) + 1
+        for trozo in np.split(orden, cortes):
+            if len(trozo):
+                self._series[productos[codigos[trozo[0]]]] = [filas[i][1:] for i in trozo]
+
+    # --- Consultas ---
+
+    def _al_dia(self):
+        if self.libro is not None:
+            self.libro.datos()  # recarga si el Excel ha cambiado en disco
+
+    def tabla(self):
+        """
+        DataFrame con una fila por mes × familia × proveedor y las columnas
+        importe, cantidad y compras.
+        """
+        self._al_dia()
+        with self._lock:
+            if self._tabla is None:
+                claves = list(self._celdas)
+                valores = list(self._celdas.values())
+                self._tabla = pd.DataFrame(
+                    {**dict(zip(DIMENSIONES, zip(*claves))), **dict(zip(MEDIDAS, zip(*valores)))}
+                    if claves else {c: [] for c in DIMENSIONES + MEDIDAS})
+            return self._tabla
+
+    def totales(self, por=('mes',), desde=None, hasta=None, familia=None, proveedor=None):
+        """
+        Gasto agrupado por las dimensiones de `por` ('mes', 'familia',
+        'proveedor'). `desde` y `hasta` son meses incluidos (fechas o 'YYYY-MM').
+        """
+        tabla = self.tabla()
+        filtro = np.ones(len(tabla), dtype=bool)
+        if desde is not None:
+            filtro &= (tabla['mes'] >= _mes(desde)).to_numpy()
+        if hasta is not None:
+            filtro &= (tabla['mes'] <= _mes(hasta)).to_numpy() & (tabla['mes'] != SIN_FECHA).to_numpy()
+        if familia is not None:
+            filtro &= (tabla['familia'] == familia.upper()).to_numpy()
+        if proveedor is not None:
+            filtro &= (tabla['proveedor'] == proveedor.upper()).to_numpy()
+        return tabla[filtro].groupby(list(por))[list(MEDIDAS)].sum().sort_index()
+
+    def comparar(self, periodo_a, periodo_b, por='familia'):
+        """
+        Importe de dos periodos (pares desde, hasta) lado a lado, con la
+        diferencia y la variación en %.
+        """
+        a = self.totales((por,), *periodo_a)['importe']
+        b = self.totales((por,), *periodo_b)['importe']
+        resultado = pd.concat({'importe_a': a, 'importe_b': b}, axis=1).fillna(0.0)
+        resultado['diferencia'] = resultado['importe_b'] - resultado['importe_a']
+        resultado['variacion'] = 100 * resultado['diferencia'] / resultado['importe_a'].where(resultado['importe_a'] != 0)
+        return resultado.sort_values('importe_b', ascending=False)
+
+    def serie_precios(self, producto, proveedor=None):
+        """
+        DataFrame (fecha, proveedor, precio) con las compras de un producto
+        ordenadas por fecha, opcionalmente de un solo proveedor.
+        """
+        self._al_dia()
+        with self._lock:
+            serie = list(self._series.get(producto.upper(), ()))
+        if proveedor is not None:
+            serie = [f for f in serie if f[2] == proveedor.upper()]
+        fechas = np.array([f[0] for f in serie], dtype=np.int64)
+        return pd.DataFrame({
+            'fecha': pd.to_datetime(np.where(fechas == _SIN_FECHA, np.iinfo(np.int64).min, fechas), unit='ns'),
+            'proveedor': [f[2] for f in serie],
+            'precio': [f[3] for f in serie]})
+
+
+_agregados = None
+_agregados_lock = threading.Lock()
+
+
+def obtener_agregados():
+    """
+    Agregados de gasto compartidos, registrados como vista del libro.
+    """
+    global _agregados
+    with _agregados_lock:
+        if _agregados is None:
+            libro = obtener_libro()
+            _agregados = libro.registrar_vista(AgregadosGastos(libro))
+        return _agregados
@@ -0,0 +1,155 @@
+"""
+Almacén de compras en SQLite.
+
+Es la fuente de verdad del libro de compras: añadir o corregir una línea es
+una transacción pequeña, independiente del tamaño del historial, y un corte
+a mitad de escritura no deja el archivo a medias (SQLite en modo WAL). El
+Excel contabilidad_bar.xlsx pasa a ser una exportación que se regenera en
+segundo plano.
+"""
+import datetime
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from excel_utils import ARCHIVO
+
+ARCHIVO_DB = os.path.splitext(ARCHIVO)[0] + '.db'
+
+# Columna del Excel -> columna de la tabla
+CAMPOS = {
+    'Producto': 'producto',
+    'Familia': 'familia',
+    'Proveedor': 'proveedor',
+    'Cantidad': 'cantidad',
+    'Precio Unitario': 'precio_unitario',
+    'Importe': 'importe',
+    'Fecha': 'fecha'}
+
+_INSERTAR = f"INSERT INTO compras ({', '.join(CAMPOS.values())}) VALUES ({', '.join('?' * len(CAMPOS))})"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS compras (
+    id INTEGER PRIMARY KEY,
+    producto TEXT,
+    familia TEXT,
+    proveedor TEXT,
+    cantidad REAL,
+    precio_unitario REAL,
+    importe REAL,
+    fecha TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+
+def _valores(df):
+    """
+    Filas de `df` listas para sqlite3 (None en vez de NaN, fechas como texto).
+    """
+    df = df.reindex(columns=list(CAMPOS)).astype(object)
+    fechas = df['Fecha']
+    es_fecha = fechas.map(lambda v: isinstance(v, datetime.date))
+    df.loc[es_fecha, 'Fecha'] = fechas[es_fecha].map(lambda v: v.strftime('%d/%m/%Y'))
+    df = df.where(pd.notna(df), None)
+    return [tuple(v.item() if hasattr(v, 'item') else v for v in fila)
+            for fila in df.itertuples(index=False, name=None)]
+
+
+def _escribir_meta(con, valores):
+    con.executemany('INSERT OR REPLACE INTO meta (clave, valor) VALUES (?, ?)',
+                    [(k, None if v is None else str(v)) for k, v in valores.items()])
+
+
+class AlmacenCompras:
+
+    def __init__(self, ruta=ARCHIVO_DB):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._con.execute('PRAGMA journal_mode=WAL')
+        self._con.execute('PRAGMA synchronous=FULL')
+        self._con.executescript(_ESQUEMA)
+
+    def _transaccion(self, operacion):
+        with self._lock:
+            self._con.execute('BEGIN IMMEDIATE')
+            try:
+                resultado = operacion(self._con)
+            except BaseException:
+                self._con.execute('ROLLBACK')
+                raise
+            self._con.execute('COMMIT')
+            return resultado
+
+    def vacio(self):
+        with self._lock:
+            return self._con.execute('SELECT 1 FROM compras LIMIT 1').fetchone() is None
+
+    def leer(self):
+        """
+        Todas las compras en orden de alta, con los nombres de columna del
+        Excel y el identificador en la columna `_id`.
+        """
+        columnas = ', '.join(f'{col} AS "{nombre}"' for nombre, col in CAMPOS.items())
+        with self._lock:
+            df = pd.read_sql_query(f'SELECT id AS _id, {columnas} FROM compras ORDER BY id', self._con)
+        return df[list(CAMPOS) + ['_id']]
+
+    def agregar(self, df):
+        """
+        Inserta las filas en una sola transacción y devuelve sus ids.
+        """
+        filas = _valores(df)
+
+        def operacion(con):
+            ids = []
+            for fila in filas:
+                ids.append(con.execute(_INSERTAR, fila).lastrowid)
+            return ids
+        return self._transaccion(operacion)
+
+    def actualizar(self, id_fila, valores):
+        """
+        Corrige en su sitio una compra. `valores` usa los nombres del Excel.
+        """
+        asignaciones = ', '.join(f'{CAMPOS[c]} = ?' for c in CAMPOS if c in valores)
+        fila = _valores(pd.DataFrame([valores]))[0]
+        fila = [v for c, v in zip(CAMPOS, fila) if c in valores]
+        self._transaccion(lambda con: con.execute(
+            f'UPDATE compras SET {asignaciones} WHERE id = ?', (*fila, int(id_fila))))
+
+    def reemplazar(self, df, exportadas=0, **meta):
+        """
+        Sustituye todo el libro (importación desde el Excel) y devuelve los
+        ids. Los ids vuelven a empezar, así que en la misma transacción se
+        apunta como `ultimo_exportado` el id de la última de las
+        `exportadas` primeras filas (las que ya están en el Excel), junto
+        con el resto de `meta`.
+        """
+        filas = _valores(df)
+
+        def operacion(con):
+            con.execute('DELETE FROM compras')
+            con.executemany(_INSERTAR, filas)
+            ids = [fila[0] for fila in con.execute('SELECT id FROM compras ORDER BY id')]
+            _escribir_meta(con, {**meta, 'ultimo_exportado': ids[exportadas - 1] if exportadas else 0})
+            return ids
+        return self._transaccion(operacion)
+
+    def ultimo_id(self):
+        with self._lock:
+            return self._con.execute('SELECT COALESCE(MAX(id), 0) FROM compras').fetchone()[0]
+
+    def leer_meta(self, clave, defecto=None):
+        with self._lock:
+            fila = self._con.execute('SELECT valor FROM meta WHERE clave = ?', (clave,)).fetchone()
+        return defecto if fila is None else fila[0]
+
+    def escribir_meta(self, **valores):
+        self._transaccion(lambda con: _escribir_meta(con, valores))
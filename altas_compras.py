@@ -0,0 +1,166 @@
+"""
+Alta de varias líneas de compra a la vez (un albarán entero, una rejilla).
+
+`agregar_lineas` hace para todo el lote lo que el formulario hace para una
+línea: valida los campos, completa la familia, calcula el precio unitario,
+compara con el último precio del proveedor y guarda. La diferencia es que
+todo se escribe de una vez: una transacción en el almacén, una exportación
+del Excel y una sola escritura de la hoja Familias para los productos cuya
+familia es nueva. `preparar_lineas` hace lo mismo sin guardar, para revisar
+el lote (familias propuestas y alertas) antes de confirmarlo. Las líneas
+que ya están en el libro (ver duplicados.py) se marcan como repetidas.
+"""
+from collections import namedtuple
+from datetime import date, datetime
+
+import pandas as pd
+
+from excel_utils import actualizar_familias_excel
+from libro_compras import obtener_libro
+from indice_productos import obtener_indice
+from precios import obtener_precios
+from clasificador_familias import clasificador_para, registrar_familia, SIN_FAMILIA
+from duplicados import obtener_duplicados, clave
+from parseo import a_numero
+
+CAMPOS_OBLIGATORIOS = ('Producto', 'Proveedor', 'Cantidad', 'Importe', 'Fecha')
+FORMATO_FECHA = '%d/%m/%Y'
+
+# Alerta de precio de cada línea, como la etiqueta del formulario
+NUEVO = 'nuevo'
+MAS_CARO = 'mas_caro'
+MAS_BARATO = 'mas_barato'
+IGUAL = 'igual'
+
+LoteLineas = namedtuple('LoteLineas', ['filas', 'errores', 'alertas', 'familias_nuevas', 'repetidas'])
+Alerta = namedtuple('Alerta', ['indice', 'tipo', 'ultimo'])
+
+
+def _texto(valor):
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return ''
+    return str(valor).strip().upper()
+
+
+def _fecha(valor):
+    if isinstance(valor, (date, datetime, pd.Timestamp)):
+        return pd.Timestamp(valor).strftime(FORMATO_FECHA)
+    return pd.to_datetime(str(valor).strip(), format=FORMATO_FECHA).strftime(FORMATO_FECHA)
+
+
+def validar_linea(linea):
+    """
+    Fila lista para el libro a partir de un dict con las columnas del Excel
+    (la familia y el precio unitario pueden faltar). Lanza ValueError con
+    el motivo si la línea no es válida.
+    """
+    faltan = [c for c in CAMPOS_OBLIGATORIOS if _texto(linea.get(c)) == '']
+    if faltan:
+        raise ValueError(f'Faltan campos: {", ".join(faltan)}')
+    # Tecleado a mano, un punto solo es decimal, como con float() en el
+    # formulario: '1.500' kg son 1,5 y '3.750' € son 3,75 (ver parseo.a_numero)
+    cantidad = a_numero(linea['Cantidad'], precio=True)
+    importe = a_numero(linea['Importe'], precio=True)
+    if cantidad is None or importe is None or pd.isna(cantidad) or pd.isna(importe):
+        raise ValueError('Cantidad e importe deben ser números')
+    if cantidad <= 0:
+        raise ValueError('La cantidad debe ser mayor que cero')
+    try:
+        fecha = _fecha(linea['Fecha'])
+    except (TypeError, ValueError):
+        raise ValueError(f'Fecha no válida (se espera DD/MM/AAAA): {linea["Fecha"]}') from None
+    return {
+        'Producto': _texto(linea['Producto']),
+        'Familia': _texto(linea.get('Familia')),
+        'Proveedor': _texto(linea['Proveedor']),
+        'Cantidad': cantidad,
+        'Precio Unitario': importe / cantidad,
+        'Importe': importe,
+        'Fecha': fecha}
+
+
+def alerta_precio(producto, proveedor, precio):
+    """
+    (tipo, último precio) comparando con la última compra del par.
+    """
+    historial = obtener_precios().consultar(producto, proveedor)
+    if historial is None:
+        return (NUEVO, None)
+    ultimo = historial.ultimo
+    if precio > ultimo:
+        return (MAS_CARO, ultimo)
+    if precio < ultimo:
+        return (MAS_BARATO, ultimo)
+    return (IGUAL, ultimo)
+
+
+def preparar_lineas(lineas, df_familias=None):
+    """
+    Valida y completa un lote sin guardarlo. Devuelve un LoteLineas con:
+      - filas: las líneas válidas, ya con familia y precio unitario.
+      - errores: lista de (posición en `lineas`, motivo).
+      - alertas: una Alerta por fila válida (posición, tipo, último precio).
+      - familias_nuevas: {producto: familia} que hay que llevar a la hoja
+        Familias (familias escritas a mano distintas de la registrada).
+      - repetidas: posiciones de las filas válidas que ya están en el libro.
+    Las familias que faltan se toman del índice de productos y, si se pasa
+    `df_familias`, del clasificador para los productos desconocidos.
+    """
+    indice = obtener_indice()
+    clasificador = clasificador_para(df_familias) if df_familias is not None else None
+    filas = []
+    errores = []
+    alertas = []
+    familias_nuevas = {}
+    for posicion, linea in enumerate(lineas):
+        try:
+            fila = validar_linea(linea)
+        except ValueError as e:
+            errores.append((posicion, str(e)))
+            continue
+        producto = fila['Producto']
+        conocida = familias_nuevas.get(producto) or indice.familia_de(producto)
+        if not fila['Familia']:
+            fila['Familia'] = conocida or (clasificador.clasificar(producto) if clasificador else SIN_FAMILIA)
+        elif fila['Familia'] != conocida:
+            familias_nuevas[producto] = fila['Familia']
+        if not fila['Familia']:
+            errores.append((posicion, f'No se conoce la familia de {producto}'))
+            continue
+        filas.append(fila)
+        alertas.append(Alerta(posicion, *alerta_precio(producto, fila['Proveedor'], fila['Precio Unitario'])))
+    claves = [clave(f['Proveedor'], f['Fecha'], f['Importe'], f['Producto'], f['Cantidad']) for f in filas]
+    repetidas = [a.indice for a, r in zip(alertas, obtener_duplicados().repetidas(claves)) if r]
+    return LoteLineas(filas, errores, alertas, familias_nuevas, repetidas)
+
+
+def _actualizar_familias(familias):
+    for producto, familia in familias.items():
+        actualizar_familias_excel(producto, familia)
+
+
+def agregar_lineas(lineas, df_familias=None, parcial=False, saltar_repetidas=False):
+    """
+    Valida, completa y guarda un lote de líneas (dicts con las columnas del
+    Excel) en una sola transacción. Si alguna línea tiene errores no se
+    guarda nada, salvo con `parcial=True`, que guarda las válidas. Con
+    `saltar_repetidas=True` no se guardan las que ya están en el libro.
+    Devuelve el LoteLineas de preparar_lineas; sus filas solo se han
+    guardado si no hay errores o `parcial` es cierto.
+    """
+    lote = preparar_lineas(lineas, df_familias)
+    filas = lote.filas
+    if saltar_repetidas and lote.repetidas:
+        repetidas = set(lote.repetidas)
+        filas = [f for f, a in zip(lote.filas, lote.alertas) if a.indice not in repetidas]
+    if not filas or (lote.errores and not parcial):
+        return lote
+    libro = obtener_libro()
+    libro.agregar_filas(filas)
+    if lote.familias_nuevas:
+        libro.escribir_excel(_actualizar_familias, lote.familias_nuevas)
+        indice = obtener_indice()
+        for producto, familia in lote.familias_nuevas.items():
+            indice.registrar_familia(producto, familia)
+            registrar_familia(producto, familia)
+    return lote
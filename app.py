@@ -4,119 +4,321 @@ from google.oauth2.service_account import Credentials
 import pandas as pd
 from datetime import datetime
 from PIL import Image
-import google.generativeai as genai
-import json
+import io
+import time
+from extraccion_ia import ColaExtraccion
+from hoja_compras import HojaCompras
+from cola_sync import ColaSync
+from parseo import a_numero
+import instrumentacion
+from instrumentacion import tramo
 
 # --- 1. CONFIGURACIÓN DE CONEXIÓN (Google Sheets) ---
+@st.cache_resource
+def conectar_hoja():
+    # Se autoriza y se abre "conta1" una sola vez por proceso, no en cada rerun
+    # (si falla no se cachea y se vuelve a intentar)
+    creds_info = st.secrets["gcp_service_account"]
+    scope = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+    creds = Credentials.from_service_account_info(creds_info, scopes=scope)
+    client = gspread.authorize(creds)
+    return client.open("conta1").sheet1
+
+@st.cache_resource
+def conectar_sheets():
+    # Las lecturas se cachean (ver hoja_compras.py). La cola le avisa de lo
+    # que envía, así el historial y las repetidas no esperan al TTL, y las
+    # claves de la hoja se leen ya en segundo plano para comprobar repetidas
+    hoja = HojaCompras(conectar_hoja())
+    obtener_cola().al_enviar = hoja.anotar_enviadas
+    hoja.renovar_claves()
+    return hoja
+
+@st.cache_resource
+def obtener_cola():
+    # Las escrituras van al diario local y un hilo las envía (ver cola_sync.py):
+    # guardar no espera a la red y funciona sin conexión
+    return ColaSync(conectar=conectar_hoja).iniciar()
+
+ESPERA_CONEXION = 15.0
+ESPERA_CONEXION_MAXIMA = 600.0
+
+@st.cache_resource
+def fallos_conexion():
+    # st.cache_resource no guarda los errores: el último fallo al conectar se
+    # recuerda aquí, compartido por todas las sesiones
+    return {"fallos": 0, "no_antes": 0.0, "error": None}
+
 def inicializar_gspread():
+    estado = fallos_conexion()
+    if time.monotonic() < estado["no_antes"]:
+        # No se vuelve a esperar a la red en cada rerun hasta que pase la espera
+        st.warning(f"Sin conexión con Google Sheets ({estado['error']}). Lo que guardes se enviará al volver la conexión.")
+        return None
     try:
-        creds_info = st.secrets["gcp_service_account"]
-        scope = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-        creds = Credentials.from_service_account_info(creds_info, scopes=scope)
-        client = gspread.authorize(creds)
-        return client.open("conta1").sheet1
+        hoja = conectar_sheets()
     except Exception as e:
-        st.error(f"Error de conexión con Sheets: {e}")
+        estado["fallos"] += 1
+        estado["error"] = e
+        espera = ESPERA_CONEXION * 2 ** min(estado["fallos"] - 1, 16)
+        estado["no_antes"] = time.monotonic() + min(espera, ESPERA_CONEXION_MAXIMA)
+        st.warning(f"Sin conexión con Google Sheets ({e}). Lo que guardes se enviará al volver la conexión.")
         return None
+    estado["fallos"] = 0
+    return hoja
+
+def ya_guardadas(filas):
+    # Sin esperar a la red: lo guardado desde aquí (diario local, enviado o
+    # no) y las claves de la hoja ya leídas, que se renuevan en segundo plano
+    en_cola = cola.repetidas(filas)
+    if sheet is None:
+        return en_cola
+    en_hoja = sheet.repetidas(filas, leer=False)
+    return [a or b for a, b in zip(en_hoja, en_cola)]
 
 # --- 2. CONFIGURACIÓN DE IA (Gemini con fallback de modelo) ---
+@st.cache_resource
+def crear_modelo():
+    # Gemini se importa y configura la primera vez que se analiza un ticket,
+    # y el modelo se reutiliza en todos los reruns
+    import google.generativeai as genai
+    genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
+    # Intentamos varios nombres comunes del modelo por si uno falla (404)
+    nombres_modelo = ['gemini-1.5-flash', 'models/gemini-1.5-flash', 'gemini-1.5-flash-latest']
+
+    for nombre in nombres_modelo:
+        try:
+            model = genai.GenerativeModel(nombre)
+            # Prueba rápida de conexión
+            return model
+        except:
+            continue
+    return genai.GenerativeModel('gemini-1.5-flash')
+
 def configurar_ia():
     try:
-        genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
-        # Intentamos varios nombres comunes del modelo por si uno falla (404)
-        nombres_modelo = ['gemini-1.5-flash', 'models/gemini-1.5-flash', 'gemini-1.5-flash-latest']
-        
-        for nombre in nombres_modelo:
-            try:
-                model = genai.GenerativeModel(nombre)
-                # Prueba rápida de conexión
-                return model
-            except:
-                continue
-        return genai.GenerativeModel('gemini-1.5-flash')
+        return crear_modelo()
     except Exception as e:
         st.error(f"Error al configurar Gemini: {e}")
         return None
 
-model = configurar_ia()
+@st.cache_resource
+def crear_cola_ia(_model):
+    # Como mucho 4 peticiones a la vez y 15 por minuto (cuota gratuita de Gemini Flash),
+    # compartidas por todas las sesiones
+    return ColaExtraccion(_model, concurrencia=4, por_minuto=15)
+
+def obtener_cola_ia():
+    model = configurar_ia()
+    return None if model is None else crear_cola_ia(model)
 
 def analizar_ticket_con_ia(imagen):
-    prompt = """
-    Analiza la imagen de este ticket de bar. Extrae los datos y responde UNICAMENTE en este formato JSON:
-    {"proveedor": "NOMBRE", "total": 0.00, "fecha": "DD/MM/YYYY", "categoria": "TIPO"}
-    Si no ves la fecha, usa la de hoy. Si no ves el total, pon 0.00.
-    """
-    try:
-        # Configuramos una temperatura baja para que no invente datos
-        response = model.generate_content([prompt, imagen])
-        res_text = response.text.strip()
-        
-        # Limpiar posibles bloques de código de la respuesta
-        res_text = res_text.replace('```json', '').replace('```', '').strip()
-        
-        # Buscar el primer '{' y el último '}' para extraer solo el JSON
-        inicio = res_text.find('{')
-        fin = res_text.rfind('}') + 1
-        if inicio != -1:
-            return json.loads(res_text[inicio:fin])
+    cola_ia = obtener_cola_ia()
+    if cola_ia is None:
         return None
+    try:
+        # Reintenta sola si Gemini responde 429/5xx
+        with tramo('analizar_ticket_con_ia'):
+            return cola_ia.extraer(imagen)
     except Exception as e:
         st.error(f"Error de la IA: {e}")
         return None
 
+@st.cache_data(show_spinner=False, max_entries=200)
+def preparar_foto(contenido):
+    # Recortada, enderezada, en grises y reducida: menos bytes y tokens por ticket.
+    # OpenCV solo se carga cuando llega la primera foto
+    from preprocesado import preparar_para_ia
+    return preparar_para_ia(Image.open(io.BytesIO(contenido)))
+
 # --- 3. INTERFAZ DE USUARIO ---
 st.set_page_config(page_title="ContaBar IA", page_icon="🍻")
+cola = obtener_cola()
 sheet = inicializar_gspread()
 
 st.title("🍻 Gestión de Bar con IA")
 
-menu = st.sidebar.selectbox("Menú", ["📸 Escanear Ticket", "📝 Registro Manual", "📊 Ver Historial"])
+menu = st.sidebar.selectbox("Menú", ["📸 Escanear Ticket", "🗂️ Lote de Tickets", "📝 Registro Manual", "📊 Ver Historial", "🩺 Diagnóstico"])
 
-if sheet is not None:
-    if menu == "📸 Escanear Ticket":
-        st.subheader("Escanear factura/ticket")
-        foto = st.camera_input("Haz la foto al ticket")
+if menu == "📸 Escanear Ticket":
+    st.subheader("Escanear factura/ticket")
+    foto = st.camera_input("Haz la foto al ticket")
+    
+    if foto:
+        img = preparar_foto(foto.getvalue())
+        with st.spinner("La IA está leyendo los datos..."):
+            datos_ia = analizar_ticket_con_ia(img)
         
-        if foto:
-            img = Image.open(foto)
-            with st.spinner("La IA está leyendo los datos..."):
-                datos_ia = analizar_ticket_con_ia(img)
-            
-            if datos_ia:
-                with st.form("confirmacion_ia"):
-                    prov = st.text_input("Proveedor", value=datos_ia.get("proveedor", ""))
-                    cat = st.text_input("Categoría/Producto", value=datos_ia.get("categoria", ""))
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        total = st.number_input("Total (€)", value=float(datos_ia.get("total", 0.0)))
-                    with col2:
-                        fecha = st.text_input("Fecha", value=datos_ia.get("fecha", datetime.now().strftime('%d/%m/%Y')))
-                    
-                    if st.form_submit_button("Guardar en conta1"):
-                        # Guardar en Sheets
-                        sheet.append_row([cat.upper(), prov.upper(), 1, total, total, fecha])
-                        st.success(f"Guardado correctamente en Google Sheets")
+        if datos_ia:
+            with st.form("confirmacion_ia"):
+                prov = st.text_input("Proveedor", value=datos_ia.get("proveedor", ""))
+                cat = st.text_input("Categoría/Producto", value=datos_ia.get("categoria", ""))
+                col1, col2 = st.columns(2)
+                with col1:
+                    total = st.number_input("Total (€)", value=a_numero(datos_ia.get("total"), 0.0, precio=True))
+                with col2:
+                    fecha = st.text_input("Fecha", value=datos_ia.get("fecha", datetime.now().strftime('%d/%m/%Y')))
+                
+                forzar = st.checkbox("Guardar aunque ya esté en la hoja")
+                if st.form_submit_button("Guardar en conta1"):
+                    fila = [cat.upper(), prov.upper(), 1, total, total, fecha]
+                    if not forzar and ya_guardadas([fila])[0]:
+                        st.warning("Este ticket ya está en la hoja (mismo proveedor, fecha, total y "
+                                   "categoría). Marca la casilla para guardarlo igualmente.")
+                    else:
+                        # Se guarda en local al instante y se envía a Sheets en segundo plano
+                        cola.encolar(fila)
+                        st.success("Guardado. Se enviará a Google Sheets en segundo plano")
                         st.balloons()
-            else:
-                st.error("No se pudo extraer información. Prueba con otra foto o rellena manual.")
+        else:
+            st.error("No se pudo extraer información. Prueba con otra foto o rellena manual.")
 
-    elif menu == "📝 Registro Manual":
-        st.subheader("Entrada Manual")
+elif menu == "🗂️ Lote de Tickets":
+    st.subheader("Analizar varios tickets a la vez")
+    fotos = st.file_uploader("Sube las fotos de los tickets", type=["jpg", "jpeg", "png", "webp"],
+                             accept_multiple_files=True)
+
+    cola_ia = obtener_cola_ia() if fotos else None
+    if cola_ia is not None and st.button(f"Analizar {len(fotos)} tickets"):
+        imagenes = [preparar_foto(f.getvalue()) for f in fotos]
+        barra = st.progress(0.0, text="La IA está leyendo los tickets...")
+        resultados = []
+        # Los tickets se envían en paralelo; la barra avanza según van llegando
+        for hechos, resultado in enumerate(cola_ia.iterar(imagenes), 1):
+            resultados.append(resultado)
+            barra.progress(hechos / len(imagenes), text=f"{hechos}/{len(imagenes)} tickets leídos")
+        hoy = datetime.now().strftime('%d/%m/%Y')
+        filas = []
+        for r in sorted(resultados, key=lambda r: r.indice):
+            datos = r.datos or {}
+            filas.append({
+                "Archivo": fotos[r.indice].name,
+                "Proveedor": datos.get("proveedor", ""),
+                "Categoría": datos.get("categoria", ""),
+                "Total": a_numero(datos.get("total"), 0.0, precio=True),
+                "Fecha": datos.get("fecha", hoy),
+                "Error": r.error or ("" if r.datos else "Sin datos"),
+            })
+        # Los tickets que ya están en la hoja se marcan y no se guardan
+        repetidas = ya_guardadas([[str(f["Categoría"]).upper(), str(f["Proveedor"]).upper(), 1,
+                                      f["Total"], f["Total"], f["Fecha"]] for f in filas])
+        for fila, repetida in zip(filas, repetidas):
+            if repetida and not fila["Error"]:
+                fila["Error"] = "Ya está en la hoja"
+        st.session_state["lote_ia"] = pd.DataFrame(filas)
+
+    if "lote_ia" in st.session_state:
+        st.caption("Revisa y corrige los datos antes de guardar. Las filas con error no se guardan.")
+        editado = st.data_editor(st.session_state["lote_ia"], use_container_width=True,
+                                 disabled=["Archivo", "Error"], key="editor_lote_ia")
+        validas = editado[editado["Error"] == ""]
+        if st.button(f"Guardar {len(validas)} tickets en conta1", disabled=validas.empty):
+            # Una sola escritura para todo el lote
+            cola.encolar_varias([
+                [str(f.Categoría).upper(), str(f.Proveedor).upper(), 1, f.Total, f.Total, f.Fecha]
+                for f in validas.itertuples(index=False)])
+            del st.session_state["lote_ia"]
+            st.success(f"{len(validas)} tickets en cola. {cola.pendientes()} filas pendientes de enviar a Google Sheets.")
+
+elif menu == "📝 Registro Manual":
+    st.subheader("Entrada Manual")
+    una, varias = st.tabs(["Una línea", "Albarán (varias líneas)"])
+    with una:
         with st.form("form_manual"):
             p = st.text_input("Producto/Categoría").upper()
             pr = st.text_input("Proveedor").upper()
             imp = st.number_input("Total (€)", min_value=0.0, step=0.01)
             f = st.date_input("Fecha", datetime.now())
             if st.form_submit_button("Guardar"):
-                sheet.append_row([p, pr, 1, imp, imp, f.strftime('%d/%m/%Y')])
+                cola.encolar([p, pr, 1, imp, imp, f.strftime('%d/%m/%Y')])
                 st.success("Añadido.")
+    with varias:
+        col1, col2 = st.columns(2)
+        pr = col1.text_input("Proveedor", key="albaran_proveedor").upper()
+        f = col2.date_input("Fecha", datetime.now(), key="albaran_fecha")
+        lineas = st.data_editor(
+            pd.DataFrame({"Producto": pd.Series(dtype=str), "Cantidad": pd.Series(dtype=float),
+                          "Importe": pd.Series(dtype=float)}),
+            num_rows="dynamic", use_container_width=True, key="editor_albaran",
+            column_config={"Cantidad": st.column_config.NumberColumn(min_value=0.0, step=1.0),
+                           "Importe": st.column_config.NumberColumn("Importe (€)", min_value=0.0, step=0.01)})
+        lineas = lineas.dropna(how="all")
+        completas = lineas[lineas["Producto"].fillna("").str.strip().ne("")
+                           & (lineas["Cantidad"] > 0) & lineas["Importe"].notna()]
+        if len(completas) < len(lineas):
+            st.warning(f"{len(lineas) - len(completas)} líneas sin producto, cantidad o importe no se guardarán.")
+        filas = [[str(l.Producto).strip().upper(), pr, l.Cantidad, l.Importe / l.Cantidad, l.Importe,
+                  f.strftime('%d/%m/%Y')] for l in completas.itertuples(index=False)]
+        repetidas = ya_guardadas(filas) if filas and pr else []
+        if any(repetidas):
+            st.warning(f"{sum(repetidas)} líneas ya están en la hoja (¿albarán ya registrado?).")
+            if not st.checkbox("Guardar también las repetidas", key="albaran_repetidas"):
+                filas = [fila for fila, repetida in zip(filas, repetidas) if not repetida]
+        if st.button(f"Guardar {len(filas)} líneas", disabled=not filas or not pr):
+            # Una sola escritura para todo el albarán
+            cola.encolar_varias(filas)
+            del st.session_state["editor_albaran"]
+            st.success(f"{len(filas)} líneas en cola. {cola.pendientes()} filas pendientes de enviar a Google Sheets.")
 
-    elif menu == "📊 Ver Historial":
-        st.subheader("Últimas compras")
+elif menu == "📊 Ver Historial":
+    st.subheader("Últimas compras")
+    pendientes = cola.filas(enviadas=False)
+    if pendientes:
+        st.caption(f"{len(pendientes)} filas guardadas en local, pendientes de enviar a Google Sheets")
+        st.dataframe(pd.DataFrame([f[:6] for f in pendientes[-20:]],
+                                  columns=["Producto", "Proveedor", "Cantidad", "Precio Unitario", "Importe", "Fecha"]),
+                     use_container_width=True, hide_index=True)
+    if sheet is not None:
         try:
-            data = pd.DataFrame(sheet.get_all_records())
-            st.dataframe(data.tail(20), use_container_width=True)
+            data = sheet.ultimas(20)
+            st.dataframe(data, use_container_width=True)
         except:
             st.write("Aún no hay datos registrados.")
-else:
-    st.error("Fallo de conexión. Revisa tus credenciales en Secrets.")
+
+elif menu == "🩺 Diagnóstico":
+    st.subheader("Sincronización con Google Sheets")
+    estado = cola.estado()
+    st.write(f"{estado['pendientes']} filas pendientes de {estado['total']} guardadas en local.")
+    if estado["ultimo_error"]:
+        st.warning(f"Último error al enviar: {estado['ultimo_error']}")
+    if estado["pendientes"] and st.button("Enviar ahora"):
+        enviadas = cola.vaciar(forzar=True)
+        if enviadas:
+            st.success(f"{enviadas} filas enviadas.")
+        else:
+            st.error("No se ha podido enviar.")
+
+    st.subheader("Tiempos de las operaciones")
+    if not instrumentacion.activo():
+        st.info("La medición está desactivada (se activa con CONTABAR_INSTRUMENTACION=1).")
+        if st.button("Activar en este proceso"):
+            instrumentacion.activar()
+            st.rerun()
+    else:
+        filas = instrumentacion.resumen()
+        if filas:
+            st.dataframe(pd.DataFrame(filas), use_container_width=True, hide_index=True)
+        else:
+            st.write("Aún no se ha medido ninguna operación.")
+        c1, c2 = st.columns(2)
+        if c1.button("Guardar en el registro"):
+            ruta = instrumentacion.exportar()
+            st.success(f"Guardado en {ruta}." if ruta else "No hay nada que guardar.")
+        if c2.button("Reiniciar"):
+            instrumentacion.reiniciar()
+            st.rerun()
+
+    st.subheader("Perfilador de muestreo")
+    perfilador = instrumentacion.perfilador_activo()
+    if perfilador is None:
+        if st.button("Iniciar perfilador"):
+            instrumentacion.iniciar_perfilador()
+            st.rerun()
+    else:
+        st.dataframe(pd.DataFrame(perfilador.mas_frecuentes(), columns=["Función", "Muestras"]),
+                     use_container_width=True, hide_index=True)
+        st.download_button("Descargar pilas (formato flamegraph)", perfilador.colapsado(),
+                           file_name="perfil.txt")
+        if st.button("Detener perfilador"):
+            instrumentacion.detener_perfilador()
+            st.rerun()
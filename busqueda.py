@@ -0,0 +1,255 @@
+"""
+Motor de búsqueda del panel Búsquedas.
+
+Índices que mantiene sobre el libro de compras:
+  - Producto, Proveedor y Familia codificados como categorías: el filtro por
+    texto se evalúa sobre los nombres distintos y luego se traduce a códigos.
+  - Un índice de trigramas sobre los nombres de producto, para no recorrer
+    todos los nombres en cada búsqueda.
+  - Las posiciones ordenadas por fecha, de modo que un rango de fechas es
+    una búsqueda binaria.
+  - Los textos ya formateados de cada fila para la rejilla de resultados.
+Además guarda los resultados de las últimas combinaciones de filtros. Las
+filas añadidas y las corregidas se actualizan en su sitio, sin rehacer los
+índices.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from libro_compras import obtener_libro
+
+TAM_CACHE = 32
+LONGITUD_NGRAMA = 3
+
+
+def _por_valores_distintos(serie, formatear):
+    """
+    Aplica `formatear` solo a los valores distintos de la serie (fechas e
+    importes se repiten mucho) y reparte el resultado a todas las filas.
+    """
+    codigos, distintos = pd.factorize(serie)
+    textos = np.append(np.asarray(formatear(distintos), dtype=object), '')
+    return textos[codigos]  # el código -1 (valor nulo) toma el '' final
+
+
+def formatear_filas(df):
+    """
+    Textos y claves de ordenación de cada columna de la rejilla, calculados
+    de golpe sobre columnas enteras en vez de fila a fila.
+    """
+    fechas = df['_fecha']
+    textos = [
+        df['_producto'].to_numpy(dtype=object),
+        df['_familia'].to_numpy(dtype=object),
+        df['_proveedor'].to_numpy(dtype=object)]
+    claves = list(textos)
+    for col in ('Cantidad', 'Precio Unitario', 'Importe'):
+        numeros = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+        textos.append(_por_valores_distintos(pd.Series(numeros), lambda v: np.char.mod('%.2f', v.to_numpy(dtype=float))))
+        claves.append(numeros)
+    textos.append(_por_valores_distintos(fechas, lambda v: v.strftime('%d/%m/%Y')))
+    claves.append(fechas.to_numpy())
+    return (textos, claves)
+
+
+def _ngramas(texto):
+    return {texto[i:i + LONGITUD_NGRAMA] for i in range(len(texto) - LONGITUD_NGRAMA + 1)}
+
+
+class _Categoria:
+    """
+    Columna codificada como diccionario: nombre distinto -> código entero.
+    """
+
+    def __init__(self, ngramas=False):
+        self.codigos = np.empty(0, dtype=np.int32)
+        self._nombres = []
+        self._codigo_de = {}
+        self._ngramas = {} if ngramas else None
+
+    def codigo(self, valor):
+        codigo = self._codigo_de.get(valor)
+        if codigo is None:
+            codigo = self._codigo_de[valor] = len(self._nombres)
+            self._nombres.append(valor)
+            if self._ngramas is not None:
+                for ngrama in _ngramas(valor):
+                    self._ngramas.setdefault(ngrama, set()).add(codigo)
+        return codigo
+
+    def agregar(self, valores):
+        nuevos = np.fromiter((self.codigo(v) for v in valores), dtype=np.int32, count=len(valores))
+        self.codigos = np.concatenate([self.codigos, nuevos])
+
+    def cambiar(self, posiciones, valores):
+        """
+        Nuevo valor de las filas en `posiciones`. Un nombre que se queda sin
+        filas sigue en el diccionario; simplemente no coincide con ninguna.
+        """
+        for pos, valor in zip(posiciones, valores):
+            self.codigos[pos] = self.codigo(valor)
+
+    def mascara(self, texto):
+        """
+        Array booleano indexado por código: True si el nombre contiene `texto`.
+        """
+        mascara = np.zeros(len(self._nombres), dtype=bool)
+        mascara[self.que_contienen(texto)] = True
+        return mascara
+
+    def que_contienen(self, texto):
+        """
+        Códigos de los nombres que contienen `texto`.
+        """
+        if self._ngramas is not None and len(texto) >= LONGITUD_NGRAMA:
+            candidatos = None
+            for ngrama in _ngramas(texto):
+                codigos = self._ngramas.get(ngrama, set())
+                candidatos = codigos if candidatos is None else candidatos & codigos
+                if not candidatos:
+                    break
+            nombres = ((c, self._nombres[c]) for c in candidatos)
+        else:
+            nombres = enumerate(self._nombres)
+        return np.fromiter((c for c, nombre in nombres if texto in nombre), dtype=np.int32)
+
+
+class MotorBusqueda:
+
+    def __init__(self, libro=None):
+        self.libro = libro
+        self._lock = threading.RLock()
+        self.reconstruir(None)
+
+    def reconstruir(self, df):
+        with self._lock:
+            self._n = 0
+            self._producto = _Categoria(ngramas=True)
+            self._proveedor = _Categoria()
+            self._familia = _Categoria()
+            self._fechas_ordenadas = np.empty(0, dtype='datetime64[ns]')
+            self._por_fecha = np.empty(0, dtype=np.int64)
+            self._textos = None
+            self._claves = None
+            self._ids = np.empty(0, dtype=np.int64)
+            self._cache = OrderedDict()
+            if df is not None:
+                self.agregar(df)
+
+    def agregar(self, df_nuevas):
+        with self._lock:
+            self._cache.clear()
+            self._producto.agregar(df_nuevas['_producto'].tolist())
+            self._proveedor.agregar(df_nuevas['_proveedor'].tolist())
+            self._familia.agregar(df_nuevas['_familia'].tolist())
+            # Índice por fecha: se insertan las nuevas posiciones en su sitio
+            fechas = df_nuevas['_fecha'].to_numpy(dtype='datetime64[ns]')
+            posiciones = np.arange(self._n, self._n + len(df_nuevas))
+            orden = np.argsort(fechas, kind='stable')
+            sitio = np.searchsorted(self._fechas_ordenadas, fechas[orden], side='right')
+            self._fechas_ordenadas = np.insert(self._fechas_ordenadas, sitio, fechas[orden])
+            self._por_fecha = np.insert(self._por_fecha, sitio, posiciones[orden])
+            (textos, claves) = formatear_filas(df_nuevas)
+            if self._textos is None:
+                # Copias propias: corregir las modifica en su sitio
+                (self._textos, self._claves) = ([np.array(c) for c in textos], [np.array(c) for c in claves])
+            else:
+                self._textos = [np.concatenate(par) for par in zip(self._textos, textos)]
+                self._claves = [np.concatenate(par) for par in zip(self._claves, claves)]
+            self._ids = np.concatenate([self._ids, df_nuevas['_id'].to_numpy(dtype=np.int64)])
+            self._n += len(df_nuevas)
+
+    def corregir(self, antes, despues):
+        """
+        Actualiza en su sitio las filas corregidas. Su posición es su índice
+        en el libro, que es el orden de alta.
+        """
+        with self._lock:
+            self._cache.clear()
+            posiciones = despues.index.to_numpy(dtype=np.int64)
+            self._producto.cambiar(posiciones, despues['_producto'].tolist())
+            self._proveedor.cambiar(posiciones, despues['_proveedor'].tolist())
+            self._familia.cambiar(posiciones, despues['_familia'].tolist())
+            # Cada fila sale del índice por fecha y vuelve a entrar en su sitio nuevo
+            fuera = np.isin(self._por_fecha, posiciones)
+            self._fechas_ordenadas = self._fechas_ordenadas[~fuera]
+            self._por_fecha = self._por_fecha[~fuera]
+            fechas = despues['_fecha'].to_numpy(dtype='datetime64[ns]')
+            orden = np.argsort(fechas, kind='stable')
+            sitio = np.searchsorted(self._fechas_ordenadas, fechas[orden], side='right')
+            self._fechas_ordenadas = np.insert(self._fechas_ordenadas, sitio, fechas[orden])
+            self._por_fecha = np.insert(self._por_fecha, sitio, posiciones[orden])
+            (textos, claves) = formatear_filas(despues)
+            for columna, nuevos in zip(self._textos, textos):
+                columna[posiciones] = nuevos
+            for columna, nuevos in zip(self._claves, claves):
+                columna[posiciones] = nuevos
+
+    def buscar(self, producto='', proveedor='', familia='', desde=None, hasta=None):
+        """
+        Posiciones (en orden de alta) de las filas que cumplen todos los
+        filtros. Los textos se buscan como subcadena, sin distinguir
+        mayúsculas; `desde` y `hasta` son fechas incluidas en el rango.
+        """
+        if self.libro is not None:
+            self.libro.datos()  # recarga si el Excel ha cambiado en disco
+        clave = (producto.upper(), proveedor.upper(), familia.upper(), desde, hasta)
+        with self._lock:
+            resultado = self._cache.get(clave)
+            if resultado is None:
+                resultado = self._cache[clave] = self._buscar(*clave)
+                if len(self._cache) > TAM_CACHE:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.move_to_end(clave)
+            return resultado
+
+    def _buscar(self, producto, proveedor, familia, desde, hasta):
+        if desde is not None or hasta is not None:
+            ordenadas = self._fechas_ordenadas
+            # Las filas sin fecha quedan al final y nunca entran en un rango
+            fin = len(ordenadas) - np.count_nonzero(np.isnat(ordenadas))
+            ini = 0
+            if desde is not None:
+                ini = np.searchsorted(ordenadas[:fin], pd.Timestamp(desde).to_datetime64(), side='left')
+            if hasta is not None:
+                fin = np.searchsorted(ordenadas[:fin], pd.Timestamp(hasta).to_datetime64(), side='right')
+            filas = np.sort(self._por_fecha[ini:fin])
+        else:
+            filas = np.arange(self._n)
+        for texto, categoria in ((producto, self._producto), (proveedor, self._proveedor), (familia, self._familia)):
+            if texto and len(filas):
+                filas = filas[categoria.mascara(texto)[categoria.codigos[filas]]]
+        return filas
+
+    def columnas(self, filas):
+        """
+        Textos, claves de ordenación e ids de las filas indicadas, listos
+        para TablaVirtual.mostrar.
+        """
+        with self._lock:
+            if self._textos is None:
+                return ([], [], [])
+            return (
+                [c[filas] for c in self._textos],
+                [c[filas] for c in self._claves],
+                self._ids[filas])
+
+
+_motor = None
+_motor_lock = threading.Lock()
+
+
+def obtener_motor():
+    """
+    Motor de búsqueda compartido, registrado como vista del libro.
+    """
+    global _motor
+    with _motor_lock:
+        if _motor is None:
+            libro = obtener_libro()
+            _motor = libro.registrar_vista(MotorBusqueda(libro))
+        return _motor
@@ -0,0 +1,146 @@
+"""
+Caché persistente de resultados de OCR y parsers de facturas.
+
+Cada resultado se guarda bajo el hash SHA-256 del contenido del archivo,
+junto con el parser que lo extrajo y su versión. Si se vuelve a importar el
+mismo archivo (aunque tenga otro nombre o esté en otra carpeta) se devuelve
+al instante; si cambia la versión de un parser solo se invalidan las
+facturas de ese proveedor. También recuerda qué contenidos ya se guardaron
+en el libro para detectar facturas repetidas.
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from excel_utils import ARCHIVO
+
+ARCHIVO_CACHE = os.path.join(os.path.dirname(os.path.abspath(ARCHIVO)), 'cache_ocr.db')
+TAM_MAXIMO = 200 * 1024 * 1024
+
+Entrada = namedtuple('Entrada', ['parser', 'lineas'])
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS resultados (
+    hash TEXT PRIMARY KEY,
+    parser TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    datos BLOB NOT NULL,
+    tamano INTEGER NOT NULL,
+    ultimo_uso REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS importados (
+    hash TEXT PRIMARY KEY,
+    ruta TEXT NOT NULL,
+    fecha REAL NOT NULL
+);
+"""
+
+
+def hash_archivo(ruta, bloque=1024 * 1024):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for trozo in iter(lambda: f.read(bloque), b''):
+            h.update(trozo)
+    return h.hexdigest()
+
+
+class CacheOCR:
+
+    def __init__(self, ruta=ARCHIVO_CACHE, tam_maximo=TAM_MAXIMO):
+        self.ruta = ruta
+        self.tam_maximo = tam_maximo
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(ruta, check_same_thread=False)
+        self._con.execute('PRAGMA journal_mode=WAL')
+        self._con.executescript(_ESQUEMA)
+
+    def obtener(self, hash_, versiones):
+        """
+        Resultado guardado para ese contenido, o None si no existe o si el
+        parser que lo extrajo ha cambiado de versión desde entonces.
+        """
+        with self._lock:
+            fila = self._con.execute(
+                'SELECT parser, version, datos FROM resultados WHERE hash = ?', (hash_,)).fetchone()
+            if fila is None:
+                return None
+            (parser, version, datos) = fila
+            if versiones.get(parser) != version:
+                return None
+            with self._con:
+                self._con.execute('UPDATE resultados SET ultimo_uso = ? WHERE hash = ?', (time.time(), hash_))
+        return Entrada(parser, pickle.loads(datos))
+
+    def guardar(self, hash_, parser, version, lineas):
+        datos = pickle.dumps(lineas, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock, self._con:
+            self._con.execute(
+                'INSERT OR REPLACE INTO resultados (hash, parser, version, datos, tamano, ultimo_uso) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (hash_, parser, version, datos, len(datos), time.time()))
+            self._expulsar()
+
+    def _expulsar(self):
+        """
+        Borra los resultados menos usados hasta quedar por debajo del tamaño máximo.
+        """
+        total = self._con.execute('SELECT COALESCE(SUM(tamano), 0) FROM resultados').fetchone()[0]
+        if total <= self.tam_maximo:
+            return
+        sobrantes = []
+        for hash_, tamano in self._con.execute('SELECT hash, tamano FROM resultados ORDER BY ultimo_uso'):
+            if total <= self.tam_maximo:
+                break
+            sobrantes.append((hash_,))
+            total -= tamano
+        self._con.executemany('DELETE FROM resultados WHERE hash = ?', sobrantes)
+
+    def ya_importado(self, hash_):
+        """
+        Ruta con la que ya se guardó en el libro ese mismo contenido, o None.
+        """
+        with self._lock:
+            fila = self._con.execute('SELECT ruta FROM importados WHERE hash = ?', (hash_,)).fetchone()
+        return None if fila is None else fila[0]
+
+    def marcar_importados(self, pares):
+        """
+        Registra como guardados en el libro los (hash, ruta) indicados.
+        """
+        ahora = time.time()
+        with self._lock, self._con:
+            self._con.executemany(
+                'INSERT OR IGNORE INTO importados (hash, ruta, fecha) VALUES (?, ?, ?)',
+                [(h, str(r), ahora) for h, r in pares])
+
+
+def con_cache(ruta, parser, version, funcion, *args, **kwargs):
+    """
+    Llama a `funcion(*args, **kwargs)` solo si no hay un resultado guardado
+    para el contenido de `ruta` con esa versión de `parser`
+    (p. ej. leer_factura_ai desde la ventana de facturas).
+    """
+    cache = obtener_cache()
+    hash_ = hash_archivo(ruta)
+    entrada = cache.obtener(hash_, {parser: version})
+    if entrada is not None:
+        return entrada.lineas
+    resultado = funcion(*args, **kwargs)
+    cache.guardar(hash_, parser, version, resultado)
+    return resultado
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheOCR()
+        return _cache
@@ -0,0 +1,133 @@
+"""
+Clasificador de productos en familias.
+
+Se construye una vez a partir de la hoja Familias y resuelve cada producto
+con, por este orden:
+  1. el nombre normalizado exacto;
+  2. el nombre compactado (solo letras y cifras), para que "COCA COLA 33CL"
+     y "COCACOLA 33 CL" coincidan;
+  3. el nombre registrado más parecido por trigramas, si supera UMBRAL_PARECIDO.
+Clasifica lotes completos de líneas de factura de una vez y admite nuevas
+asignaciones sin reconstruirse.
+"""
+import re
+import threading
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+import pandas as pd
+
+SIN_FAMILIA = ''
+UMBRAL_PARECIDO = 0.6
+_NO_ALFANUMERICO = re.compile('[^0-9A-Z]+')
+
+
+@lru_cache(maxsize=65536)
+def normalizar(texto):
+    """
+    Convierte a mayúsculas, quita acentos y espacios al principio/final.
+    """
+    texto = str(texto).strip().upper()
+    texto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def compactar(texto):
+    return _NO_ALFANUMERICO.sub('', normalizar(texto))
+
+
+def _trigramas(compacto):
+    if len(compacto) < 3:
+        return {compacto}
+    return {compacto[i:i + 3] for i in range(len(compacto) - 2)}
+
+
+class ClasificadorFamilias:
+
+    def __init__(self, df_familias=None):
+        self._exactos = {}
+        self._compactos = {}
+        self._trigramas = {}
+        self._lock = threading.Lock()
+        if df_familias is not None:
+            for producto, familia in zip(df_familias['Producto'], df_familias['Familia']):
+                self._agregar(producto, familia)
+
+    def _agregar(self, producto, familia, sustituir=False):
+        normalizado = normalizar(producto)
+        if not normalizado:
+            return
+        compacto = compactar(normalizado)
+        if compacto not in self._compactos:
+            for trigrama in _trigramas(compacto):
+                self._trigramas.setdefault(trigrama, []).append(compacto)
+        elif not sustituir:
+            self._exactos.setdefault(normalizado, familia)
+            return
+        self._exactos[normalizado] = familia
+        self._compactos[compacto] = familia
+
+    def agregar(self, producto, familia):
+        """
+        Añade una asignación (p. ej. la que acaba de guardar actualizar_familias_excel).
+        Una asignación nueva sustituye a la anterior del mismo producto.
+        """
+        with self._lock:
+            self._agregar(producto, normalizar(familia), sustituir=True)
+
+    def clasificar(self, producto):
+        normalizado = normalizar(producto)
+        familia = self._exactos.get(normalizado)
+        if familia is not None:
+            return familia
+        compacto = compactar(normalizado)
+        familia = self._compactos.get(compacto)
+        if familia is not None:
+            return familia
+        return self._mas_parecido(compacto)
+
+    def _mas_parecido(self, compacto):
+        propios = _trigramas(compacto)
+        comunes = Counter()
+        for trigrama in propios:
+            comunes.update(self._trigramas.get(trigrama, ()))
+        mejor = (UMBRAL_PARECIDO, SIN_FAMILIA)
+        for candidato, n in comunes.items():
+            parecido = n / (len(propios) + len(_trigramas(candidato)) - n)
+            if parecido >= mejor[0]:
+                mejor = (parecido, self._compactos[candidato])
+        return mejor[1]
+
+    def clasificar_lote(self, productos):
+        """
+        Familia de cada producto. Cada nombre distinto se resuelve una sola vez.
+        """
+        productos = pd.Series(productos)
+        distintos = {p: self.clasificar(p) for p in productos.unique()}
+        return productos.map(distintos)
+
+
+_ultimo = (None, None)
+_ultimo_lock = threading.Lock()
+
+
+def clasificador_para(df_familias):
+    """
+    Clasificador construido a partir de `df_familias`, reutilizado mientras
+    se siga pasando la misma tabla.
+    """
+    global _ultimo
+    with _ultimo_lock:
+        if _ultimo[0] is not df_familias:
+            _ultimo = (df_familias, ClasificadorFamilias(df_familias))
+        return _ultimo[1]
+
+
+def registrar_familia(producto, familia):
+    """
+    Lleva al clasificador en uso una asignación recién guardada en el Excel.
+    """
+    clasificador = _ultimo[1]
+    if clasificador is not None:
+        clasificador.agregar(producto, familia)
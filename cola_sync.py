@@ -0,0 +1,290 @@
+"""
+Cola local de escrituras para la hoja de Google Sheets de app.py.
+
+Guardar un ticket es insertar una fila en un diario SQLite (modo WAL) y
+vuelve al instante, haya red o no. Un hilo en segundo plano envía las filas
+pendientes por lotes con append_rows:
+  - Si falla (sin conexión, 429, 5xx...), las filas se quedan en el diario
+    y se reintenta con espera exponencial, sin perder nada al cerrar la app.
+  - Cada fila lleva una clave de idempotencia que se escribe en la columna
+    COLUMNA_CLAVE de la hoja. Si un envío falló sin saber si llegó (p. ej.
+    un timeout), antes de repetirlo se leen las claves de la hoja y se
+    omiten las filas que ya estaban.
+`reconciliar` lleva al libro de compras de escritorio (contabilidad_bar.xlsx)
+las filas del diario o de la hoja que aún no están en él. Los cortes y las
+respuestas perdidas se prueban con tests/fakes.HojaInestable.
+
+    python cola_sync.py estado
+    python cola_sync.py reconciliar [--cola RUTA]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+
+from hoja_compras import clave_fila
+
+ARCHIVO_COLA = os.environ.get(
+    'CONTABAR_COLA', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cola_sync.db'))
+TAM_LOTE = 50
+INTERVALO = 5.0
+ESPERA_BASE = 2.0
+ESPERA_MAXIMA = 300.0
+COLUMNA_CLAVE = 7  # G: detrás de Producto, Proveedor, Cantidad, P. Unitario, Importe y Fecha
+
+log = logging.getLogger(__name__)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cola (
+    id INTEGER PRIMARY KEY,
+    clave TEXT NOT NULL UNIQUE,
+    fila TEXT NOT NULL,
+    creada REAL NOT NULL,
+    enviada REAL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS cola_pendientes ON cola (enviada, id);
+"""
+
+
+class ColaSync:
+
+    def __init__(self, conectar, ruta=ARCHIVO_COLA, tam_lote=TAM_LOTE, intervalo=INTERVALO,
+                 espera_base=ESPERA_BASE, espera_maxima=ESPERA_MAXIMA, reloj=time.monotonic, al_enviar=None):
+        """
+        `conectar()` devuelve la hoja (gspread.Worksheet o equivalente); se
+        llama en el primer envío y de nuevo tras cada fallo. `al_enviar(filas)`
+        se llama con las filas que cada lote acaba de añadir a la hoja (p. ej.
+        HojaCompras.anotar_enviadas, para que sus lecturas cacheadas las
+        incluyan).
+        """
+        self._conectar = conectar
+        self.al_enviar = al_enviar
+        self.ruta = ruta
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self._reloj = reloj
+        self._hoja = None
+        self._fallos = 0
+        self._no_antes = 0.0
+        self.ultimo_error = None
+        self._lock = threading.Lock()
+        self._envio = threading.Lock()
+        self._despertar = threading.Event()
+        self._parar = threading.Event()
+        self._hilo = None
+        self._con = sqlite3.connect(ruta, check_same_thread=False)
+        self._con.execute('PRAGMA journal_mode=WAL')
+        self._con.executescript(_ESQUEMA)
+
+    # --- Escritura (no toca la red) ---
+
+    def encolar(self, fila, clave=None):
+        return self.encolar_varias([fila], None if clave is None else [clave])[0]
+
+    def encolar_varias(self, filas, claves=None):
+        """
+        Guarda las filas en el diario y avisa al hilo de envío. Devuelve sus
+        claves; una clave ya encolada no se vuelve a añadir (p. ej. el mismo
+        formulario enviado dos veces con la misma clave).
+        """
+        filas = [list(f) for f in filas]
+        claves = list(claves) if claves is not None else [uuid.uuid4().hex for _ in filas]
+        ahora = time.time()
+        with self._lock, self._con:
+            self._con.executemany(
+                'INSERT OR IGNORE INTO cola (clave, fila, creada) VALUES (?, ?, ?)',
+                [(c, json.dumps(f, ensure_ascii=False, default=str), ahora) for c, f in zip(claves, filas)])
+        self._despertar.set()
+        return claves
+
+    # --- Envío ---
+
+    def _espera(self):
+        espera = self.espera_base * 2 ** min(self._fallos - 1, 16)
+        return min(espera * (1 + random.random()), self.espera_maxima)
+
+    def sincronizar(self):
+        """
+        Envía un lote de filas pendientes. Devuelve cuántas se han dado por
+        enviadas (0 si no había o si ha fallado; el error queda en
+        `ultimo_error` y no se reintenta antes de la espera).
+        """
+        with self._envio:
+            if self._reloj() < self._no_antes:
+                return 0
+            with self._lock:
+                pendientes = self._con.execute(
+                    'SELECT id, clave, fila, intentos FROM cola WHERE enviada IS NULL ORDER BY id LIMIT ?',
+                    (self.tam_lote,)).fetchall()
+            if not pendientes:
+                return 0
+            ids = [p[0] for p in pendientes]
+            try:
+                if self._hoja is None:
+                    self._hoja = self._conectar()
+                if any(p[3] for p in pendientes):
+                    # Un envío anterior pudo llegar aunque fallase: no se repite
+                    ya_enviadas = set(self._hoja.col_values(COLUMNA_CLAVE))
+                    pendientes = [p for p in pendientes if p[1] not in ya_enviadas]
+                if pendientes:
+                    self._hoja.append_rows([json.loads(p[2]) + [p[1]] for p in pendientes])
+            except Exception as e:
+                self._fallos += 1
+                self._no_antes = self._reloj() + self._espera()
+                self._hoja = None
+                self.ultimo_error = f'{type(e).__name__}: {e}'
+                log.warning('No se pudieron enviar %d filas a Sheets: %s', len(ids), self.ultimo_error)
+                with self._lock, self._con:
+                    self._con.executemany('UPDATE cola SET intentos = intentos + 1, error = ? WHERE id = ?',
+                                          [(self.ultimo_error, i) for i in ids])
+                return 0
+            self._fallos = 0
+            self.ultimo_error = None
+            ahora = time.time()
+            with self._lock, self._con:
+                self._con.executemany('UPDATE cola SET enviada = ?, error = NULL WHERE id = ?',
+                                      [(ahora, i) for i in ids])
+            if self.al_enviar is not None and pendientes:
+                try:
+                    # Solo las añadidas ahora: las que ya estaban no cambian la hoja
+                    self.al_enviar([json.loads(p[2]) for p in pendientes])
+                except Exception:
+                    log.exception('Error al avisar de las filas enviadas a Sheets')
+            return len(ids)
+
+    def vaciar(self, limite=None, forzar=False):
+        """
+        Envía lotes hasta que no quede nada pendiente o falle un envío.
+        Con `forzar` no se respeta la espera tras un fallo. Devuelve el
+        número de filas enviadas.
+        """
+        if forzar:
+            self._no_antes = 0.0
+        total = 0
+        while limite is None or total < limite:
+            enviadas = self.sincronizar()
+            if not enviadas:
+                break
+            total += enviadas
+        return total
+
+    def iniciar(self):
+        """
+        Arranca el hilo de envío (un hilo daemon; el diario sobrevive al cierre).
+        """
+        if self._hilo is None:
+            self._parar.clear()
+            self._hilo = threading.Thread(target=self._bucle, name='cola_sync', daemon=True)
+            self._hilo.start()
+        return self
+
+    def detener(self):
+        if self._hilo is not None:
+            self._parar.set()
+            self._despertar.set()
+            self._hilo.join()
+            self._hilo = None
+
+    def _bucle(self):
+        while not self._parar.is_set():
+            self._despertar.clear()
+            try:
+                enviadas = self.vaciar()
+            except Exception:
+                log.exception('Error en la sincronización con Sheets')
+                enviadas = 0
+            espera = max(self.intervalo, self._no_antes - self._reloj()) if not enviadas else self.intervalo
+            self._despertar.wait(espera)
+
+    # --- Consulta ---
+
+    def pendientes(self):
+        with self._lock:
+            return self._con.execute('SELECT COUNT(*) FROM cola WHERE enviada IS NULL').fetchone()[0]
+
+    def filas(self, enviadas=None):
+        """
+        Filas del diario en orden de alta: todas, solo las enviadas
+        (enviadas=True) o solo las pendientes (enviadas=False).
+        """
+        condicion = {None: '', True: ' WHERE enviada IS NOT NULL', False: ' WHERE enviada IS NULL'}[enviadas]
+        with self._lock:
+            return [json.loads(f) for (f,) in self._con.execute(f'SELECT fila FROM cola{condicion} ORDER BY id')]
+
+    def estado(self):
+        with self._lock:
+            (total, pendientes, reintentadas) = self._con.execute(
+                'SELECT COUNT(*), COUNT(*) - COUNT(enviada), SUM(intentos > 0 AND enviada IS NULL) FROM cola').fetchone()
+        return {'total': total, 'pendientes': pendientes, 'reintentando': reintentadas or 0,
+                'ultimo_error': self.ultimo_error}
+
+    def repetidas(self, filas):
+        """
+        Para cada fila, si hay una igual (misma clave que en duplicados.py)
+        en el diario, pendiente o ya enviada. Como en duplicados.py, una
+        fila que aparece k veces solo cuenta como repetida tantas veces
+        como ya esté. No toca la red.
+        """
+        en_cola = Counter(clave_fila(f) for f in self.filas())
+        vistas = Counter()
+        resultado = []
+        for fila in filas:
+            c = clave_fila(fila)
+            vistas[c] += 1
+            resultado.append(vistas[c] <= en_cola[c])
+        return resultado
+
+
+# --- Reconciliación con el libro de escritorio ---
+
+def filas_sin_libro(filas):
+    """
+    Filas de la hoja (o del diario) que no están en el libro de compras.
+    """
+    from duplicados import obtener_duplicados
+    filas = [f for f in filas if len(f) >= 6]
+    repetidas = obtener_duplicados().repetidas([clave_fila(f) for f in filas])
+    return [f for f, repetida in zip(filas, repetidas) if not repetida]
+
+
+def reconciliar(filas, df_familias=None):
+    """
+    Añade al libro de compras, en una sola transacción, las filas que aún
+    no estén en él. Devuelve el LoteLineas de altas_compras: las filas sin
+    familia conocida quedan en `errores` para darlas de alta a mano.
+    """
+    from altas_compras import agregar_lineas
+    lineas = [{'Producto': f[0], 'Proveedor': f[1], 'Cantidad': f[2], 'Importe': f[4], 'Fecha': f[5]}
+              for f in filas_sin_libro(filas)]
+    return agregar_lineas(lineas, df_familias, parcial=True)
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('orden', choices=('estado', 'reconciliar'))
+    parser.add_argument('--cola', default=ARCHIVO_COLA, help='diario SQLite de app.py')
+    args = parser.parse_args()
+    cola = ColaSync(conectar=None, ruta=args.cola)
+    if args.orden == 'estado':
+        print(json.dumps(cola.estado(), ensure_ascii=False, indent=2))
+        return
+    lote = reconciliar(cola.filas())
+    from libro_compras import obtener_libro
+    obtener_libro().exportar_pendiente()
+    print(f'{len(lote.filas)} filas añadidas al libro, {len(lote.errores)} sin añadir')
+    for posicion, motivo in lote.errores:
+        print(f'  {posicion}: {motivo}')
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,212 @@
+"""
+Índice de compras repetidas.
+
+Cada línea del libro se reduce a una clave (Proveedor, Fecha, Importe,
+Producto, Cantidad), con los textos en mayúsculas, la fecha en días, el
+importe en céntimos y la cantidad en milésimas, de modo que la misma compra
+leída por OCR, tecleada o escaneada en la app da la misma clave. El índice
+cuenta cuántas veces está cada clave, así que saber si una línea ya existe
+es una consulta O(1) a un diccionario.
+
+Además guarda una huella por documento: el hash de las claves de todas sus
+líneas. El libro no sabe qué líneas venían juntas, así que para las compras
+ya guardadas el documento es el grupo (Proveedor, Fecha); una factura que se
+importa dos veces (por la ventana OCR y por el escaneo automático, o desde
+app.py y desde el escritorio) tiene la misma huella aunque el archivo sea
+otro. Es una vista del libro: se actualiza con cada alta y cada corrección.
+"""
+import hashlib
+import threading
+from collections import Counter
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from parseo import a_numero, a_fechas, primera_fecha
+
+COLUMNAS = ('Proveedor', 'Fecha', 'Importe', 'Producto', 'Cantidad')
+_EPOCA = date(1970, 1, 1).toordinal()
+SIN_FECHA = -1
+
+
+def _dia(valor):
+    """
+    Días desde 1970 de una fecha o un texto de fecha; SIN_FECHA si no lo es.
+    """
+    if isinstance(valor, (date, datetime, pd.Timestamp)):
+        return SIN_FECHA if pd.isna(valor) else pd.Timestamp(valor).toordinal() - _EPOCA
+    fecha = primera_fecha(str(valor)) if valor is not None else None
+    return fecha.toordinal() - _EPOCA if fecha else SIN_FECHA
+
+
+def _entero(valor, escala, precio=False):
+    valor = a_numero(valor, 0.0, precio)
+    return 0 if np.isnan(valor) else int(round(valor * escala))
+
+
+def clave(proveedor, fecha, importe, producto, cantidad):
+    """
+    Clave de una línea suelta (valores tal y como vienen del formulario, un
+    parser o una fila de Sheets).
+    """
+    return (str(proveedor).strip().upper(), _dia(fecha), _entero(importe, 100, precio=True),
+            str(producto).strip().upper(), _entero(cantidad, 1000))
+
+
+def claves_df(df):
+    """
+    Clave de cada fila de un DataFrame con las columnas del libro, en bloque.
+    """
+    if df is None or not len(df):
+        return []
+    if '_fecha' in df.columns:
+        fechas = df['_fecha']
+    else:
+        fechas = a_fechas(df['Fecha'])
+    dias = fechas.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+    dias = np.where(np.isnat(dias), SIN_FECHA, dias.astype(np.int64))
+    importes = np.round(pd.to_numeric(df['Importe'], errors='coerce').fillna(0).to_numpy(dtype=float) * 100)
+    cantidades = np.round(pd.to_numeric(df['Cantidad'], errors='coerce').fillna(0).to_numpy(dtype=float) * 1000)
+    proveedores = df['Proveedor'].astype(str).str.strip().str.upper()
+    productos = df['Producto'].astype(str).str.strip().str.upper()
+    return list(zip(proveedores, dias.tolist(), importes.astype(np.int64).tolist(),
+                    productos, cantidades.astype(np.int64).tolist()))
+
+
+def huella(claves):
+    """
+    Huella de un documento: no depende del orden de sus líneas.
+    """
+    h = hashlib.sha1()
+    for c in sorted(claves):
+        h.update(repr(c).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _documentos(claves):
+    grupos = {}
+    for c in claves:
+        grupos.setdefault(c[:2], []).append(c)
+    return grupos
+
+
+class IndiceDuplicados:
+
+    def __init__(self, libro=None):
+        self.libro = libro
+        self._lock = threading.RLock()
+        self._lineas = Counter()
+        self._grupos = {}  # (proveedor, día) -> Counter de claves
+        self._huellas = Counter()
+
+    # --- Mantenimiento (protocolo de vistas del libro) ---
+
+    def reconstruir(self, df):
+        with self._lock:
+            self._lineas = Counter()
+            self._grupos = {}
+            self._huellas = Counter()
+            if df is not None and len(df):
+                self._sumar(claves_df(df), 1)
+
+    def agregar(self, df_nuevas):
+        with self._lock:
+            self._sumar(claves_df(df_nuevas), 1)
+
+    def corregir(self, antes, despues):
+        with self._lock:
+            self._sumar(claves_df(antes), -1)
+            self._sumar(claves_df(despues), 1)
+
+    @staticmethod
+    def _contar(contador, clave_, signo):
+        contador[clave_] += signo
+        if contador[clave_] <= 0:
+            del contador[clave_]
+
+    def _sumar(self, claves, signo):
+        for c in claves:
+            self._contar(self._lineas, c, signo)
+        # Cada grupo (Proveedor, Fecha) tocado cambia de huella
+        for grupo, nuevas in _documentos(claves).items():
+            lineas = self._grupos.pop(grupo, Counter())
+            if lineas:
+                self._contar(self._huellas, huella(lineas.elements()), -1)
+            for c in nuevas:
+                self._contar(lineas, c, signo)
+            if lineas:
+                self._huellas[huella(lineas.elements())] += 1
+                self._grupos[grupo] = lineas
+
+    # --- Consultas ---
+
+    def _al_dia(self):
+        if self.libro is not None:
+            self.libro.datos()  # recarga si el Excel ha cambiado en disco
+
+    def existe(self, clave_):
+        self._al_dia()
+        with self._lock:
+            return self._lineas.get(clave_, 0) > 0
+
+    def repetidas(self, claves):
+        """
+        Para cada clave, si ya está en el libro. Si una clave aparece k
+        veces en `claves`, solo se marcan como repetidas tantas como haya
+        ya en el libro (dos líneas iguales en una factura son legítimas).
+        """
+        self._al_dia()
+        vistas = Counter()
+        resultado = []
+        with self._lock:
+            for c in claves:
+                vistas[c] += 1
+                resultado.append(vistas[c] <= self._lineas.get(c, 0))
+        return resultado
+
+    def lineas_repetidas(self, df):
+        return np.array(self.repetidas(claves_df(df)), dtype=bool)
+
+    def documento_repetido(self, df):
+        """
+        True si el documento (líneas de una factura) ya está en el libro:
+        su huella coincide con la de un grupo (Proveedor, Fecha) guardado o
+        todas sus líneas están ya guardadas.
+        """
+        claves = claves_df(df)
+        if not claves:
+            return False
+        self._al_dia()
+        with self._lock:
+            if self._huellas.get(huella(claves), 0) > 0:
+                return True
+        return all(self.repetidas(claves))
+
+    def separar(self, df):
+        """
+        (nuevas, repetidas): las líneas de `df` que no están en el libro y
+        las que sí.
+        """
+        if df is None or df.empty:
+            return (df, df)
+        repetidas = self.lineas_repetidas(df)
+        return (df[~repetidas], df[repetidas])
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def obtener_duplicados():
+    """
+    Índice de repetidas compartido, registrado como vista del libro.
+    """
+    global _indice
+    # Las claves también se usan en app.py, que no tiene libro local
+    from libro_compras import obtener_libro
+    with _indice_lock:
+        if _indice is None:
+            libro = obtener_libro()
+            _indice = libro.registrar_vista(IndiceDuplicados(libro))
+        return _indice
@@ -0,0 +1,139 @@
+"""
+Extracción de tickets con Gemini en paralelo.
+
+Envía muchas fotos a la vez con un número máximo de peticiones en vuelo, un
+límite de peticiones por minuto (cubo de fichas) y reintentos con espera
+exponencial ante 429/5xx. El modelo solo necesita un método
+generate_content(contenido, request_options=...) que devuelva un objeto con
+.text, así que se puede probar con un modelo falso local (tests/fakes.py);
+el reloj y la espera también se pueden sustituir.
+"""
+import json
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from instrumentacion import tramo
+
+PROMPT_TICKET = """
+    Analiza la imagen de este ticket de bar. Extrae los datos y responde UNICAMENTE en este formato JSON:
+    {"proveedor": "NOMBRE", "total": 0.00, "fecha": "DD/MM/YYYY", "categoria": "TIPO"}
+    Si no ves la fecha, usa la de hoy. Si no ves el total, pon 0.00.
+    """
+
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+ERRORES_REINTENTABLES = {'ResourceExhausted', 'TooManyRequests', 'InternalServerError',
+                         'ServiceUnavailable', 'DeadlineExceeded', 'TimeoutError'}
+
+ResultadoTicket = namedtuple('ResultadoTicket', ['indice', 'datos', 'error'])
+
+
+def extraer_json(texto):
+    """
+    Primer objeto JSON de la respuesta del modelo, o None si no hay ninguno.
+    """
+    texto = texto.strip().replace('```json', '').replace('```', '').strip()
+    inicio = texto.find('{')
+    fin = texto.rfind('}') + 1
+    if inicio == -1:
+        return None
+    return json.loads(texto[inicio:fin])
+
+
+def es_reintentable(error):
+    """
+    Si el error es pasajero (429, 5xx, timeout) y merece otro intento.
+    """
+    codigo = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if callable(codigo):
+        codigo = codigo()
+    try:
+        if int(codigo) in CODIGOS_REINTENTABLES:
+            return True
+    except (TypeError, ValueError):
+        pass
+    return type(error).__name__ in ERRORES_REINTENTABLES
+
+
+class CuboFichas:
+    """
+    Limita el ritmo: `por_minuto` fichas que se reponen de forma continua,
+    con hasta `capacidad` acumuladas para una ráfaga inicial.
+    """
+
+    def __init__(self, por_minuto, capacidad=None, reloj=time.monotonic, dormir=time.sleep):
+        self.tasa = por_minuto / 60.0
+        self.capacidad = capacidad or max(1, por_minuto // 6)
+        self._reloj = reloj
+        self._dormir = dormir
+        self._fichas = float(self.capacidad)
+        self._ultimo = reloj()
+        self._lock = threading.Lock()
+
+    def tomar(self):
+        """
+        Espera (fuera del bloqueo) hasta que haya una ficha y la gasta.
+        """
+        while True:
+            with self._lock:
+                ahora = self._reloj()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.tasa)
+                self._ultimo = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.tasa
+            self._dormir(espera)
+
+
+class ColaExtraccion:
+
+    def __init__(self, model, prompt=PROMPT_TICKET, concurrencia=4, por_minuto=60,
+                 reintentos=4, espera_base=1.0, timeout=60, reloj=time.monotonic, dormir=time.sleep):
+        self.model = model
+        self.prompt = prompt
+        self.concurrencia = concurrencia
+        self.cubo = CuboFichas(por_minuto, reloj=reloj, dormir=dormir)
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.timeout = timeout
+        self._dormir = dormir
+
+    def extraer(self, imagen):
+        """
+        Extrae una imagen, con reintentos ante errores pasajeros. Devuelve
+        el dict extraído o lanza el último error.
+        """
+        for intento in range(self.reintentos + 1):
+            self.cubo.tomar()
+            try:
+                with tramo('gemini'):
+                    respuesta = self.model.generate_content(
+                        [self.prompt, imagen], request_options={'timeout': self.timeout})
+                return extraer_json(respuesta.text)
+            except Exception as e:
+                if intento == self.reintentos or not es_reintentable(e):
+                    raise
+                self._dormir(self.espera_base * 2 ** intento * (1 + random.random()))
+
+    def iterar(self, imagenes):
+        """
+        Genera un ResultadoTicket por imagen a medida que terminan (en
+        cualquier orden). El fallo de una no detiene las demás: queda en
+        su `error`.
+        """
+        with ThreadPoolExecutor(self.concurrencia) as pool:
+            futuros = {pool.submit(self.extraer, img): i for i, img in enumerate(imagenes)}
+            for futuro in as_completed(futuros):
+                try:
+                    yield ResultadoTicket(futuros[futuro], futuro.result(), None)
+                except Exception as e:
+                    yield ResultadoTicket(futuros[futuro], None, str(e))
+
+    def procesar(self, imagenes):
+        """
+        Lista de ResultadoTicket en el mismo orden que `imagenes`.
+        """
+        return sorted(self.iterar(imagenes), key=lambda r: r.indice)
@@ -0,0 +1,75 @@
+"""
+Tabla de familias: la hoja Familias del Excel, donde cada columna es una
+familia y sus celdas los productos que contiene.
+
+Es un módulo ligero (solo pandas) para que el autocompletado, el lote de
+facturas y la alta múltiple lean la tabla sin cargar el OCR.
+`familias_del_libro` la lee del Excel del libro de compras con su bloqueo,
+para no cruzarse con la exportación en segundo plano, y la guarda por firma
+del archivo: mientras el contenido no cambie devuelve el mismo DataFrame, y
+así clasificador_para reutiliza el clasificador ya construido.
+"""
+import os
+import threading
+
+import pandas as pd
+
+from clasificador_familias import normalizar
+
+HOJA = 'Familias'
+
+
+def cargar_familias_desde_excel(ruta='contabilidad_bar.xlsx', hoja=HOJA):
+    """
+    Tabla Producto -> Familia a partir de la hoja Familias, donde cada
+    columna es una familia y sus celdas los productos que contiene.
+    """
+    if not os.path.exists(ruta):
+        raise FileNotFoundError(f'No existe el archivo {ruta}')
+    df = pd.read_excel(ruta, sheet_name=hoja)
+    df.columns = [str(c) for c in df.columns]
+    df_familias = df.melt(var_name='Familia', value_name='Producto').dropna(subset=['Producto'])
+    df_familias['Producto'] = df_familias['Producto'].astype(str).str.strip().str.upper()
+    df_familias = df_familias[df_familias['Producto'] != '']
+    # normalizar tiene caché: cada nombre repetido solo se normaliza una vez
+    df_familias['Producto'] = df_familias['Producto'].map(normalizar)
+    df_familias['Familia'] = df_familias['Familia'].str.strip().str.upper().map(normalizar)
+    return df_familias[['Producto', 'Familia']].reset_index(drop=True)
+
+
+def _firma(ruta):
+    try:
+        st = os.stat(ruta)
+    except OSError:
+        return None
+    return f'{st.st_mtime_ns}:{st.st_size}'
+
+
+_cache = (None, None)  # (firma del Excel, tabla)
+_cache_lock = threading.Lock()
+
+
+def familias_del_libro():
+    """
+    Tabla de familias del Excel del libro de compras, o None si el archivo
+    no existe o no tiene hoja Familias. Solo se vuelve a leer si el archivo
+    ha cambiado, y si la tabla leída es igual a la anterior se devuelve el
+    mismo objeto.
+    """
+    global _cache
+    from libro_compras import obtener_libro
+    libro = obtener_libro()
+    with _cache_lock:
+        with libro.bloqueo_excel:
+            firma = _firma(libro.archivo)
+            if firma == _cache[0]:
+                return _cache[1]
+            try:
+                df_familias = cargar_familias_desde_excel(libro.archivo)
+            except (FileNotFoundError, ValueError):
+                df_familias = None
+        anterior = _cache[1]
+        if df_familias is not None and anterior is not None and df_familias.equals(anterior):
+            df_familias = anterior
+        _cache = (firma, df_familias)
+        return df_familias
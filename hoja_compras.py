@@ -0,0 +1,165 @@
+"""
+Lecturas de la hoja de Google Sheets de app.py con el menor número de llamadas.
+
+Las escrituras no pasan por aquí: las hace la cola de cola_sync.py, que
+avisa con `anotar_enviadas` de cada lote que llega a la hoja.
+  - Lecturas por rango: el historial pide solo las últimas N filas, no la
+    hoja entera.
+  - Caché local con caducidad (TTL) para las lecturas, que se invalida
+    cuando la cola escribe.
+  - `repetidas` dice qué filas ya están en la hoja (misma clave que en
+    duplicados.py) con una sola lectura completa por TTL. Con leer=False
+    no espera a la red: usa las claves ya leídas y las renueva en segundo
+    plano.
+Funciona con cualquier objeto con la interfaz de gspread.Worksheet que se
+usa aquí (row_values, col_values, get, get_all_values); las pruebas usan
+las hojas falsas de tests/fakes.py.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+
+import pandas as pd
+
+from duplicados import clave
+
+TTL = 60.0
+
+log = logging.getLogger(__name__)
+
+
+def clave_fila(fila):
+    """
+    Clave de una fila de la hoja: [Producto, Proveedor, Cantidad, Precio
+    Unitario, Importe, Fecha], como la escribe app.py.
+    """
+    fila = list(fila) + [''] * (6 - len(fila))
+    return clave(fila[1], fila[5], fila[4], fila[0], fila[2])
+
+
+def _columna(n):
+    letras = ''
+    while n:
+        n, resto = divmod(n - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+class HojaCompras:
+
+    def __init__(self, hoja, ttl=TTL, reloj=time.monotonic):
+        self.hoja = hoja
+        self.ttl = ttl
+        self._reloj = reloj
+        self._lock = threading.RLock()
+        self._cabecera = None
+        self._total = None  # filas con datos (sin la cabecera), None = sin leer
+        self._total_leido = 0.0
+        self._cache = {}
+        self._hilo_claves = None
+
+    # --- Escrituras de la cola ---
+
+    def anotar_enviadas(self, filas):
+        """
+        Filas que otro (la cola de cola_sync.py) acaba de añadir a la hoja:
+        cuentan ya en el historial y en las repetidas sin esperar al TTL.
+        """
+        with self._lock:
+            if self._total is not None:
+                self._total += len(filas)
+            claves = self._cache.get(('claves',))
+            self._cache.clear()
+            if claves is not None:
+                self._cache[('claves',)] = (claves[0], claves[1] + Counter(clave_fila(f) for f in filas))
+
+    # --- Lectura ---
+
+    def _cacheado(self, clave, leer):
+        ahora = self._reloj()
+        guardado = self._cache.get(clave)
+        if guardado is not None and ahora - guardado[0] < self.ttl:
+            return guardado[1]
+        valor = leer()
+        self._cache[clave] = (ahora, valor)
+        return valor
+
+    def cabecera(self):
+        with self._lock:
+            if self._cabecera is None:
+                self._cabecera = self.hoja.row_values(1)
+            return self._cabecera
+
+    def _contar_filas(self):
+        # Se leen solo los valores de una columna, y solo al caducar: entre
+        # medias se suman las filas que escribimos nosotros
+        ahora = self._reloj()
+        if self._total is None or ahora - self._total_leido >= self.ttl:
+            self._total = max(len(self.hoja.col_values(1)) - 1, 0)
+            self._total_leido = ahora
+        return self._total
+
+    def ultimas(self, n=20):
+        """
+        DataFrame con las últimas `n` filas de la hoja.
+        """
+        with self._lock:
+            cabecera = self.cabecera()
+            total = self._contar_filas()
+            filas = []
+            if n > 0 and total > 0:
+                ini = max(total - n + 1, 1) + 1  # +1 por la cabecera
+                rango = f'A{ini}:{_columna(len(cabecera))}{total + 1}'
+                filas = self._cacheado(('rango', rango), lambda: self.hoja.get(rango))
+        ancho = len(cabecera)
+        filas = [list(f) + [''] * (ancho - len(f)) for f in filas]
+        return pd.DataFrame([f[:ancho] for f in filas], columns=cabecera)
+
+    def _leer_claves(self):
+        return Counter(clave_fila(f) for f in self.hoja.get_all_values()[1:])
+
+    def renovar_claves(self):
+        """
+        Vuelve a leer las claves de la hoja en un hilo aparte (si no se está
+        leyendo ya). La lectura se hace sin el bloqueo, así que no frena a
+        quien consulta mientras tanto.
+        """
+        def leer():
+            try:
+                ahora = self._reloj()
+                claves = self._leer_claves()
+                with self._lock:
+                    self._cache[('claves',)] = (ahora, claves)
+            except Exception:
+                log.warning('No se pudieron leer las claves de Sheets', exc_info=True)
+
+        with self._lock:
+            if self._hilo_claves is None or not self._hilo_claves.is_alive():
+                self._hilo_claves = threading.Thread(target=leer, name='sheets_claves', daemon=True)
+                self._hilo_claves.start()
+            return self._hilo_claves
+
+    def repetidas(self, filas, leer=True):
+        """
+        Para cada fila, si ya está en la hoja. Como en
+        duplicados.py, una fila que aparece k veces solo cuenta como
+        repetida tantas veces como ya esté. Con leer=False no hay lectura
+        en el momento: se usan las últimas claves leídas (ninguna si aún no
+        se han leído) y, si han caducado, se renuevan en segundo plano.
+        """
+        with self._lock:
+            if leer:
+                guardadas = self._cacheado(('claves',), self._leer_claves)
+            else:
+                leidas = self._cache.get(('claves',))
+                if leidas is None or self._reloj() - leidas[0] >= self.ttl:
+                    self.renovar_claves()
+                guardadas = leidas[1] if leidas is not None else Counter()
+        vistas = Counter()
+        resultado = []
+        for fila in filas:
+            c = clave_fila(fila)
+            vistas[c] += 1
+            resultado.append(vistas[c] <= guardadas[c])
+        return resultado
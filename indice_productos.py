@@ -0,0 +1,216 @@
+"""
+Índice de autocompletado de productos.
+
+Mantiene las claves de producto ordenadas para resolver un prefijo con una
+búsqueda binaria, junto con la familia y el recuento de compras por
+proveedor de cada producto. Se alimenta del libro de compras (como vista) y
+de la hoja Familias (ver familias.py), y se actualiza de forma incremental
+al guardar y al corregir una fila.
+"""
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict, namedtuple
+
+from libro_compras import obtener_libro
+from familias import familias_del_libro
+
+Coincidencias = namedtuple('Coincidencias', ['productos', 'familia', 'proveedores'])
+SIN_COINCIDENCIAS = Coincidencias([], '', [])
+
+# Los productos que solo aparecen en la hoja Familias van detrás de los comprados
+SIN_COMPRAS = float('inf')
+TAM_CACHE = 256
+
+
+class _Producto:
+    __slots__ = ('familia', 'orden', 'proveedores', 'en_familias')
+
+    def __init__(self, familia='', orden=SIN_COMPRAS):
+        self.familia = familia
+        self.orden = orden
+        self.proveedores = Counter()
+        self.en_familias = False
+
+
+class IndiceAutocompletar:
+    """
+    Resuelve un prefijo en O(log n + k), siendo k el número de productos que
+    empiezan por él. Los resultados por prefijo se cachean hasta el siguiente
+    cambio en el índice.
+    """
+
+    def __init__(self, libro=None, cargar_familias=None):
+        self.libro = libro
+        self._cargar_familias = cargar_familias
+        self._claves = []
+        self._productos = {}
+        self._cache = OrderedDict()
+        self._familias_pendientes = False
+        self._lock = threading.RLock()
+
+    # --- Mantenimiento del índice ---
+
+    def _producto(self, clave, ordenar=True):
+        info = self._productos.get(clave)
+        if info is None:
+            info = self._productos[clave] = _Producto()
+            if ordenar:
+                insort(self._claves, clave)
+        return info
+
+    def _registrar_filas(self, df, ordenar=True):
+        for orden, producto, familia, proveedor in zip(df.index, df['_producto'], df['Familia'], df['_proveedor']):
+            info = self._producto(producto, ordenar)
+            if orden < info.orden:
+                info.orden = orden
+                info.familia = familia
+            info.proveedores[proveedor] += 1
+
+    def reconstruir(self, df):
+        with self._lock:
+            self._claves = []
+            self._productos = {}
+            self._cache.clear()
+            self._registrar_filas(df, ordenar=False)
+            self._claves = sorted(self._productos)
+            # La hoja Familias se lee en la próxima consulta: aquí se está
+            # dentro del bloqueo del libro
+            self._familias_pendientes = self._cargar_familias is not None
+
+    def agregar(self, df_nuevas):
+        with self._lock:
+            self._cache.clear()
+            self._registrar_filas(df_nuevas)
+
+    def corregir(self, antes, despues):
+        """
+        Mueve la compra corregida de su producto y proveedor anteriores a los
+        nuevos sin recorrer el libro (salvo si era la primera compra del
+        producto y este cambia: hay que buscar la siguiente).
+        """
+        with self._lock:
+            self._cache.clear()
+            for orden, producto, proveedor in zip(antes.index, antes['_producto'], antes['_proveedor']):
+                self._quitar_compra(orden, producto, proveedor, despues)
+            self._registrar_filas(despues)
+
+    def _quitar_compra(self, orden, producto, proveedor, despues):
+        info = self._productos.get(producto)
+        if info is None:
+            return
+        info.proveedores[proveedor] -= 1
+        if info.proveedores[proveedor] <= 0:
+            del info.proveedores[proveedor]
+        if info.orden != orden:
+            return
+        if orden in despues.index and despues.at[orden, '_producto'] == producto:
+            info.orden = SIN_COMPRAS  # _registrar_filas la vuelve a poner con la familia nueva
+            return
+        info.orden = SIN_COMPRAS
+        if info.proveedores and self.libro is not None:
+            df = self.libro.datos()
+            resto = df.index[(df['_producto'] == producto).to_numpy() & (df.index != orden)]
+            if len(resto):
+                info.orden = resto.min()
+                info.familia = df.at[info.orden, 'Familia']
+        elif not info.proveedores and not info.en_familias:
+            # Ya no se compra y no está en la hoja Familias: sale del autocompletado
+            del self._productos[producto]
+            pos = bisect_left(self._claves, producto)
+            if pos < len(self._claves) and self._claves[pos] == producto:
+                del self._claves[pos]
+
+    def cargar_familias(self, df_familias):
+        """
+        Incorpora la hoja Familias (columnas Producto y Familia).
+        """
+        if df_familias is None or df_familias.empty:
+            return
+        with self._lock:
+            self._cache.clear()
+            for producto, familia in zip(df_familias['Producto'], df_familias['Familia']):
+                self._registrar_familia(str(producto).upper(), familia)
+
+    def registrar_familia(self, producto, familia):
+        """
+        Refleja una asignación nueva de `actualizar_familias_excel`.
+        """
+        with self._lock:
+            self._cache.clear()
+            self._registrar_familia(producto.upper(), familia)
+
+    def _registrar_familia(self, producto, familia):
+        info = self._producto(producto)
+        info.en_familias = True
+        if info.orden == SIN_COMPRAS:
+            info.familia = familia
+
+    # --- Consulta ---
+
+    def _al_dia(self):
+        if self.libro is not None:
+            self.libro.datos()  # recarga si el Excel ha cambiado en disco
+        with self._lock:
+            if not self._familias_pendientes:
+                return
+            self._familias_pendientes = False
+        # Fuera del bloqueo: la lectura espera a que termine la exportación
+        df_familias = self._cargar_familias()
+        self.cargar_familias(df_familias)
+
+    def familia_de(self, producto):
+        """
+        Familia registrada para el producto exacto, o '' si no se conoce.
+        """
+        self._al_dia()
+        with self._lock:
+            info = self._productos.get(producto.upper())
+            return info.familia if info is not None and isinstance(info.familia, str) else ''
+
+    def buscar(self, prefijo):
+        """
+        Devuelve los productos que empiezan por `prefijo`, la familia del
+        primero registrado y sus proveedores ordenados por número de compras.
+        """
+        self._al_dia()
+        prefijo = prefijo.upper()
+        with self._lock:
+            resultado = self._cache.get(prefijo)
+            if resultado is not None:
+                self._cache.move_to_end(prefijo)
+                return resultado
+            resultado = self._buscar(prefijo)
+            self._cache[prefijo] = resultado
+            if len(self._cache) > TAM_CACHE:
+                self._cache.popitem(last=False)
+            return resultado
+
+    def _buscar(self, prefijo):
+        ini = bisect_left(self._claves, prefijo)
+        fin = bisect_left(self._claves, prefijo + '\uffff', ini)
+        if ini == fin:
+            return SIN_COINCIDENCIAS
+        productos = self._claves[ini:fin]
+        infos = [self._productos[p] for p in productos]
+        primero = min(range(len(productos)), key=lambda i: (infos[i].orden, productos[i]))
+        proveedores = Counter()
+        for info in infos:
+            proveedores.update(info.proveedores)
+        ranking = sorted(proveedores, key=lambda prov: (-proveedores[prov], prov))
+        return Coincidencias(productos, infos[primero].familia, ranking)
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def obtener_indice():
+    """
+    Índice de autocompletado compartido, registrado como vista del libro.
+    """
+    global _indice
+    with _indice_lock:
+        if _indice is None:
+            libro = obtener_libro()
+            _indice = libro.registrar_vista(IndiceAutocompletar(libro, familias_del_libro))
+        return _indice
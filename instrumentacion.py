@@ -0,0 +1,303 @@
+"""
+Instrumentación de los puntos calientes (Excel, parsers, IA, búsquedas, Tk).
+
+  - `tramo(nombre)` (bloque with) e `instrumentar(nombre)` (decorador)
+    cronometran una operación; `registrar(nombre, segundos)` anota una
+    duración medida en otro sitio (p. ej. en un proceso del lote).
+  - Por operación se guardan llamadas, errores, tiempo total y las últimas
+    MUESTRAS duraciones para los percentiles (p50, p90, p99).
+  - PerfiladorMuestreo toma muestras periódicas de las pilas de todos los
+    hilos y las escribe en formato "colapsado" (una pila por línea, como
+    las que usan flamegraph.pl o speedscope).
+  - `exportar()` añade el resumen como una línea JSON al registro; app.py
+    lo muestra en la página Diagnóstico.
+Desactivada (lo normal) no mide nada: `tramo` devuelve un contexto vacío
+compartido y los decoradores solo comprueban una variable.
+Se activa con CONTABAR_INSTRUMENTACION=1 y el perfilador con
+CONTABAR_PERFILADOR=1, o desde código con `activar()` / `iniciar_perfilador()`.
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+from functools import wraps
+
+MUESTRAS = 1000
+INTERVALO_PERFILADOR = 0.005
+ARCHIVO_REGISTRO = os.environ.get('CONTABAR_REGISTRO', 'contabar_instrumentacion.jsonl')
+
+_VERDADERO = {'1', 'true', 'si', 'sí', 'yes', 'on'}
+_activo = os.environ.get('CONTABAR_INSTRUMENTACION', '').lower() in _VERDADERO
+_NADA = nullcontext()
+_lock = threading.Lock()
+_operaciones = {}
+
+
+class _Operacion:
+    __slots__ = ('llamadas', 'errores', 'total', 'maximo', 'duraciones')
+
+    def __init__(self):
+        self.llamadas = 0
+        self.errores = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.duraciones = deque(maxlen=MUESTRAS)
+
+    def anotar(self, segundos, error=False):
+        self.llamadas += 1
+        self.errores += error
+        self.total += segundos
+        self.maximo = max(self.maximo, segundos)
+        self.duraciones.append(segundos)
+
+
+def activo():
+    return _activo
+
+
+def activar(valor=True):
+    global _activo
+    _activo = valor
+
+
+def registrar(nombre, segundos, error=False):
+    if not _activo:
+        return
+    with _lock:
+        operacion = _operaciones.get(nombre)
+        if operacion is None:
+            operacion = _operaciones[nombre] = _Operacion()
+        operacion.anotar(segundos, error)
+
+
+class _Tramo:
+    __slots__ = ('nombre', 'inicio')
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        registrar(self.nombre, time.perf_counter() - self.inicio, tipo is not None)
+        return False
+
+
+def tramo(nombre):
+    """
+    Cronometra el bloque: `with tramo('cargar_excel'): ...`.
+    """
+    return _Tramo(nombre) if _activo else _NADA
+
+
+def instrumentar(nombre=None):
+    """
+    Decorador equivalente a envolver la función entera en un tramo.
+    """
+    def decorador(funcion):
+        etiqueta = nombre or funcion.__name__
+
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not _activo:
+                return funcion(*args, **kwargs)
+            with _Tramo(etiqueta):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def _percentil(ordenadas, p):
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(len(ordenadas) - 1, int(p / 100 * len(ordenadas)))]
+
+
+def resumen():
+    """
+    Lista de dicts, una por operación y de más a menos tiempo total, con
+    llamadas, errores y tiempos en milisegundos (total, media, p50, p90,
+    p99 y máximo).
+    """
+    with _lock:
+        copia = {n: (o.llamadas, o.errores, o.total, o.maximo, sorted(o.duraciones))
+                 for n, o in _operaciones.items()}
+    filas = []
+    for nombre, (llamadas, errores, total, maximo, ordenadas) in copia.items():
+        filas.append({
+            'operacion': nombre,
+            'llamadas': llamadas,
+            'errores': errores,
+            'total_ms': round(1000 * total, 2),
+            'media_ms': round(1000 * total / llamadas, 3),
+            'p50_ms': round(1000 * _percentil(ordenadas, 50), 3),
+            'p90_ms': round(1000 * _percentil(ordenadas, 90), 3),
+            'p99_ms': round(1000 * _percentil(ordenadas, 99), 3),
+            'max_ms': round(1000 * maximo, 3)})
+    return sorted(filas, key=lambda f: -f['total_ms'])
+
+
+def reiniciar():
+    with _lock:
+        _operaciones.clear()
+
+
+def extraer():
+    """
+    Saca las medidas acumuladas (y las borra) para enviarlas a otro
+    proceso, que las suma con `fusionar`. Lo usan los procesos del lote de
+    facturas, cuyas medidas si no se perderían. None si no hay ninguna.
+    """
+    with _lock:
+        if not _operaciones:
+            return None
+        datos = {n: (o.llamadas, o.errores, o.total, o.maximo, list(o.duraciones))
+                 for n, o in _operaciones.items()}
+        _operaciones.clear()
+    return datos
+
+
+def fusionar(datos):
+    if not _activo or not datos:
+        return
+    with _lock:
+        for nombre, (llamadas, errores, total, maximo, duraciones) in datos.items():
+            operacion = _operaciones.get(nombre)
+            if operacion is None:
+                operacion = _operaciones[nombre] = _Operacion()
+            operacion.llamadas += llamadas
+            operacion.errores += errores
+            operacion.total += total
+            operacion.maximo = max(operacion.maximo, maximo)
+            operacion.duraciones.extend(duraciones)
+
+
+def exportar(ruta=ARCHIVO_REGISTRO):
+    """
+    Añade al registro una línea JSON con la fecha y el resumen actual.
+    """
+    filas = resumen()
+    if not filas:
+        return None
+    with open(ruta, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'), 'pid': os.getpid(),
+                            'operaciones': filas}, ensure_ascii=False) + '\n')
+    return ruta
+
+
+class PerfiladorMuestreo:
+    """
+    Perfilador estadístico: cada `intervalo` segundos anota la pila de cada
+    hilo (salvo el suyo). No necesita instrumentar nada y cuesta lo mismo
+    con cualquier carga, así que sirve para ver qué se come el tiempo en
+    un uso real.
+    """
+
+    def __init__(self, intervalo=INTERVALO_PERFILADOR):
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._parar.clear()
+            self._hilo = threading.Thread(target=self._muestrear, name='perfilador', daemon=True)
+            self._hilo.start()
+        return self
+
+    def detener(self):
+        if self._hilo is not None:
+            self._parar.set()
+            self._hilo.join()
+            self._hilo = None
+        return self
+
+    def _muestrear(self):
+        propio = threading.get_ident()
+        nombres = {}
+        while not self._parar.wait(self.intervalo):
+            for ident, marco in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                pila = []
+                while marco is not None:
+                    codigo = marco.f_code
+                    pila.append(f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})')
+                    marco = marco.f_back
+                if ident not in nombres:
+                    nombres = {h.ident: h.name for h in threading.enumerate()}
+                pila.append(nombres.get(ident, str(ident)))
+                with self._lock:
+                    self.pilas[';'.join(reversed(pila))] += 1
+
+    def colapsado(self):
+        """
+        Las pilas en formato colapsado: una línea "a;b;c cuenta" por pila.
+        """
+        with self._lock:
+            pilas = self.pilas.most_common()
+        return ''.join(f'{pila} {cuenta}\n' for pila, cuenta in pilas)
+
+    def guardar(self, ruta):
+        with open(ruta, 'w', encoding='utf-8') as f:
+            f.write(self.colapsado())
+        return ruta
+
+    def mas_frecuentes(self, n=20):
+        """
+        Funciones (hoja de la pila) con más muestras: [(función, muestras)].
+        """
+        hojas = Counter()
+        with self._lock:
+            pilas = list(self.pilas.items())
+        for pila, cuenta in pilas:
+            hojas[pila.rsplit(';', 1)[-1]] += cuenta
+        return hojas.most_common(n)
+
+
+_perfilador = None
+
+
+def perfilador_activo():
+    return _perfilador
+
+
+def iniciar_perfilador(intervalo=INTERVALO_PERFILADOR):
+    global _perfilador
+    if _perfilador is None:
+        _perfilador = PerfiladorMuestreo(intervalo).iniciar()
+    return _perfilador
+
+
+def detener_perfilador(ruta=None):
+    """
+    Detiene el perfilador y, si se indica `ruta`, guarda sus pilas.
+    """
+    global _perfilador
+    perfilador = _perfilador
+    _perfilador = None
+    if perfilador is not None:
+        perfilador.detener()
+        if ruta:
+            perfilador.guardar(ruta)
+    return perfilador
+
+
+def _al_salir():
+    if _activo:
+        exportar()
+    if _perfilador is not None:
+        detener_perfilador(os.path.splitext(ARCHIVO_REGISTRO)[0] + f'_perfil_{os.getpid()}.txt')
+
+
+if os.environ.get('CONTABAR_PERFILADOR', '').lower() in _VERDADERO:
+    iniciar_perfilador()
+atexit.register(_al_salir)
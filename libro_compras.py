@@ -0,0 +1,302 @@
+"""
+Libro de compras en memoria.
+
+Mantiene el libro completo en memoria con, junto a las columnas originales,
+columnas ya normalizadas (fecha parseada y claves en mayúsculas). El
+autocompletado, las alertas de precio y las búsquedas leen de aquí en lugar
+de releer el Excel en cada pulsación.
+
+La fuente de verdad es el almacén SQLite (ver almacen.py): cada alta es una
+transacción pequeña y el Excel se regenera en segundo plano. Si otro proceso
+o una ventana antigua escribe directamente el Excel, se detecta por su fecha
+de modificación y se vuelve a importar.
+"""
+import atexit
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from excel_utils import cargar_excel, guardar_datos, ARCHIVO
+from almacen import AlmacenCompras
+from instrumentacion import tramo
+from parseo import a_fechas
+
+COLUMNAS = ['Producto', 'Familia', 'Proveedor', 'Cantidad', 'Precio Unitario', 'Importe', 'Fecha']
+
+# Columnas derivadas que solo viven en memoria (nunca se guardan en el Excel)
+COLUMNAS_CLAVE = {'Producto': '_producto', 'Proveedor': '_proveedor', 'Familia': '_familia'}
+COLUMNA_FECHA = '_fecha'
+
+# Segundos que se agrupan las altas antes de regenerar el Excel
+RETARDO_EXPORTACION = 2.0
+
+
+def normalizar_filas(df):
+    """
+    Devuelve una copia de `df` con las columnas derivadas añadidas.
+    """
+    df = df.copy()
+    for col in COLUMNAS:
+        if col not in df.columns:
+            df[col] = pd.Series(dtype=object)
+    df[COLUMNA_FECHA] = a_fechas(df['Fecha']).to_numpy()
+    for col, clave in COLUMNAS_CLAVE.items():
+        df[clave] = df[col].astype(str).str.upper()
+    return df
+
+
+def _crudo(df):
+    return df[[c for c in df.columns if not c.startswith('_') or c == '_id']]
+
+
+class LibroCompras:
+    """
+    Vista en memoria del libro de compras, coherente con el almacén y el Excel.
+
+    Otros índices (autocompletado, precios, búsquedas...) se registran como
+    vistas con `registrar_vista`. Una vista es cualquier objeto con:
+      - reconstruir(df): se llama al (re)cargar el libro completo.
+      - agregar(df_nuevas): se llama tras añadir filas desde este proceso.
+    Opcionalmente:
+      - corregir(antes, despues): se llama al editar una fila, con la fila
+        antes y después del cambio; sin él la vista se reconstruye entera.
+    """
+
+    def __init__(self, archivo=ARCHIVO, almacen=None):
+        self.archivo = archivo
+        self.version = 0
+        self._almacen = almacen
+        self._df = None
+        self._firma = None
+        self._vistas = []
+        self._lock = threading.RLock()
+        # Serializa todas las escrituras del Excel hechas desde este proceso
+        self.bloqueo_excel = threading.RLock()
+        self._exportando = False
+        self._temporizador = None
+
+    @property
+    def almacen(self):
+        if self._almacen is None:
+            self._almacen = AlmacenCompras(os.path.splitext(self.archivo)[0] + '.db')
+        return self._almacen
+
+    def _firma_archivo(self):
+        try:
+            st = os.stat(self.archivo)
+        except OSError:
+            return None
+        return f'{st.st_mtime_ns}:{st.st_size}'
+
+    def _establecer(self, df, firma):
+        self._df = normalizar_filas(df.reset_index(drop=True))
+        self._firma = firma
+        self.version += 1
+        for vista in self._vistas:
+            vista.reconstruir(self._df)
+
+    # --- Carga y sincronización con el Excel ---
+
+    def _abrir(self, firma):
+        almacen = self.almacen
+        if almacen.leer_meta('exportando') == '1':
+            # La última exportación se cortó: el Excel puede estar a medias
+            self._establecer(almacen.leer(), firma)
+            self._programar_exportacion()
+        elif firma is not None and (almacen.vacio() or firma != almacen.leer_meta('firma_excel')):
+            self._importar_excel(firma)
+        else:
+            self._establecer(almacen.leer(), firma)
+            if almacen.ultimo_id() > int(almacen.leer_meta('ultimo_exportado', 0)):
+                self._programar_exportacion()
+
+    def _importar_excel(self, firma):
+        """
+        Importa el Excel modificado fuera del almacén. Las altas que aún no
+        se habían exportado se conservan y se vuelven a añadir al final.
+        """
+        almacen = self.almacen
+        ultimo_exportado = int(almacen.leer_meta('ultimo_exportado', 0))
+        previo = self._df if self._df is not None else almacen.leer()
+        pendientes = _crudo(previo[previo['_id'] > ultimo_exportado]).drop(columns='_id')
+        with tramo('cargar_excel'):
+            excel = cargar_excel(self.archivo)
+        almacen.reemplazar(pd.concat([excel, pendientes], ignore_index=True),
+                           exportadas=len(excel), firma_excel=firma, exportando=0)
+        self._establecer(almacen.leer(), firma)
+        if len(pendientes):
+            self._programar_exportacion()
+
+    def datos(self):
+        """
+        DataFrame con las columnas originales, el id del almacén (_id) y las
+        derivadas (_fecha, _producto, _proveedor, _familia). No debe
+        modificarse in situ.
+        """
+        with self._lock:
+            if self._df is None:
+                self._abrir(self._firma_archivo())
+            elif not self._exportando:
+                firma = self._firma_archivo()
+                if firma != self._firma and firma is not None:
+                    self._importar_excel(firma)
+            return self._df
+
+    def crudo(self):
+        """
+        Libro tal y como se guarda en el Excel (sin columnas derivadas).
+        """
+        return _crudo(self.datos()).drop(columns='_id')
+
+    # --- Escritura ---
+
+    def agregar_filas(self, filas):
+        """
+        Añade filas (lista de dicts o DataFrame) en una sola transacción.
+        Devuelve las filas añadidas ya normalizadas.
+        """
+        nuevas = pd.DataFrame(filas).reset_index(drop=True)
+        if nuevas.empty:
+            return normalizar_filas(nuevas)
+        with self._lock:
+            self.datos()
+            ids = self.almacen.agregar(nuevas)
+            nuevas = normalizar_filas(nuevas)
+            nuevas['_id'] = ids
+            nuevas.index = pd.RangeIndex(len(self._df), len(self._df) + len(nuevas))
+            self._df = pd.concat([self._df, nuevas])
+            for vista in self._vistas:
+                vista.agregar(nuevas)
+        self._programar_exportacion()
+        return nuevas
+
+    def actualizar_fila(self, id_fila, valores):
+        """
+        Corrige una compra en su sitio. `valores` es un dict con los nombres
+        de columna del Excel. Las vistas con `corregir` se actualizan con la
+        fila antes y después; las demás se reconstruyen. Es la API para la
+        ventana de edición, que aún no la usa: abrir_ventana_edicion no se
+        conserva en contabilidad_bar.py.
+        """
+        with self._lock:
+            df = self.datos().copy()
+            self.almacen.actualizar(id_fila, valores)
+            pos = df.index[df['_id'] == id_fila]
+            antes = df.loc[pos]
+            despues = _crudo(antes).copy()
+            for col, valor in valores.items():
+                despues[col] = valor
+            despues = normalizar_filas(despues)
+            for col in despues.columns:
+                df.loc[pos, col] = despues[col].to_numpy()
+            self._df = df
+            self.version += 1
+            for vista in self._vistas:
+                if hasattr(vista, 'corregir'):
+                    vista.corregir(antes, despues)
+                else:
+                    vista.reconstruir(df)
+        self._programar_exportacion()
+
+    def reemplazar(self, df):
+        """
+        Sustituye el libro completo (p. ej. tras borrar filas). Las primeras
+        filas de `df` que ya estaban exportadas (por su _id) siguen contando
+        como exportadas; el resto se añadirá al Excel si este cambia fuera
+        antes de la próxima exportación.
+        """
+        with self._lock:
+            exportadas = 0
+            if '_id' in df.columns:
+                ultimo = int(self.almacen.leer_meta('ultimo_exportado', 0))
+                exportadas = int(np.cumprod((df['_id'] <= ultimo).to_numpy()).sum())
+            self.almacen.reemplazar(_crudo(df).drop(columns='_id', errors='ignore'), exportadas)
+            self._establecer(self.almacen.leer(), self._firma)
+        self._programar_exportacion()
+
+    def escribir_excel(self, funcion, *args, **kwargs):
+        """
+        Ejecuta otra escritura sobre el Excel (p. ej. actualizar_familias_excel)
+        sin que se confunda con un cambio externo ni se cruce con la exportación.
+        """
+        with self.bloqueo_excel:
+            resultado = funcion(*args, **kwargs)
+            with self._lock:
+                self._firma = self._firma_archivo()
+                self.almacen.escribir_meta(firma_excel=self._firma)
+        return resultado
+
+    def invalidar(self):
+        """
+        Fuerza una relectura del almacén en el próximo acceso.
+        """
+        with self._lock:
+            self._df = None
+
+    # --- Exportación del Excel ---
+
+    def _programar_exportacion(self):
+        with self._lock:
+            if self._temporizador is not None:
+                self._temporizador.cancel()
+            self._temporizador = threading.Timer(RETARDO_EXPORTACION, self.exportar)
+            self._temporizador.daemon = True
+            self._temporizador.start()
+
+    def exportar(self):
+        """
+        Regenera el Excel desde el almacén.
+        """
+        with self.bloqueo_excel:
+            with self._lock:
+                if self._temporizador is not None:
+                    self._temporizador.cancel()
+                    self._temporizador = None
+                df = self._df
+                if df is None:
+                    return
+                self._exportando = True
+            try:
+                ultimo = int(df['_id'].max()) if len(df) else 0
+                self.almacen.escribir_meta(exportando=1)
+                with tramo('guardar_datos'):
+                    guardar_datos(_crudo(df).drop(columns='_id').reset_index(drop=True), self.archivo)
+                firma = self._firma_archivo()
+                self.almacen.escribir_meta(exportando=0, firma_excel=firma, ultimo_exportado=ultimo)
+                with self._lock:
+                    self._firma = firma
+            finally:
+                with self._lock:
+                    self._exportando = False
+
+    def exportar_pendiente(self):
+        """
+        Exporta ya si hay una exportación programada (se llama al salir).
+        """
+        if self._temporizador is not None:
+            self.exportar()
+
+    def registrar_vista(self, vista):
+        with self._lock:
+            self._vistas.append(vista)
+            if self._df is not None:
+                vista.reconstruir(self._df)
+        return vista
+
+
+_libro = None
+_libro_lock = threading.Lock()
+
+
+def obtener_libro():
+    """
+    Libro de compras compartido por todo el proceso.
+    """
+    global _libro
+    with _libro_lock:
+        if _libro is None:
+            _libro = LibroCompras()
+            atexit.register(_libro.exportar_pendiente)
+        return _libro
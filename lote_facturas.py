@@ -0,0 +1,173 @@
+"""
+Procesamiento de facturas y tickets por lotes.
+
+Reparte los archivos entre varios procesos, devuelve el progreso a medida
+que termina cada uno y aísla los errores por archivo: un PDF ilegible no
+detiene el lote. Todas las líneas se devuelven juntas para guardarlas con
+una sola escritura en el libro de compras.
+
+Antes de repartir el trabajo se consulta la caché por contenido (ver
+cache_ocr.py): los archivos ya leídos no se vuelven a procesar y los que ya
+se guardaron en el libro se apartan como repetidos. Después de leer cada
+archivo se comprueba también su huella de documento (ver duplicados.py): la
+misma factura en otro archivo (otra foto, el PDF y su escaneo) se aparta
+igualmente.
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import facturas_ocr
+import instrumentacion
+from instrumentacion import tramo
+from preprocesado import preparar_archivo
+from cache_ocr import obtener_cache, hash_archivo
+from duplicados import obtener_duplicados, claves_df, huella, COLUMNAS as COLUMNAS_CLAVE
+
+DOCUMENTO_EN_LIBRO = 'libro de compras'
+
+ResultadoLote = namedtuple('ResultadoLote', ['lineas', 'procesados', 'errores', 'repetidos', 'hashes'])
+
+_df_familias = None
+
+
+def _como_df(resultado):
+    if resultado is None:
+        return pd.DataFrame()
+    if isinstance(resultado, pd.DataFrame):
+        return resultado
+    return pd.DataFrame(resultado)
+
+
+def procesar_archivo(ruta, df_familias):
+    """
+    Extrae las líneas de un archivo: parse_ticket para imágenes (ya
+    recortadas, enderezadas y binarizadas por preprocesado.py) y, para los
+    PDF, el parser del proveedor identificado por parsear_pdf. Devuelve
+    (nombre del parser, líneas).
+    """
+    ruta = str(ruta)
+    if os.path.splitext(ruta)[1].lower() != '.pdf':
+        with tramo('preprocesado'):
+            imagen = preparar_archivo(ruta)
+        with tramo('parse_ticket'):
+            return ('parse_ticket', _como_df(facturas_ocr.parse_ticket(imagen, df_familias)))
+    (nombre, resultado) = facturas_ocr.parsear_pdf(ruta, df_familias)
+    return (nombre, _como_df(resultado))
+
+
+def _iniciar_trabajador(df_familias, instrumentar=False):
+    # La tabla de familias se envía una vez por proceso, no una por archivo
+    global _df_familias
+    _df_familias = df_familias
+    instrumentacion.activar(instrumentar)
+
+
+def _procesar_en_trabajador(ruta):
+    # Las medidas del proceso viajan con el resultado para sumarlas en el
+    # proceso principal
+    try:
+        return (*procesar_archivo(ruta, _df_familias), instrumentacion.extraer())
+    except Exception as e:
+        e.medidas = instrumentacion.extraer()
+        raise
+
+
+def procesar_lote(rutas, df_familias, progreso_callback=None, procesos=None, cache=None, duplicados=None):
+    """
+    Procesa `rutas` en paralelo. `progreso_callback(hechos, total)` se llama
+    cada vez que termina un archivo. Devuelve un ResultadoLote con:
+      - lineas: todas las líneas extraídas.
+      - procesados: rutas leídas correctamente.
+      - errores: lista de (ruta, mensaje).
+      - repetidos: lista de (ruta, ruta anterior) con contenido ya guardado
+        en el libro o repetido dentro del lote; sus líneas no se incluyen.
+        Si lo repetido son las líneas (la misma factura en otro archivo),
+        la ruta anterior es DOCUMENTO_EN_LIBRO o la del otro archivo del lote.
+      - hashes: (hash, ruta) de los procesados, para `marcar_importados`
+        una vez guardadas las líneas.
+    """
+    cache = cache or obtener_cache()
+    duplicados = duplicados or obtener_duplicados()
+    versiones = facturas_ocr.VERSIONES_PARSER
+    rutas = list(rutas)
+    total = len(rutas)
+    partes = []
+    procesados = []
+    errores = []
+    repetidos = []
+    hashes = []
+    vistos = {}
+    huellas = {}
+    pendientes = {}
+
+    def avisar():
+        if progreso_callback:
+            progreso_callback(len(procesados) + len(errores) + len(repetidos), total)
+
+    def incluir(ruta, hash_, df):
+        # Mismas líneas que una factura ya guardada o ya vista en el lote
+        if len(df) and set(COLUMNAS_CLAVE) <= set(df.columns):
+            anterior = huellas.setdefault(huella(claves_df(df)), ruta)
+            if anterior != ruta:
+                repetidos.append((ruta, anterior))
+                return
+            if duplicados.documento_repetido(df):
+                repetidos.append((ruta, DOCUMENTO_EN_LIBRO))
+                return
+        partes.append(df)
+        procesados.append(ruta)
+        hashes.append((hash_, ruta))
+
+    def terminado(ruta, obtener):
+        try:
+            (parser, df, *medidas) = obtener()
+        except Exception as e:
+            instrumentacion.fusionar(getattr(e, 'medidas', None))
+            errores.append((ruta, str(e)))
+        else:
+            instrumentacion.fusionar(medidas[0] if medidas else None)
+            cache.guardar(pendientes[ruta], parser, versiones[parser], df)
+            incluir(ruta, pendientes[ruta], df)
+        avisar()
+
+    for ruta in rutas:
+        try:
+            hash_ = hash_archivo(ruta)
+        except OSError as e:
+            errores.append((ruta, str(e)))
+            avisar()
+            continue
+        anterior = vistos.get(hash_) or cache.ya_importado(hash_)
+        if anterior is not None:
+            repetidos.append((ruta, anterior))
+            avisar()
+            continue
+        vistos[hash_] = ruta
+        entrada = cache.obtener(hash_, versiones)
+        if entrada is None:
+            pendientes[ruta] = hash_
+            continue
+        incluir(ruta, hash_, entrada.lineas)
+        avisar()
+
+    procesos = procesos or min(len(pendientes), os.cpu_count() or 1)
+    if procesos <= 1:
+        for ruta in pendientes:
+            terminado(ruta, lambda: procesar_archivo(ruta, df_familias))
+    else:
+        with ProcessPoolExecutor(procesos, initializer=_iniciar_trabajador,
+                                 initargs=(df_familias, instrumentacion.activo())) as pool:
+            futuros = {pool.submit(_procesar_en_trabajador, ruta): ruta for ruta in pendientes}
+            try:
+                for futuro in as_completed(futuros):
+                    terminado(futuros[futuro], futuro.result)
+            except BaseException:
+                # p. ej. el lote se ha cancelado desde progreso_callback:
+                # no se empieza ningún archivo más
+                pool.shutdown(cancel_futures=True)
+                raise
+    lineas = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+    return ResultadoLote(lineas, procesados, errores, repetidos, hashes)
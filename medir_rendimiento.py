@@ -0,0 +1,463 @@
+"""
+Banco de pruebas de rendimiento.
+
+Uso:
+    python medir_rendimiento.py [--tamanos 1000 100000 1000000] [--salida resultados.json]
+
+Genera en una carpeta temporal libros de compras sintéticos del tamaño
+indicado (Excel y almacén), una hoja Familias y un pequeño corpus de
+facturas PDF con la cabecera de cada proveedor y de tickets en imagen, y
+cronometra las operaciones principales:
+  - cargar_excel / guardar_datos, siempre sobre el Excel de la carpeta
+    temporal (la ruta se pasa explícitamente);
+  - el autocompletado de producto, la alerta de importe, buscar_filtrado
+    (filtrado, formateo y pintado de la tabla virtual) y agregar_producto
+    (altas_compras.agregar_lineas con una línea);
+  - cargar_familias_desde_excel, extraer_fecha, parseo.analizar_documento,
+    parsear_pdf sobre el corpus y parse_ticket.
+No abre ninguna ventana ni llama a la IA: los campos del formulario y el
+Treeview se sustituyen por objetos sin pantalla y se mide lo que hay debajo
+de cada botón. Lo que no se puede
+importar en el entorno se anota como error en vez de cortar la ejecución.
+El resultado es un JSON para comparar entre versiones.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+TAMANOS = (1000, 100000, 1000000)
+REPETICIONES = 5
+
+FAMILIAS = ['BEBIDAS', 'CERVEZAS', 'REFRESCOS', 'CAFE', 'LACTEOS', 'CARNES', 'PANADERIA', 'LIMPIEZA']
+PROVEEDORES = ['VOLDIS', 'CANDELAS', 'MERCADONA', 'CEVIPEP', 'DISBESA', 'CIFUENTES', 'LACTALIS', 'COCA-COLA']
+TEXTOS_FECHA = [
+    'FACTURA N. 2024/0153 FECHA 12.03.2024 CLIENTE BAR',
+    'Fecha de emisión: 05/11/2023 Vencimiento 05/12/2023',
+    'TICKET 0045 21-06-2024 14:32 MESA 4',
+    'Albarán sin fecha legible']
+
+
+# --- Datos sintéticos ---
+
+def generar_libro(n, semilla=0):
+    """
+    Libro de compras con n filas: ~n/50 productos (como mucho 20.000), 8
+    proveedores, 8 familias y cinco años de fechas.
+    """
+    rng = np.random.default_rng(semilla)
+    num_productos = max(10, min(n // 50, 20000))
+    productos = np.array([f'PRODUCTO {i:05d} {FAMILIAS[i % len(FAMILIAS)][:4]}' for i in range(num_productos)], dtype=object)
+    elegidos = rng.integers(0, num_productos, n)
+    cantidad = rng.integers(1, 25, n).astype(float)
+    precio = np.round(rng.gamma(2.0, 3.0, n), 2)
+    fechas = pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 5 * 365, n), unit='D')
+    return pd.DataFrame({
+        'Producto': productos[elegidos],
+        'Familia': np.array(FAMILIAS, dtype=object)[elegidos % len(FAMILIAS)],
+        'Proveedor': np.array(PROVEEDORES, dtype=object)[rng.integers(0, len(PROVEEDORES), n)],
+        'Cantidad': cantidad,
+        'Precio Unitario': precio,
+        'Importe': np.round(cantidad * precio, 2),
+        'Fecha': fechas.strftime('%d/%m/%Y')})
+
+
+def generar_familias(df_libro, ruta):
+    """
+    Hoja Familias como la del Excel: una columna por familia con sus productos.
+    """
+    pares = df_libro[['Producto', 'Familia']].drop_duplicates()
+    columnas = {f: pd.Series(pares.loc[pares['Familia'] == f, 'Producto'].to_numpy()) for f in FAMILIAS}
+    with pd.ExcelWriter(ruta) as escritor:
+        pd.DataFrame(columnas).to_excel(escritor, sheet_name='Familias', index=False)
+
+
+def _pdf_texto(lineas):
+    """
+    PDF mínimo de una página con `lineas` de texto (sin dependencias).
+    """
+    texto = ''.join(
+        f'BT /F1 10 Tf 40 {800 - 14 * i} Td ({l.replace("(", "[").replace(")", "]")}) Tj ET\n'
+        for i, l in enumerate(lineas))
+    contenido = zlib.compress(texto.encode('latin-1', 'replace'))
+    objetos = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R '
+        b'/Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(contenido) + contenido + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>']
+    salida = bytearray(b'%PDF-1.4\n')
+    posiciones = []
+    for i, obj in enumerate(objetos, 1):
+        posiciones.append(len(salida))
+        salida += b'%d 0 obj\n' % i + obj + b'\nendobj\n'
+    xref = len(salida)
+    salida += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1)
+    salida += b''.join(b'%010d 00000 n \n' % p for p in posiciones)
+    salida += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objetos) + 1, xref)
+    return bytes(salida)
+
+
+def generar_facturas(carpeta, df_libro, lineas=30, tickets=5, semilla=0):
+    """
+    Una factura PDF por proveedor (con su nombre en la cabecera) y unos
+    cuantos tickets en PNG. Devuelve (pdfs, imagenes).
+    """
+    rng = np.random.default_rng(semilla)
+    os.makedirs(carpeta, exist_ok=True)
+    pdfs = []
+    for proveedor in PROVEEDORES:
+        filas = df_libro.sample(lineas, random_state=int(rng.integers(1 << 31)), replace=len(df_libro) < lineas)
+        texto = [f'{proveedor} S.L.  CIF B12345678', f'FACTURA 2024/{rng.integers(1000):04d}  FECHA 12.03.2024', '']
+        texto += [f'{p:<40} {c:>6.2f} {u:>8.2f} {i:>9.2f}' for p, c, u, i in
+                  zip(filas['Producto'], filas['Cantidad'], filas['Precio Unitario'], filas['Importe'])]
+        texto += ['', f'TOTAL {filas["Importe"].sum():.2f} EUR']
+        ruta = os.path.join(carpeta, f'factura_{proveedor.lower()}.pdf')
+        with open(ruta, 'wb') as f:
+            f.write(_pdf_texto(texto))
+        pdfs.append(ruta)
+    imagenes = []
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return (pdfs, imagenes)
+    for i in range(tickets):
+        filas = df_libro.sample(12, random_state=i, replace=len(df_libro) < 12)
+        imagen = Image.new('L', (900, 1400), 245)
+        dibujo = ImageDraw.Draw(imagen)
+        dibujo.text((40, 30), f'{PROVEEDORES[i % len(PROVEEDORES)]}  21-06-2024 14:32', fill=20)
+        for j, f in enumerate(filas.itertuples(index=False)):
+            dibujo.text((40, 90 + 40 * j), f'{f.Producto[:28]:<28} {f.Cantidad:>5.0f} {f.Importe:>8.2f}', fill=20)
+        ruta = os.path.join(carpeta, f'ticket_{i}.png')
+        imagen.save(ruta)
+        imagenes.append(ruta)
+    return (pdfs, imagenes)
+
+
+# --- Widgets sin pantalla ---
+
+class _Entrada:
+    """
+    Lo que buscar_filtrado y agregar_producto leen de un ttk.Entry.
+    """
+
+    def __init__(self, texto=''):
+        self.texto = texto
+
+    def get(self):
+        return self.texto
+
+
+class _TreeSinPantalla:
+    """
+    Lo que TablaVirtual usa de un ttk.Treeview, sin Tk.
+    """
+
+    def __init__(self):
+        self.filas = {}
+        self._siguiente = 0
+
+    def __getitem__(self, clave):
+        return {'columns': ('Producto', 'Familia', 'Proveedor', 'Cantidad', 'Precio Unitario', 'Importe', 'Fecha')}[clave]
+
+    def cget(self, opcion):
+        return ''
+
+    def configure(self, **opciones):
+        pass
+
+    def bind(self, *args, **kwargs):
+        pass
+
+    def selection(self):
+        return ()
+
+    def get_children(self):
+        return tuple(self.filas)
+
+    def delete(self, *iids):
+        for iid in iids:
+            del self.filas[iid]
+
+    def insert(self, padre, posicion, iid=None, values=(), tags=()):
+        if iid is None:
+            (iid, self._siguiente) = (f'I{self._siguiente}', self._siguiente + 1)
+        self.filas[iid] = values
+        return iid
+
+
+def buscar_filtrado(motor, tabla, producto, proveedor, familia, desde=None, hasta=None):
+    """
+    Lo que hace el botón Buscar de contabilidad_bar con los campos ya leídos.
+    """
+    filas = motor.buscar(producto.get().upper(), proveedor.get().upper(), familia.get().upper(), desde, hasta)
+    if not (producto.get() or proveedor.get() or familia.get() or desde or hasta):
+        filas = filas[::-1]
+    (textos, claves, ids) = motor.columnas(filas)
+    tabla.mostrar(textos, claves, iids=ids)
+
+
+def agregar_producto(formulario):
+    """
+    Lo que hace el botón Guardar Producto de contabilidad_bar.
+    """
+    from altas_compras import agregar_lineas
+    linea = {campo: entrada.get().upper() if campo in ('Producto', 'Familia', 'Proveedor') else entrada.get()
+             for campo, entrada in formulario.items()}
+    return agregar_lineas([linea])
+
+
+# --- Medición ---
+
+def cronometrar(funcion, repeticiones=REPETICIONES):
+    """
+    Tiempos en milisegundos de `repeticiones` llamadas a `funcion()`.
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(1000 * (time.perf_counter() - inicio))
+    return {
+        'repeticiones': repeticiones,
+        'min_ms': round(min(tiempos), 3),
+        'mediana_ms': round(statistics.median(tiempos), 3),
+        'media_ms': round(statistics.fmean(tiempos), 3),
+        'max_ms': round(max(tiempos), 3)}
+
+
+def _medir(resultados, nombre, preparar, repeticiones):
+    """
+    `preparar()` devuelve la función a cronometrar. Los fallos (p. ej. un
+    módulo que no se puede importar aquí) quedan anotados en el resultado.
+    """
+    try:
+        resultados[nombre] = cronometrar(preparar(), repeticiones)
+    except Exception as e:
+        resultados[nombre] = {'error': f'{type(e).__name__}: {e}',
+                              'traza': traceback.format_exc(limit=3)}
+    print(f'  {nombre}: {resultados[nombre].get("mediana_ms", resultados[nombre].get("error"))}', file=sys.stderr)
+
+
+def medir_libro(n, carpeta, repeticiones):
+    """
+    Operaciones que dependen del tamaño del libro.
+    """
+    resultados = {}
+    df = generar_libro(n)
+    archivo = os.path.join(carpeta, 'contabilidad_bar.xlsx')
+    resultados['generar_libro'] = {'filas': n}
+
+    # La ruta va explícita: cambiar excel_utils.ARCHIVO no cambia los
+    # valores por defecto ya evaluados de sus funciones
+    def guardar():
+        from excel_utils import guardar_datos
+        return lambda: guardar_datos(df, archivo)
+    _medir(resultados, 'guardar_datos', guardar, 1 if n > 100000 else repeticiones)
+    if not os.path.exists(archivo):
+        df.to_excel(archivo, index=False)
+
+    def cargar():
+        from excel_utils import cargar_excel
+        return lambda: cargar_excel(archivo)
+    _medir(resultados, 'cargar_excel', cargar, 1 if n > 100000 else repeticiones)
+
+    # Libro en memoria sobre un almacén propio de la carpeta temporal
+    estado = {}
+
+    def abrir_libro():
+        from almacen import AlmacenCompras
+        from libro_compras import LibroCompras
+        almacen = AlmacenCompras(os.path.join(carpeta, 'compras.db'))
+        almacen.reemplazar(df)
+        estado['libro'] = LibroCompras(os.path.join(carpeta, 'no_existe.xlsx'), almacen)
+        return lambda: (estado['libro'].invalidar(), estado['libro'].datos())
+    _medir(resultados, 'libro_cargar_almacen', abrir_libro, 1)
+    libro = estado.get('libro')
+    if libro is None:
+        return resultados
+    # La exportación en segundo plano no se mide aquí (ver guardar_datos)
+    libro._programar_exportacion = lambda: None
+    # Las funciones de los botones usan el libro y las vistas compartidas
+    # (obtener_*): se apuntan a los de esta medición
+    import libro_compras
+    libro_compras._libro = libro
+    prefijos = ['P', 'PRODUCTO 0', 'PRODUCTO 001', 'PRODUCTO 00123']
+    producto = df['Producto'].iloc[0]
+
+    def construir(nombre, crear_vista, modulo, compartida):
+        # Se cronometra el registro, que es cuando la vista se llena con el libro
+        def preparar():
+            vista = crear_vista()
+            return lambda: estado.__setitem__(nombre, libro.registrar_vista(vista))
+        _medir(resultados, nombre, preparar, 1)
+        if estado.get(nombre) is not None:
+            setattr(sys.modules[modulo], compartida, estado[nombre])
+        return estado.get(nombre)
+
+    def crear_indice():
+        from indice_productos import IndiceAutocompletar
+        return IndiceAutocompletar(libro, lambda: pd.DataFrame(columns=['Producto', 'Familia']))
+
+    def crear_precios():
+        from precios import TablaPrecios
+        return TablaPrecios(libro)
+
+    def crear_motor():
+        from busqueda import MotorBusqueda
+        return MotorBusqueda(libro)
+
+    def crear_duplicados():
+        from duplicados import IndiceDuplicados
+        return IndiceDuplicados(libro)
+
+    indice = construir('construir_indice_autocompletar', crear_indice, 'indice_productos', '_indice')
+    if indice is not None:
+        _medir(resultados, 'autocompletar_producto', lambda: (lambda: [indice.buscar(p) for p in prefijos]), repeticiones)
+    precios = construir('construir_tabla_precios', crear_precios, 'precios', '_tabla')
+    if precios is not None:
+        _medir(resultados, 'alerta_importe',
+               lambda: (lambda: [precios.consultar(producto, p) for p in PROVEEDORES]), repeticiones)
+    construir('construir_indice_duplicados', crear_duplicados, 'duplicados', '_indice')
+    motor = construir('construir_motor_busqueda', crear_motor, 'busqueda', '_motor')
+    if motor is None:
+        return resultados
+    filtros = {
+        'sin_filtros': {},
+        'producto': {'producto': 'PRODUCTO 001'},
+        'proveedor_familia': {'proveedor': 'MERC', 'familia': 'CERV'},
+        'rango_fechas': {'desde': pd.Timestamp('2022-01-01'), 'hasta': pd.Timestamp('2022-03-31')}}
+
+    def crear_tabla():
+        from tabla_virtual import TablaVirtual
+        return TablaVirtual(_TreeSinPantalla())
+
+    for nombre, kwargs in filtros.items():
+        def preparar(kwargs=kwargs):
+            tabla = crear_tabla()
+            campos = [_Entrada(kwargs.get(c, '')) for c in ('producto', 'proveedor', 'familia')]
+
+            def buscar():
+                # Sin la caché de resultados: se mide el filtrado, el formateo y el pintado
+                motor._cache.clear()
+                buscar_filtrado(motor, tabla, *campos, kwargs.get('desde'), kwargs.get('hasta'))
+            return buscar
+        _medir(resultados, f'buscar_filtrado_{nombre}', preparar, repeticiones)
+
+    formulario = {'Producto': _Entrada(producto), 'Familia': _Entrada(df['Familia'].iloc[0]),
+                  'Proveedor': _Entrada(PROVEEDORES[0]), 'Cantidad': _Entrada('6'),
+                  'Importe': _Entrada('12,60'), 'Fecha': _Entrada('15/03/2024')}
+    _medir(resultados, 'agregar_producto', lambda: (lambda: agregar_producto(formulario)), repeticiones)
+    return resultados
+
+
+def medir_facturas(carpeta, repeticiones):
+    """
+    Familias, extracción de fechas y lectura de facturas sobre el corpus
+    sintético. Los parse_* de proveedor comparten hoy el mismo lector de
+    líneas (facturas_ocr.lineas_factura), así que se mide parsear_pdf sobre
+    todo el corpus en vez de cada uno.
+    """
+    resultados = {}
+    os.makedirs(carpeta, exist_ok=True)
+    df = generar_libro(5000, semilla=1)
+    ruta_familias = os.path.join(carpeta, 'familias.xlsx')
+    generar_familias(df, ruta_familias)
+    (pdfs, imagenes) = generar_facturas(os.path.join(carpeta, 'facturas'), df)
+    resultados['corpus'] = {'pdfs': len(pdfs), 'imagenes': len(imagenes)}
+    estado = {}
+
+    def familias():
+        from familias import cargar_familias_desde_excel
+        return lambda: estado.__setitem__('familias', cargar_familias_desde_excel(ruta_familias))
+    _medir(resultados, 'cargar_familias_desde_excel', familias, repeticiones)
+
+    def fechas():
+        from parseo import extraer_fecha  # facturas_ocr.extraer_fecha delega en esta
+        return lambda: [extraer_fecha(t) for t in TEXTOS_FECHA * 250]
+    _medir(resultados, 'extraer_fecha_x1000', fechas, repeticiones)
+
+    def paginas():
+        from parseo import analizar_documento
+        return lambda: analizar_documento(TEXTOS_FECHA * 250)
+    _medir(resultados, 'parseo_analizar_x1000', paginas, repeticiones)
+
+    try:
+        import facturas_ocr
+    except Exception as e:
+        resultados['parsear_pdf_corpus'] = {'error': f'{type(e).__name__}: {e}'}
+        return resultados
+    df_familias = estado.get('familias', pd.DataFrame(columns=['Producto', 'Familia']))
+    _medir(resultados, 'parsear_pdf_corpus',
+           lambda: (lambda: [_intentar(facturas_ocr.parsear_pdf, p, df_familias) for p in pdfs]), repeticiones)
+    if imagenes:
+        _medir(resultados, 'parse_ticket', lambda: (lambda: facturas_ocr.parse_ticket(imagenes[0], df_familias)), repeticiones)
+    return resultados
+
+
+def _intentar(funcion, *args):
+    try:
+        return funcion(*args)
+    except ValueError:
+        return None  # proveedor no reconocido: también cuenta el tiempo
+
+
+def _version():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def ejecutar(tamanos=TAMANOS, repeticiones=REPETICIONES, carpeta=None):
+    temporal = carpeta or tempfile.mkdtemp(prefix='contabar_rendimiento_')
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'version': _version(),
+        'python': sys.version.split()[0],
+        'plataforma': platform.platform(),
+        'pandas': pd.__version__,
+        'libro': {},
+        'facturas': {}}
+    try:
+        for n in tamanos:
+            print(f'Libro de {n} filas', file=sys.stderr)
+            carpeta_n = os.path.join(temporal, f'libro_{n}')
+            os.makedirs(carpeta_n, exist_ok=True)
+            informe['libro'][str(n)] = medir_libro(n, carpeta_n, repeticiones)
+        print('Facturas', file=sys.stderr)
+        informe['facturas'] = medir_facturas(os.path.join(temporal, 'facturas'), repeticiones)
+    finally:
+        if carpeta is None:
+            shutil.rmtree(temporal, ignore_errors=True)
+    return informe
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Banco de pruebas de rendimiento')
+    parser.add_argument('--tamanos', type=int, nargs='+', default=list(TAMANOS), help='filas de cada libro sintético')
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES)
+    parser.add_argument('--salida', help='archivo JSON (por defecto, la salida estándar)')
+    parser.add_argument('--carpeta', help='conservar aquí los datos generados')
+    args = parser.parse_args()
+    informe = ejecutar(args.tamanos, args.repeticiones, args.carpeta)
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
@@ -0,0 +1,276 @@
+"""
+Lectura rápida de fechas, importes, cantidades y CIF en el texto de facturas.
+
+Todos los patrones se compilan una vez al importar y una sola expresión
+recorre el texto de izquierda a derecha: cada coincidencia es un Token con
+su tipo y su valor ya convertido.
+  - fecha: 12.03.2024, 05/11/23, 21-06-2024, "5 de marzo de 2024",
+    "12-ENE-2024"... Las fechas imposibles (31/02) se descartan.
+  - importe: número con € / EUR detrás o con dos decimales exactos.
+  - cantidad: el resto de números (enteros, pesos con un decimal...).
+  - cif: CIF de empresa, NIF o NIE.
+Los números admiten '1.234,56', '1,234.56', '1234.56' y '1234,56': si hay
+dos separadores distintos, el último es el decimal y una coma sola es
+siempre decimal ('1,234' = 1.234), que es lo habitual en España. Un punto
+solo seguido de tres cifras exactas es ambiguo: con parte entera 0 es
+decimal ('0.125'); si no, en cantidades se lee como separador de miles
+('1.500' unidades = 1500) y en importes y precios (con € detrás o
+`precio=True`) como decimal ('3.750 €' = 3.75).
+
+`analizar` devuelve todo lo encontrado en una página y `analizar_documento`
+y `analizar_lineas` procesan un documento entero de una vez. `a_fechas`
+convierte en bloque la columna Fecha del libro.
+`python parseo.py` comprueba el módulo contra el corpus de EJEMPLOS y contra
+números y fechas generados al azar (ida y vuelta).
+"""
+import random
+import re
+from collections import namedtuple
+from datetime import date
+
+import pandas as pd
+
+MESES = {
+    'ene': 1, 'feb': 2, 'mar': 3, 'abr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'ago': 8, 'sep': 9, 'set': 9, 'oct': 10, 'nov': 11, 'dic': 12}
+
+_MES = r'(?:ene(?:ro)?|feb(?:rero)?|mar(?:zo)?|abr(?:il)?|may(?:o)?|jun(?:io)?|jul(?:io)?|ago(?:sto)?|sep(?:tiembre|t)?|set(?:iembre)?|oct(?:ubre)?|nov(?:iembre)?|dic(?:iembre)?)'
+
+_TOKEN = re.compile(rf'''
+    (?P<fecha>(?<![\d.,/-])(?P<dia>\d{{1,2}})(?P<sep>[./-])(?P<mes>\d{{1,2}})(?P=sep)(?P<anio>\d{{4}}|\d{{2}})(?![\d.,/-]\d))
+  | (?P<fecha_texto>(?<!\d)(?P<dia_t>\d{{1,2}})(?:\s+de\s+|[\s/.-]+)(?P<mes_t>{_MES})\.?(?:\s+del?\s+|[\s/.-]+)(?P<anio_t>\d{{4}})(?!\d))
+  | (?P<cif>\b(?:[ABCDEFGHJNPQRSUVW]-?\d{{7}}[0-9A-J]|[XYZ]-?\d{{7}}-?[A-Z]|\d{{8}}-?[A-Z])\b)
+  | (?P<numero>(?<![\w.,])-?(?:\d{{1,3}}(?:(?P<miles>[.,])\d{{3}})(?:(?P=miles)\d{{3}})*(?:(?!(?P=miles))[.,]\d+)?|\d+(?:[.,]\d+)?)(?![\d]))
+    (?P<euro>\s*(?:€|eur(?:os?)?\b))?
+''', re.IGNORECASE | re.VERBOSE)
+
+Token = namedtuple('Token', ['tipo', 'valor', 'inicio', 'fin'])
+Pagina = namedtuple('Pagina', ['fechas', 'importes', 'cantidades', 'cifs'])
+
+FECHA = 'fecha'
+IMPORTE = 'importe'
+CANTIDAD = 'cantidad'
+CIF = 'cif'
+
+
+def a_numero(texto, por_defecto=None, precio=False):
+    """
+    Número de un texto como '1.234,56', '1234.56' o '-3,5', o `por_defecto`
+    si no lo es. Los números (int, float) se devuelven como float. Con
+    `precio` un punto solo seguido de tres cifras es decimal ('3.750' =
+    3.75); sin él, de miles ('3.750' = 3750) salvo si la parte entera es 0.
+    """
+    if isinstance(texto, (int, float)):
+        return float(texto)
+    if texto is None:
+        return por_defecto
+    s = str(texto).strip().replace('€', '').replace(' ', '')
+    coma = s.rfind(',')
+    punto = s.rfind('.')
+    if coma >= 0 and punto >= 0:
+        # El separador que va último es el decimal
+        (miles, decimal) = ('.', ',') if coma > punto else (',', '.')
+        s = s.replace(miles, '').replace(decimal, '.')
+    elif coma >= 0:
+        s = s.replace(',', '.') if s.count(',') == 1 else s.replace(',', '')
+    elif punto >= 0 and (s.count('.') > 1 or (len(s) - punto - 1 == 3 and not precio
+                                              and s[:punto].lstrip('+-').strip('0') != '')):
+        s = s.replace('.', '')
+    try:
+        return float(s)
+    except ValueError:
+        return por_defecto
+
+
+def _anio(texto):
+    anio = int(texto)
+    return anio + 2000 if anio < 100 else anio
+
+
+def _fecha(dia, mes, anio):
+    try:
+        return date(_anio(anio), mes, int(dia))
+    except ValueError:
+        return None
+
+
+def tokens(texto):
+    """
+    Tokens del texto en orden de aparición.
+    """
+    resultado = []
+    for m in _TOKEN.finditer(texto):
+        tipo = m.lastgroup
+        if m.group('fecha') is not None:
+            valor = _fecha(m.group('dia'), int(m.group('mes')), m.group('anio'))
+            if valor is None:
+                continue
+            tipo = FECHA
+        elif m.group('fecha_texto') is not None:
+            valor = _fecha(m.group('dia_t'), MESES[m.group('mes_t')[:3].lower()], m.group('anio_t'))
+            if valor is None:
+                continue
+            tipo = FECHA
+        elif m.group('cif') is not None:
+            valor = m.group('cif').upper().replace('-', '')
+            tipo = CIF
+        else:
+            numero = m.group('numero')
+            valor = a_numero(numero, precio=m.group('euro') is not None)
+            # Dos cifras tras el último separador solo pueden ser céntimos
+            es_importe = m.group('euro') is not None or numero[-3:-2] in ('.', ',')
+            tipo = IMPORTE if es_importe else CANTIDAD
+        resultado.append(Token(tipo, valor, m.start(), m.end()))
+    return resultado
+
+
+def analizar(texto):
+    """
+    Fechas, importes, cantidades y CIF de una página, cada uno en orden.
+    """
+    pagina = Pagina([], [], [], [])
+    destino = {FECHA: pagina.fechas, IMPORTE: pagina.importes, CANTIDAD: pagina.cantidades, CIF: pagina.cifs}
+    for token in tokens(texto):
+        destino[token.tipo].append(token.valor)
+    return pagina
+
+
+def analizar_documento(paginas):
+    """
+    Une el análisis de todas las páginas (textos) de un documento.
+    """
+    documento = Pagina([], [], [], [])
+    for texto in paginas:
+        pagina = analizar(texto or '')
+        for destino, encontrados in zip(documento, pagina):
+            destino.extend(encontrados)
+    return documento
+
+
+def analizar_lineas(texto):
+    """
+    Tokens de cada línea del texto: [(línea, [Token...])], sin las vacías.
+    """
+    return [(linea, tokens(linea)) for linea in texto.splitlines() if linea.strip()]
+
+
+def numeros(texto):
+    """
+    Valores de todos los números (importes y cantidades) del texto.
+    """
+    return [t.valor for t in tokens(texto) if t.tipo in (IMPORTE, CANTIDAD)]
+
+
+def primera_fecha(texto):
+    for token in tokens(texto):
+        if token.tipo == FECHA:
+            return token.valor
+    return None
+
+
+def extraer_fecha(texto):
+    """
+    Primera fecha del texto como 'DD-MM-AAAA', o None.
+    """
+    fecha = primera_fecha(texto)
+    return fecha.strftime('%d-%m-%Y') if fecha else None
+
+
+# Formatos de la columna Fecha del libro: el del formulario y el Excel
+# (dd/mm/aaaa), el del OCR antiguo (dd-mm-aaaa) y el de las fechas que
+# el Excel devuelve como datetime (aaaa-mm-dd).
+FORMATOS_FECHA = ('%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%y')
+
+
+def a_fechas(valores):
+    """
+    Serie datetime64 de una columna de fechas del libro que mezcla
+    formatos. Cada valor se lee con el primero de FORMATOS_FECHA que le
+    sirve (sin adivinar el formato por la primera fila, que dejaría el
+    resto en NaT); la hora, si la hay, se ignora. NaT si no es una fecha.
+    """
+    texto = pd.Series(valores, dtype=object).astype(str)
+    fechas = pd.to_datetime(texto, format=FORMATOS_FECHA[0], errors='coerce')
+    faltan = fechas.isna()
+    if faltan.any():
+        # Solo las filas que no tienen el formato habitual pasan por aquí
+        resto = texto[faltan].str.strip().str.replace(r'\s.*', '', regex=True)
+        leidas = pd.Series(pd.NaT, index=resto.index, dtype=fechas.dtype)
+        for formato in FORMATOS_FECHA:
+            leidas = leidas.fillna(pd.to_datetime(resto, format=formato, errors='coerce'))
+        fechas = fechas.mask(faltan, leidas)
+    return fechas
+
+
+# --- Corpus de comprobación ---
+
+EJEMPLOS = [
+    # (texto, fechas, importes, cantidades, cifs)
+    ('FACTURA N. 2024/0153 FECHA 12.03.2024 CLIENTE BAR',
+     [date(2024, 3, 12)], [], [2024, 153], []),
+    ('Fecha de emisión: 05/11/2023 Vencimiento 05/12/2023',
+     [date(2023, 11, 5), date(2023, 12, 5)], [], [], []),
+    ('TICKET 0045 21-06-2024 14:32 MESA 4',
+     [date(2024, 6, 21)], [], [45, 14, 32, 4], []),
+    ('Madrid, 5 de marzo de 2024', [date(2024, 3, 5)], [], [], []),
+    ('ALBARAN 12-ENE-2024 entrega 3 sept. 2024', [date(2024, 1, 12), date(2024, 9, 3)], [], [], []),
+    ('Fecha 31/02/2024 no existe', [], [], [], []),
+    ('CERVEZA 1/3 24 0,85 20,40', [], [0.85, 20.40], [1, 3, 24], []),
+    ('TOTAL FACTURA 1.234,56 €', [], [1234.56], [], []),
+    ('TOTAL 1,234.56 EUR', [], [1234.56], [], []),
+    ('Base 1234.56 IVA 21% 259,26', [], [1234.56, 259.26], [21], []),
+    ('PATATAS 2,5 kg 3,75', [], [3.75], [2.5], []),
+    ('Abono -12,50 €', [], [-12.50], [], []),
+    ('Distribuciones SL CIF B12345678 - cliente NIF 12345678Z',
+     [], [], [], ['B12345678', '12345678Z']),
+    ('NIE X-1234567-L tel 600 123 456', [], [], [600, 123, 456], ['X1234567L']),
+    ('Pedido 1.500 unidades', [], [], [1500], []),
+    ('Dosis 0.125 l', [], [], [0.125], []),
+    ('Ajuste -0.125', [], [], [-0.125], []),
+    ('Precio 3.750 €/kg', [], [3.75], [], []),
+    ('Pedido 3.750 botellas', [], [], [3750], []),
+]
+
+
+def _formatear(valor, estilo):
+    entero = f'{abs(valor):,.2f}'
+    if estilo == 'es':
+        entero = entero.replace(',', '_').replace('.', ',').replace('_', '.')
+    elif estilo == 'plano_coma':
+        entero = f'{abs(valor):.2f}'.replace('.', ',')
+    elif estilo == 'plano':
+        entero = f'{abs(valor):.2f}'
+    return ('-' if valor < 0 else '') + entero
+
+
+def comprobar(aleatorios=2000, semilla=0):
+    """
+    Compara el análisis con EJEMPLOS y prueba ida y vuelta con importes y
+    fechas al azar. Devuelve la lista de fallos (vacía si todo va bien).
+    """
+    fallos = []
+    for texto, *esperado in EJEMPLOS:
+        obtenido = [list(v) for v in analizar(texto)]
+        if obtenido != [list(v) for v in esperado]:
+            fallos.append((texto, esperado, obtenido))
+    rng = random.Random(semilla)
+    for _ in range(aleatorios):
+        valor = round(rng.uniform(-99999, 999999), 2)
+        estilo = rng.choice(('es', 'en', 'plano', 'plano_coma'))
+        texto = f'TOTAL {_formatear(valor, estilo)} €'
+        pagina = analizar(texto)
+        if pagina.importes != [valor]:
+            fallos.append((texto, [valor], pagina.importes))
+        dia = date.fromordinal(rng.randint(date(2000, 1, 1).toordinal(), date(2099, 12, 31).toordinal()))
+        formato = rng.choice(('%d/%m/%Y', '%d.%m.%Y', '%d-%m-%Y', '%d/%m/%y'))
+        texto = f'Fecha {dia.strftime(formato)} ref'
+        if primera_fecha(texto) != dia:
+            fallos.append((texto, dia, primera_fecha(texto)))
+    return fallos
+
+
+if __name__ == '__main__':
+    fallos = comprobar()
+    for fallo in fallos:
+        print(*fallo, sep=' | ')
+    print(f'{len(EJEMPLOS)} ejemplos y casos al azar: {len(fallos)} fallos')
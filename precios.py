@@ -0,0 +1,177 @@
+"""
+Tabla de precios por (Producto, Proveedor).
+
+Guarda, para cada par, las últimas compras ordenadas por fecha junto con
+estadísticas sobre esa ventana (mínimo, máximo y media del precio unitario).
+Las alertas y comparativas de precio consultan aquí en O(1) en vez de
+filtrar y ordenar el historial completo. Es una vista del libro de compras:
+se reconstruye al recargar el Excel y se actualiza con cada fila añadida o
+corregida, tocando solo el historial de los pares afectados.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+
+import pandas as pd
+
+from libro_compras import obtener_libro
+
+# Número de compras sobre las que se calculan mínimo, máximo y media
+VENTANA = 10
+
+# Como en sort_values, las filas sin fecha cuentan como las más recientes
+_SIN_FECHA = pd.Timestamp.max
+
+
+class HistorialPrecio:
+    """
+    Últimas `VENTANA` compras de un producto a un proveedor.
+    """
+    __slots__ = ('compras', '_claves', '_fechas', '_precios')
+
+    def __init__(self):
+        self.compras = 0
+        self._claves = []
+        self._fechas = []
+        self._precios = []
+
+    def registrar(self, fecha, orden, precio):
+        self.compras += 1
+        clave = (_SIN_FECHA if pd.isna(fecha) else fecha, orden)
+        pos = bisect_right(self._claves, clave)
+        if pos == 0 and len(self._claves) == VENTANA:
+            return  # más antigua que toda la ventana
+        self._claves.insert(pos, clave)
+        self._fechas.insert(pos, fecha)
+        self._precios.insert(pos, precio)
+        if len(self._claves) > VENTANA:
+            del self._claves[0], self._fechas[0], self._precios[0]
+
+    def quitar(self, fecha, orden):
+        """
+        Quita una compra. Devuelve False si estaba en la ventana y hay
+        compras más antiguas fuera de ella: la ventana queda incompleta y hay
+        que rehacerla con las compras del par.
+        """
+        self.compras -= 1
+        clave = (_SIN_FECHA if pd.isna(fecha) else fecha, orden)
+        pos = bisect_left(self._claves, clave)
+        if pos == len(self._claves) or self._claves[pos] != clave:
+            return True  # más antigua que la ventana
+        del self._claves[pos], self._fechas[pos], self._precios[pos]
+        return self.compras == len(self._claves)
+
+    @property
+    def ultimo(self):
+        return self._precios[-1]
+
+    @property
+    def fecha_ultimo(self):
+        return self._fechas[-1]
+
+    @property
+    def penultimo(self):
+        return self._precios[-2] if len(self._precios) > 1 else None
+
+    @property
+    def fecha_penultimo(self):
+        return self._fechas[-2] if len(self._fechas) > 1 else None
+
+    @property
+    def minimo(self):
+        return min(self._precios)
+
+    @property
+    def maximo(self):
+        return max(self._precios)
+
+    @property
+    def media(self):
+        return sum(self._precios) / len(self._precios)
+
+
+class TablaPrecios:
+
+    def __init__(self, libro=None):
+        self.libro = libro
+        self._por_producto = {}
+        self._lock = threading.RLock()
+
+    def _registrar_filas(self, df, omitir=()):
+        for orden, producto, proveedor, fecha, precio in zip(
+                df.index, df['_producto'], df['_proveedor'], df['_fecha'], df['Precio Unitario']):
+            if (producto, proveedor) in omitir:
+                continue
+            proveedores = self._por_producto.setdefault(producto, {})
+            historial = proveedores.get(proveedor)
+            if historial is None:
+                historial = proveedores[proveedor] = HistorialPrecio()
+            historial.registrar(fecha, orden, precio)
+
+    def reconstruir(self, df):
+        with self._lock:
+            self._por_producto = {}
+            self._registrar_filas(df)
+
+    def agregar(self, df_nuevas):
+        with self._lock:
+            self._registrar_filas(df_nuevas)
+
+    def corregir(self, antes, despues):
+        with self._lock:
+            incompletos = set()
+            for orden, producto, proveedor, fecha in zip(
+                    antes.index, antes['_producto'], antes['_proveedor'], antes['_fecha']):
+                proveedores = self._por_producto.get(producto, {})
+                historial = proveedores.get(proveedor)
+                if historial is None:
+                    continue
+                if not historial.quitar(fecha, orden):
+                    incompletos.add((producto, proveedor))
+                elif not historial.compras:
+                    del proveedores[proveedor]
+                    if not proveedores:
+                        del self._por_producto[producto]
+            if incompletos and self.libro is not None:
+                # El libro ya tiene la fila corregida: se rehacen solo esos pares
+                df = self.libro.datos()
+                for producto, proveedor in incompletos:
+                    del self._por_producto[producto][proveedor]
+                    filas = (df['_producto'] == producto).to_numpy() & (df['_proveedor'] == proveedor).to_numpy()
+                    self._registrar_filas(df[filas])
+            self._registrar_filas(despues, omitir=incompletos if self.libro is not None else ())
+
+    def _al_dia(self):
+        if self.libro is not None:
+            self.libro.datos()  # recarga si el Excel ha cambiado en disco
+
+    def consultar(self, producto, proveedor):
+        """
+        Historial de precios del par, o None si nunca se ha comprado.
+        """
+        self._al_dia()
+        with self._lock:
+            return self._por_producto.get(producto.upper(), {}).get(proveedor.upper())
+
+    def proveedores_de(self, producto):
+        """
+        Diccionario proveedor -> HistorialPrecio de un producto.
+        """
+        self._al_dia()
+        with self._lock:
+            return dict(self._por_producto.get(producto.upper(), {}))
+
+
+_tabla = None
+_tabla_lock = threading.Lock()
+
+
+def obtener_precios():
+    """
+    Tabla de precios compartida, registrada como vista del libro.
+    """
+    global _tabla
+    with _tabla_lock:
+        if _tabla is None:
+            libro = obtener_libro()
+            _tabla = libro.registrar_vista(TablaPrecios(libro))
+        return _tabla
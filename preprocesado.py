@@ -0,0 +1,129 @@
+"""
+Preprocesado de fotos de tickets antes del OCR o de Gemini.
+
+Cada foto pasa por:
+  1. escala de grises;
+  2. recorte al ticket (el contorno claro más grande de la imagen);
+  3. enderezado, si el texto está ligeramente girado;
+  4. reducción a un lado máximo de LADO_MAXIMO píxeles (~300 ppp en un
+     ticket de 8 cm);
+  5. binarizado adaptativo, solo para Tesseract (a Gemini le va mejor la
+     escala de grises).
+Las imágenes preparadas se guardan en disco por el hash de su contenido, así
+que repetir un lote no vuelve a procesarlas.
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+import cv2
+import numpy as np
+from PIL import Image
+
+VERSION = 1
+LADO_MAXIMO = 1600
+ANGULO_MAXIMO = 15.0
+AREA_MINIMA_TICKET = 0.2
+CARPETA_CACHE = os.path.join(tempfile.gettempdir(), 'contabar_preprocesado')
+
+
+def _a_gris(imagen):
+    if isinstance(imagen, Image.Image):
+        imagen = np.asarray(imagen.convert('L'))
+    elif imagen.ndim == 3:
+        imagen = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY)
+    return imagen
+
+
+def recortar_ticket(gris):
+    """
+    Recorta al rectángulo del contorno claro más grande (el papel del
+    ticket). Si no ocupa al menos AREA_MINIMA_TICKET de la foto se deja igual.
+    """
+    suave = cv2.GaussianBlur(gris, (5, 5), 0)
+    _, claro = cv2.threshold(suave, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    contornos, _ = cv2.findContours(claro, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contornos:
+        return gris
+    x, y, ancho, alto = cv2.boundingRect(max(contornos, key=cv2.contourArea))
+    if ancho * alto < AREA_MINIMA_TICKET * gris.size:
+        return gris
+    return gris[y:y + alto, x:x + ancho]
+
+
+def enderezar(gris):
+    """
+    Gira la imagen para dejar horizontales las líneas de texto, según el
+    rectángulo mínimo que contiene los píxeles oscuros.
+    """
+    _, tinta = cv2.threshold(gris, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    puntos = cv2.findNonZero(tinta)
+    if puntos is None:
+        return gris
+    # El ángulo que da OpenCV depende de la versión: se lleva a (-45, 45]
+    angulo = (cv2.minAreaRect(puntos)[-1] + 45) % 90 - 45
+    if abs(angulo) < 0.5 or abs(angulo) > ANGULO_MAXIMO:
+        return gris
+    alto, ancho = gris.shape
+    giro = cv2.getRotationMatrix2D((ancho / 2, alto / 2), angulo, 1.0)
+    return cv2.warpAffine(gris, giro, (ancho, alto), flags=cv2.INTER_CUBIC,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=int(np.median(gris)))
+
+
+def reducir(gris, lado_maximo=LADO_MAXIMO):
+    escala = lado_maximo / max(gris.shape)
+    if escala >= 1:
+        return gris
+    return cv2.resize(gris, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+
+
+def binarizar(gris):
+    return cv2.adaptiveThreshold(gris, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, 31, 15)
+
+
+def preparar(imagen, binario=True, lado_maximo=LADO_MAXIMO):
+    """
+    Aplica todo el preprocesado a una imagen PIL o array de OpenCV y
+    devuelve un array en escala de grises (o blanco y negro si `binario`).
+    """
+    gris = reducir(enderezar(recortar_ticket(_a_gris(imagen))), lado_maximo)
+    return binarizar(gris) if binario else gris
+
+
+def preparar_para_ia(imagen, calidad=85):
+    """
+    Imagen lista para enviar a Gemini: en grises, sin binarizar y
+    comprimida en JPEG. Devuelve una imagen PIL.
+    """
+    salida = io.BytesIO()
+    Image.fromarray(preparar(imagen, binario=False)).save(salida, 'JPEG', quality=calidad)
+    salida.seek(0)
+    return Image.open(salida)
+
+
+def preparar_archivo(ruta, binario=True, carpeta=CARPETA_CACHE):
+    """
+    Ruta de la versión preprocesada de `ruta` (PNG), creándola solo si no
+    está ya en la caché. Si OpenCV no puede leerla o prepararla, devuelve
+    `ruta` tal cual.
+    """
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    clave = hashlib.sha256(contenido).hexdigest()
+    destino = os.path.join(carpeta, f'{clave}_v{VERSION}{"b" if binario else "g"}.png')
+    if os.path.exists(destino):
+        return destino
+    imagen = cv2.imdecode(np.frombuffer(contenido, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if imagen is None:
+        return str(ruta)  # formato que OpenCV no sabe leer: se usa el original
+    try:
+        preparada = preparar(imagen, binario)
+    except cv2.error:
+        return str(ruta)  # imagen que OpenCV no sabe tratar: también el original
+    os.makedirs(carpeta, exist_ok=True)
+    temporal = f'{destino}.{os.getpid()}.tmp.png'
+    cv2.imwrite(temporal, preparada)
+    os.replace(temporal, destino)
+    return destino
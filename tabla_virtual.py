@@ -0,0 +1,168 @@
+"""
+Rejilla virtual sobre un ttk.Treeview.
+
+El Treeview solo contiene las filas que caben en pantalla: una ventana fija
+que empieza en `inicio` dentro del resultado. La barra de desplazamiento se
+dimensiona con el total de filas y, al moverla (o con la rueda y las
+flechas), se vuelve a pintar la ventana en la nueva posición, así que el
+coste de mostrar o recorrer un resultado no depende de su tamaño. Los
+valores llegan ya formateados como arrays de texto y la ordenación se hace
+sobre arrays, sin leer los valores de vuelta de los elementos de Tk.
+"""
+import numpy as np
+
+# Filas de la ventana hasta que se conoce la altura real del Treeview
+FILAS_VISIBLES = 30
+# Filas que avanza cada paso de la rueda del ratón
+PASO_RUEDA = 3
+
+
+class TablaVirtual:
+
+    def __init__(self, tree, barra=None, filas_visibles=FILAS_VISIBLES):
+        """
+        `barra` es la ttk.Scrollbar vertical del Treeview; por defecto, la
+        que tuviera ya conectada en su yscrollcommand.
+        """
+        self.tree = tree
+        self.filas_visibles = filas_visibles
+        self.inicio = 0
+        self._textos = []
+        self._claves = []
+        self._iids = None
+        self._orden = np.arange(0)
+        self._scroll_original = str(tree.cget('yscrollcommand') or '')
+        if barra is None and self._scroll_original.endswith(' set'):
+            barra = tree.nametowidget(self._scroll_original.split()[0])
+        self.barra = barra
+        # El Treeview nunca tiene filas fuera de la vista: la barra la lleva la tabla
+        tree.configure(yscrollcommand='')
+        if barra is not None:
+            barra.configure(command=self.yview)
+        tree.bind('<Configure>', self._al_redimensionar, add='+')
+        tree.bind('<MouseWheel>', self._al_rodar)
+        tree.bind('<Button-4>', lambda e: self._desplazar(-PASO_RUEDA))
+        tree.bind('<Button-5>', lambda e: self._desplazar(PASO_RUEDA))
+        tree.bind('<Up>', lambda e: self._al_mover_foco(-1))
+        tree.bind('<Down>', lambda e: self._al_mover_foco(1))
+        tree.bind('<Prior>', lambda e: self._desplazar(-self.filas_visibles))
+        tree.bind('<Next>', lambda e: self._desplazar(self.filas_visibles))
+
+    def __len__(self):
+        return len(self._orden)
+
+    def mostrar(self, textos, claves=None, iids=None):
+        """
+        textos: una secuencia de textos por columna del Treeview, en orden.
+        claves: valores por columna para ordenar (por defecto, los textos).
+        iids: identificador de cada fila en el Treeview (opcional).
+        """
+        self._textos = [np.asarray(c, dtype=object) for c in textos]
+        self._claves = [np.asarray(c) for c in (claves if claves is not None else textos)]
+        self._iids = None if iids is None else np.asarray(iids).astype(str)
+        self._orden = np.arange(len(self._textos[0]) if self._textos else 0)
+        self.inicio = 0
+        self._pintar()
+
+    def ordenar(self, col, reverse=False):
+        """
+        Ordena por la columna `col` (nombre de columna del Treeview).
+        """
+        if not len(self._orden):
+            return
+        idx = list(self.tree['columns']).index(col)
+        orden = np.argsort(self._claves[idx], kind='stable')
+        self._orden = orden[::-1] if reverse else orden
+        self.inicio = 0
+        self._pintar()
+
+    # --- Ventana ---
+
+    def _ultimo_inicio(self):
+        return max(len(self._orden) - self.filas_visibles, 0)
+
+    def _pintar(self):
+        """
+        Sustituye las filas del Treeview por las de la ventana actual y
+        coloca la barra según el total.
+        """
+        self.inicio = min(max(self.inicio, 0), self._ultimo_inicio())
+        tree = self.tree
+        seleccion = tree.selection()
+        hijos = tree.get_children()
+        if hijos:
+            tree.delete(*hijos)
+        fin = min(self.inicio + self.filas_visibles, len(self._orden))
+        insertar = tree.insert
+        for i in range(self.inicio, fin):
+            fila = self._orden[i]
+            valores = tuple(c[fila] for c in self._textos)
+            tags = ('alternate',) if i % 2 == 1 else ()
+            if self._iids is None:
+                insertar('', 'end', values=valores, tags=tags)
+            else:
+                insertar('', 'end', iid=self._iids[fila], values=valores, tags=tags)
+        if seleccion and self._iids is not None:
+            tree.selection_set([i for i in seleccion if tree.exists(i)])
+        self._colocar_barra(fin)
+
+    def _colocar_barra(self, fin):
+        total = len(self._orden)
+        (primero, ultimo) = (self.inicio / total, fin / total) if total else (0.0, 1.0)
+        if self.barra is not None:
+            self.barra.set(primero, ultimo)
+        elif self._scroll_original:
+            self.tree.tk.eval(f'{self._scroll_original} {primero} {ultimo}')
+
+    def _desplazar(self, filas):
+        inicio = min(max(self.inicio + filas, 0), self._ultimo_inicio())
+        if inicio != self.inicio:
+            self.inicio = inicio
+            self._pintar()
+        return 'break'
+
+    def yview(self, *args):
+        """
+        Comando de la barra: ('moveto', fracción) o ('scroll', n, 'units'|'pages').
+        """
+        if not args:
+            return
+        if args[0] == 'moveto':
+            inicio = int(round(float(args[1]) * len(self._orden)))
+            self._desplazar(inicio - self.inicio)
+        elif args[0] == 'scroll':
+            n = int(args[1])
+            self._desplazar(n * self.filas_visibles if args[2] == 'pages' else n)
+
+    # --- Eventos del Treeview ---
+
+    def _al_redimensionar(self, event):
+        from tkinter import ttk
+        alto_fila = int(ttk.Style(self.tree).lookup(self.tree.cget('style') or 'Treeview', 'rowheight') or 20)
+        # Una fila menos por la cabecera
+        filas = max(int(event.height) // alto_fila - 1, 1)
+        if filas != self.filas_visibles:
+            self.filas_visibles = filas
+            self._pintar()
+
+    def _al_rodar(self, event):
+        return self._desplazar(-PASO_RUEDA if event.delta > 0 else PASO_RUEDA)
+
+    def _al_mover_foco(self, paso):
+        """
+        Las flechas en el borde de la ventana la desplazan una fila y
+        llevan el foco a la fila que entra.
+        """
+        hijos = self.tree.get_children()
+        if not hijos:
+            return None
+        foco = self.tree.focus()
+        borde = hijos[0] if paso < 0 else hijos[-1]
+        if foco != borde:
+            return None  # dentro de la ventana, el Treeview mueve el foco
+        self._desplazar(paso)
+        hijos = self.tree.get_children()
+        nuevo = hijos[0] if paso < 0 else hijos[-1]
+        self.tree.focus(nuevo)
+        self.tree.selection_set(nuevo)
+        return 'break'
@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+import types
+
+import pandas as pd
+
+# Los módulos de la aplicación están en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _excel_utils_falso():
+    """
+    excel_utils mínimo para las pruebas (como las hojas falsas de
+    tests/fakes.py para Sheets): lee y escribe la hoja de compras con
+    pandas. Solo se usa si el módulo real no está instalado.
+    """
+    modulo = types.ModuleType('excel_utils')
+    modulo.ARCHIVO = os.path.join(tempfile.gettempdir(), 'contabilidad_bar_pruebas.xlsx')
+
+    def cargar_excel(archivo=modulo.ARCHIVO):
+        if not os.path.exists(archivo):
+            return pd.DataFrame(columns=['Producto', 'Familia', 'Proveedor', 'Cantidad',
+                                         'Precio Unitario', 'Importe', 'Fecha'])
+        return pd.read_excel(archivo)
+
+    def guardar_datos(df, archivo=modulo.ARCHIVO):
+        df.to_excel(archivo, index=False)
+
+    modulo.cargar_excel = cargar_excel
+    modulo.guardar_datos = guardar_datos
+    modulo.actualizar_familias_excel = lambda producto, familia: None
+    modulo.resource_path = lambda ruta: ruta
+    modulo.VentanaProgreso = object
+    return modulo
+
+
+try:
+    import excel_utils  # noqa: F401
+except ImportError:
+    sys.modules['excel_utils'] = _excel_utils_falso()
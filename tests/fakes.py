@@ -0,0 +1,147 @@
+"""
+Hojas falsas con la interfaz de gspread.Worksheet que usan hoja_compras.py
+y cola_sync.py, para probarlos sin Google Sheets, y un modelo falso con la
+interfaz de Gemini que usa extraccion_ia.py.
+"""
+import threading
+import time
+
+
+class HojaEnMemoria:
+    """
+    Hoja en memoria. Cuenta las llamadas en `llamadas`.
+    """
+
+    def __init__(self, cabecera, filas=()):
+        self.filas = [list(cabecera)] + [list(f) for f in filas]
+        self.llamadas = []
+
+    def append_rows(self, filas, **kwargs):
+        self.llamadas.append('append_rows')
+        self.filas.extend([str(v) for v in f] for f in filas)
+
+    def row_values(self, fila):
+        self.llamadas.append('row_values')
+        return list(self.filas[fila - 1]) if fila <= len(self.filas) else []
+
+    def col_values(self, col):
+        self.llamadas.append('col_values')
+        return [f[col - 1] for f in self.filas if len(f) >= col and f[col - 1] != '']
+
+    def get_all_values(self):
+        self.llamadas.append('get_all_values')
+        return [list(f) for f in self.filas]
+
+    def get(self, rango):
+        self.llamadas.append('get')
+        inicio, fin = rango.split(':')
+        desde = int(''.join(c for c in inicio if c.isdigit()))
+        hasta = int(''.join(c for c in fin if c.isdigit()))
+        return [list(f) for f in self.filas[desde - 1:hasta]]
+
+
+class HojaInestable(HojaEnMemoria):
+    """
+    HojaEnMemoria que simula una mala conexión: con `caida` cierto todas las
+    llamadas fallan, y las próximas `perder_respuestas` llamadas a
+    append_rows escriben pero fallan como si la respuesta no llegase.
+    """
+
+    def __init__(self, cabecera, filas=()):
+        super().__init__(cabecera, filas)
+        self.caida = False
+        self.perder_respuestas = 0
+
+    def _comprobar(self):
+        if self.caida:
+            raise ConnectionError('Sin conexión con Google Sheets')
+
+    def append_rows(self, filas, **kwargs):
+        self._comprobar()
+        super().append_rows(filas, **kwargs)
+        if self.perder_respuestas > 0:
+            self.perder_respuestas -= 1
+            raise TimeoutError('Sin respuesta de Google Sheets')
+
+    def row_values(self, fila):
+        self._comprobar()
+        return super().row_values(fila)
+
+    def col_values(self, col):
+        self._comprobar()
+        return super().col_values(col)
+
+    def get_all_values(self):
+        self._comprobar()
+        return super().get_all_values()
+
+    def get(self, rango):
+        self._comprobar()
+        return super().get(rango)
+
+
+class Reloj:
+    """
+    Reloj manual para los TTL y las esperas: avanza solo con `avanzar`.
+    """
+
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self):
+        return self.ahora
+
+    def avanzar(self, segundos):
+        self.ahora += segundos
+
+
+class ErrorApi(Exception):
+    """
+    Error de la API con su código HTTP, como los de google.api_core.
+    """
+
+    def __init__(self, code, mensaje=''):
+        super().__init__(mensaje or f'HTTP {code}')
+        self.code = code
+
+
+class RespuestaModelo:
+
+    def __init__(self, text):
+        self.text = text
+
+
+class ModeloFalso:
+    """
+    Modelo con generate_content que responde según `respuestas`, un dict
+    imagen -> lista de respuestas para cada intento (texto, o excepción que
+    se lanza). El último elemento se repite en los intentos siguientes.
+    Anota cada llamada en `llamadas` y el máximo de llamadas simultáneas en
+    `max_en_vuelo`. `retardo` (imagen -> segundos) hace que algunas tarden.
+    """
+
+    def __init__(self, respuestas, retardo=None):
+        self.respuestas = respuestas
+        self.retardo = retardo or {}
+        self.llamadas = []
+        self.en_vuelo = 0
+        self.max_en_vuelo = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, contenido, request_options=None):
+        imagen = contenido[-1]
+        with self._lock:
+            intento = sum(1 for i in self.llamadas if i == imagen)
+            self.llamadas.append(imagen)
+            self.en_vuelo += 1
+            self.max_en_vuelo = max(self.max_en_vuelo, self.en_vuelo)
+        try:
+            time.sleep(self.retardo.get(imagen, 0))
+            opciones = self.respuestas[imagen]
+            respuesta = opciones[min(intento, len(opciones) - 1)]
+            if isinstance(respuesta, BaseException):
+                raise respuesta
+            return RespuestaModelo(respuesta)
+        finally:
+            with self._lock:
+                self.en_vuelo -= 1
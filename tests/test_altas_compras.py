@@ -0,0 +1,32 @@
+"""
+Validación de las líneas tecleadas a mano (formulario y alta múltiple).
+"""
+import pytest
+
+from altas_compras import validar_linea
+
+
+def linea(cantidad, importe):
+    return {'Producto': 'queso', 'Proveedor': 'lactalis', 'Cantidad': cantidad,
+            'Importe': importe, 'Fecha': '18/10/2026'}
+
+
+@pytest.mark.parametrize('cantidad, esperada', [
+    ('1.500', 1.5),
+    ('1,5', 1.5),
+    ('0.250', 0.25),
+    ('12', 12.0),
+    (3, 3.0),
+])
+def test_cantidad_con_punto_decimal(cantidad, esperada):
+    # Como float() en el formulario antiguo: '1.500' kg son 1,5 kg
+    fila = validar_linea(linea(cantidad, '6'))
+    assert fila['Cantidad'] == esperada
+    assert fila['Precio Unitario'] == pytest.approx(6 / esperada)
+
+
+def test_linea_no_valida():
+    with pytest.raises(ValueError, match='números'):
+        validar_linea(linea('mucho', '6'))
+    with pytest.raises(ValueError, match='mayor que cero'):
+        validar_linea(linea('0', '6'))
@@ -0,0 +1,131 @@
+import pytest
+
+from cola_sync import ColaSync, COLUMNA_CLAVE
+from hoja_compras import HojaCompras
+
+from fakes import HojaInestable, Reloj
+
+CABECERA = ['Producto', 'Proveedor', 'Cantidad', 'Precio Unitario', 'Importe', 'Fecha', 'Clave']
+FILA = ['CERVEZA', 'VOLDIS', 24, 0.85, 20.40, '12/03/2024']
+
+
+@pytest.fixture
+def hoja():
+    return HojaInestable(CABECERA)
+
+
+@pytest.fixture
+def reloj():
+    return Reloj()
+
+
+@pytest.fixture
+def cola(hoja, reloj, tmp_path):
+    return ColaSync(conectar=lambda: hoja, ruta=str(tmp_path / 'cola.db'), espera_base=1.0, reloj=reloj)
+
+
+def claves_en_hoja(hoja):
+    return hoja.col_values(COLUMNA_CLAVE)[1:]
+
+
+def test_encolar_no_toca_la_red(cola, hoja):
+    hoja.caida = True
+    clave = cola.encolar(FILA)
+    assert cola.pendientes() == 1
+    assert hoja.llamadas == []
+    assert cola.filas(enviadas=False) == [FILA]
+    assert len(clave) == 32
+
+
+def test_sin_conexion_se_reintenta_con_espera(cola, hoja, reloj):
+    hoja.caida = True
+    cola.encolar(FILA)
+    assert cola.vaciar() == 0
+    assert cola.estado()['reintentando'] == 1
+    hoja.caida = False
+    assert cola.vaciar() == 0  # aún dentro de la espera
+    reloj.avanzar(cola.espera_maxima)
+    assert cola.vaciar() == 1
+    assert cola.pendientes() == 0
+    assert len(claves_en_hoja(hoja)) == 1
+
+
+def test_respuesta_perdida_no_duplica(cola, hoja, reloj):
+    clave = cola.encolar(FILA)
+    hoja.perder_respuestas = 1
+    assert cola.vaciar() == 0  # la fila llegó, pero no la respuesta
+    assert claves_en_hoja(hoja) == [clave]
+    reloj.avanzar(cola.espera_maxima)
+    assert cola.vaciar() == 1
+    assert claves_en_hoja(hoja) == [clave]
+    assert hoja.llamadas.count('append_rows') == 1
+
+
+def test_respuesta_perdida_envia_solo_lo_que_falta(cola, hoja, reloj):
+    primera = cola.encolar(FILA)
+    hoja.perder_respuestas = 1
+    cola.vaciar()
+    segunda = cola.encolar(['CAFE', 'CANDELAS', 2, 9.5, 19.0, '13/03/2024'])
+    reloj.avanzar(cola.espera_maxima)
+    assert cola.vaciar() == 2
+    assert claves_en_hoja(hoja) == [primera, segunda]
+
+
+def test_misma_clave_se_encola_una_vez(cola, hoja):
+    cola.encolar(FILA, clave='formulario-1')
+    cola.encolar(FILA, clave='formulario-1')
+    assert cola.pendientes() == 1
+    cola.vaciar()
+    assert claves_en_hoja(hoja) == ['formulario-1']
+
+
+def test_repetidas_en_cola(cola):
+    cola.encolar(FILA)
+    assert cola.repetidas([FILA, ['CAFE', 'CANDELAS', 2, 9.5, 19.0, '13/03/2024']]) == [True, False]
+
+
+def test_repetidas_incluye_las_enviadas(cola):
+    cola.encolar(FILA)
+    cola.vaciar()
+    assert cola.pendientes() == 0
+    assert cola.repetidas([FILA, FILA]) == [True, False]
+
+
+def test_avisa_solo_de_las_filas_nuevas(cola, hoja, reloj):
+    avisos = []
+    cola.al_enviar = avisos.append
+    cola.encolar(FILA)
+    hoja.perder_respuestas = 1
+    cola.vaciar()
+    assert avisos == []  # sin respuesta no se da por enviada
+    cafe = ['CAFE', 'CANDELAS', 2, 9.5, 19.0, '13/03/2024']
+    cola.encolar(cafe)
+    reloj.avanzar(cola.espera_maxima)
+    assert cola.vaciar() == 2
+    # FILA ya estaba en la hoja: no se vuelve a anotar
+    assert avisos == [[cafe]]
+
+
+def test_reintento_no_cuenta_dos_veces(cola, hoja, reloj):
+    compras = HojaCompras(hoja, reloj=reloj)
+    cola.al_enviar = compras.anotar_enviadas
+    cola.encolar(FILA)
+    hoja.perder_respuestas = 1
+    cola.vaciar()
+    # La hoja ya se lee con la fila de la respuesta perdida
+    assert compras.ultimas(5)['Producto'].tolist() == ['CERVEZA']
+    assert compras.repetidas([FILA, FILA]) == [True, False]
+    reloj.avanzar(cola.espera_maxima)
+    cola.vaciar()
+    assert compras.ultimas(5)['Producto'].tolist() == ['CERVEZA']
+    assert compras.repetidas([FILA, FILA], leer=False) == [True, False]
+
+
+def test_historial_al_dia_tras_enviar(cola, hoja, reloj):
+    compras = HojaCompras(hoja, reloj=reloj)
+    cola.al_enviar = compras.anotar_enviadas
+    assert compras.ultimas(5).empty
+    cola.encolar(FILA)
+    cola.vaciar()
+    # Sin esperar al TTL de la caché de lecturas
+    assert compras.ultimas(5)['Producto'].tolist() == ['CERVEZA']
@@ -0,0 +1,89 @@
+import pytest
+
+from extraccion_ia import ColaExtraccion, CuboFichas, extraer_json, es_reintentable
+
+from fakes import ErrorApi, ModeloFalso, Reloj
+
+TICKET = '```json\n{"proveedor": "MERCADONA", "total": 12.5}\n```'
+
+
+def crear(respuestas, retardo=None, **kwargs):
+    reloj = Reloj()
+    esperas = []
+
+    def dormir(segundos):
+        esperas.append(segundos)
+        reloj.avanzar(segundos)
+
+    modelo = ModeloFalso(respuestas, retardo)
+    cola = ColaExtraccion(modelo, reloj=reloj, dormir=dormir, **kwargs)
+    return (modelo, cola, esperas)
+
+
+def test_extraer_json():
+    assert extraer_json(TICKET) == {'proveedor': 'MERCADONA', 'total': 12.5}
+    assert extraer_json('No veo ningún ticket') is None
+
+
+def test_reintenta_errores_pasajeros():
+    (modelo, cola, esperas) = crear({'a': [ErrorApi(429), ErrorApi(503), TICKET]}, por_minuto=6000)
+    assert cola.extraer('a')['total'] == 12.5
+    assert modelo.llamadas == ['a'] * 3
+    # Espera exponencial con azar: base, 2 × base...
+    assert len(esperas) == 2
+    assert 1.0 <= esperas[0] <= 2.0 and 2.0 <= esperas[1] <= 4.0
+
+
+def test_no_reintenta_errores_definitivos():
+    (modelo, cola, esperas) = crear({'a': [ErrorApi(400), TICKET]}, por_minuto=6000)
+    with pytest.raises(ErrorApi):
+        cola.extraer('a')
+    assert modelo.llamadas == ['a']
+    assert esperas == []
+
+
+def test_agota_los_reintentos():
+    (modelo, cola, _) = crear({'a': [TimeoutError()]}, por_minuto=6000, reintentos=2)
+    with pytest.raises(TimeoutError):
+        cola.extraer('a')
+    assert len(modelo.llamadas) == 3
+
+
+def test_es_reintentable():
+    assert es_reintentable(ErrorApi(503))
+    assert es_reintentable(TimeoutError())
+    assert not es_reintentable(ErrorApi(404))
+    assert not es_reintentable(ValueError('JSON roto'))
+
+
+def test_cubo_de_fichas_marca_el_ritmo():
+    reloj = Reloj()
+    cubo = CuboFichas(60, capacidad=2, reloj=reloj, dormir=reloj.avanzar)
+    momentos = []
+    for _ in range(5):
+        cubo.tomar()
+        momentos.append(reloj())
+    # Dos de ráfaga y después una por segundo
+    assert momentos == pytest.approx([0.0, 0.0, 1.0, 2.0, 3.0])
+
+
+def test_lote_en_orden_y_errores_aislados():
+    respuestas = {img: [f'{{"n": {n}}}'] for n, img in enumerate('abcdef')}
+    respuestas['c'] = [ValueError('respuesta ilegible')]
+    # 'a' termina la última, pero procesar respeta el orden de entrada
+    (modelo, cola, _) = crear(respuestas, retardo={'a': 0.2}, concurrencia=3, por_minuto=6000)
+    iterador = cola.iterar(list('abcdef'))
+    assert next(iterador).indice != 0
+    iterador.close()
+    resultados = cola.procesar(list('abcdef'))
+    assert [r.indice for r in resultados] == list(range(6))
+    assert resultados[2].datos is None and 'ilegible' in resultados[2].error
+    assert [r.datos['n'] for r in resultados if r.error is None] == [0, 1, 3, 4, 5]
+
+
+def test_limite_de_peticiones_en_vuelo():
+    imagenes = [str(i) for i in range(8)]
+    (modelo, cola, _) = crear({i: [TICKET] for i in imagenes}, retardo={i: 0.05 for i in imagenes},
+                              concurrencia=3, por_minuto=6000)
+    cola.procesar(imagenes)
+    assert 1 < modelo.max_en_vuelo <= 3
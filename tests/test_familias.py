@@ -0,0 +1,53 @@
+import itertools
+import os
+import threading
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import familias
+import libro_compras
+
+
+_MTIME = itertools.count(10 ** 18, 10 ** 9)
+
+
+def escribir(ruta, columnas):
+    with pd.ExcelWriter(ruta) as escritor:
+        pd.DataFrame(columnas).to_excel(escritor, sheet_name='Familias', index=False)
+    # Cada escritura con su propia fecha, aunque el sistema de archivos redondee
+    mtime = next(_MTIME)
+    os.utime(ruta, ns=(mtime, mtime))
+
+
+@pytest.fixture
+def ruta(tmp_path, monkeypatch):
+    ruta = str(tmp_path / 'contabilidad_bar.xlsx')
+    monkeypatch.setattr(libro_compras, '_libro', SimpleNamespace(archivo=ruta, bloqueo_excel=threading.RLock()))
+    monkeypatch.setattr(familias, '_cache', (None, None))
+    return ruta
+
+
+def test_sin_archivo(ruta):
+    assert familias.familias_del_libro() is None
+
+
+def test_misma_tabla_mientras_no_cambie(ruta, monkeypatch):
+    escribir(ruta, {'Bebidas': ['cerveza', 'agua'], 'Café': ['café molido', None]})
+    primera = familias.familias_del_libro()
+    assert primera.to_dict('records') == [
+        {'Producto': 'CERVEZA', 'Familia': 'BEBIDAS'},
+        {'Producto': 'AGUA', 'Familia': 'BEBIDAS'},
+        {'Producto': 'CAFE MOLIDO', 'Familia': 'CAFE'}]
+    lecturas = []
+    original = familias.cargar_familias_desde_excel
+    monkeypatch.setattr(familias, 'cargar_familias_desde_excel', lambda *a: lecturas.append(1) or original(*a))
+    assert familias.familias_del_libro() is primera
+    assert lecturas == []
+    # Reescrito con el mismo contenido (p. ej. la exportación del libro)
+    escribir(ruta, {'Bebidas': ['cerveza', 'agua'], 'Café': ['café molido', None]})
+    assert familias.familias_del_libro() is primera
+    assert lecturas == [1]
+    escribir(ruta, {'Bebidas': ['cerveza']})
+    assert familias.familias_del_libro()['Producto'].tolist() == ['CERVEZA']
@@ -0,0 +1,58 @@
+from hoja_compras import HojaCompras, clave_fila
+
+from fakes import HojaEnMemoria, Reloj
+
+CABECERA = ['Producto', 'Proveedor', 'Cantidad', 'Precio Unitario', 'Importe', 'Fecha']
+FILA_A = ['CERVEZA', 'VOLDIS', '24', '0.85', '20.40', '12/03/2024']
+FILA_B = ['CAFE', 'CANDELAS', '2', '9.50', '19.00', '13/03/2024']
+
+
+def crear(filas=(FILA_A,), **kwargs):
+    hoja = HojaEnMemoria(CABECERA, filas)
+    reloj = Reloj()
+    return (hoja, reloj, HojaCompras(hoja, reloj=reloj, **kwargs))
+
+
+def test_lecturas_cacheadas_hasta_el_ttl():
+    (hoja, reloj, compras) = crear()
+    compras.ultimas(5)
+    compras.ultimas(5)
+    assert hoja.llamadas.count('get') == 1
+    reloj.avanzar(compras.ttl)
+    compras.ultimas(5)
+    assert hoja.llamadas.count('get') == 2
+
+
+def test_ultimas_lee_solo_el_rango():
+    (hoja, _, compras) = crear([FILA_A, FILA_B, FILA_A])
+    assert compras.ultimas(2)['Producto'].tolist() == ['CAFE', 'CERVEZA']
+    assert 'get_all_values' not in hoja.llamadas
+
+
+def test_clave_fila_normaliza_formatos():
+    assert clave_fila(FILA_A) == clave_fila(['cerveza ', 'Voldis', 24, 0.85, '20,40', '12/03/2024'])
+
+
+def test_repetidas_sin_leer_no_espera_a_la_red():
+    (hoja, reloj, compras) = crear()
+    # Sin claves leídas aún: no se sabe, y se leen en segundo plano
+    assert compras.repetidas([FILA_A], leer=False) == [False]
+    compras._hilo_claves.join()
+    assert compras.repetidas([FILA_A, FILA_B], leer=False) == [True, False]
+    assert hoja.llamadas.count('get_all_values') == 1
+    # Caducadas: se usan las que hay y se renuevan
+    reloj.avanzar(compras.ttl)
+    assert compras.repetidas([FILA_A], leer=False) == [True]
+    compras._hilo_claves.join()
+    assert hoja.llamadas.count('get_all_values') == 2
+
+
+def test_filas_enviadas_por_otro_sin_esperar_al_ttl():
+    (hoja, _, compras) = crear()
+    assert compras.ultimas(5)['Producto'].tolist() == ['CERVEZA']
+    assert compras.repetidas([FILA_B]) == [False]
+    hoja.append_rows([FILA_B])  # p. ej. la cola de cola_sync.py
+    compras.anotar_enviadas([FILA_B])
+    assert compras.ultimas(5)['Producto'].tolist() == ['CERVEZA', 'CAFE']
+    assert compras.repetidas([FILA_B], leer=False) == [True]
+    assert hoja.llamadas.count('get_all_values') == 1
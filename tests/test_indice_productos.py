@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from indice_productos import IndiceAutocompletar
+from libro_compras import normalizar_filas
+
+
+def libro_de(filas):
+    return normalizar_filas(pd.DataFrame(filas, columns=['Producto', 'Familia', 'Proveedor', 'Cantidad',
+                                                         'Precio Unitario', 'Importe', 'Fecha']))
+
+
+def corregir(indice, df, pos, **valores):
+    antes = df.loc[[pos]]
+    despues = antes.copy()
+    for col, valor in valores.items():
+        despues[col] = valor
+    despues = normalizar_filas(despues[[c for c in despues.columns if not c.startswith('_')]])
+    indice.corregir(antes, despues)
+
+
+@pytest.fixture
+def df():
+    return libro_de([
+        ['CERVEZA', 'BEBIDAS', 'VOLDIS', 24, 0.85, 20.4, '01/03/2024'],
+        ['CERVEZA', 'BEBIDAS', 'VOLDIS', 24, 0.85, 20.4, '08/03/2024'],
+        ['CERVEZA', 'BEBIDAS', 'CANDELAS', 24, 0.80, 19.2, '15/03/2024'],
+        ['CAFE', 'CAFE', 'CANDELAS', 2, 9.5, 19.0, '15/03/2024']])
+
+
+def test_corregir_proveedor_actualiza_recuentos(df):
+    indice = IndiceAutocompletar()
+    indice.reconstruir(df)
+    assert indice.buscar('CER').proveedores == ['VOLDIS', 'CANDELAS']
+    corregir(indice, df, 0, Proveedor='CANDELAS')
+    corregir(indice, df, 1, Proveedor='CANDELAS')
+    assert indice.buscar('CER').proveedores == ['CANDELAS']
+
+
+def test_corregir_producto_mueve_la_compra(df):
+    indice = IndiceAutocompletar()
+    indice.reconstruir(df)
+    corregir(indice, df, 3, Producto='CAFE MOLIDO', Familia='CAFES')
+    assert indice.buscar('CAFE').productos == ['CAFE MOLIDO']
+    assert indice.familia_de('CAFE MOLIDO') == 'CAFES'
+    assert indice.familia_de('CAFE') == ''
+
+
+def test_corregir_familia_de_la_primera_compra(df):
+    indice = IndiceAutocompletar()
+    indice.reconstruir(df)
+    corregir(indice, df, 0, Familia='CERVEZAS')
+    assert indice.familia_de('CERVEZA') == 'CERVEZAS'
+
+
+def test_familias_se_cargan_fuera_de_reconstruir(df):
+    llamadas = []
+
+    def cargar():
+        llamadas.append(1)
+        return pd.DataFrame({'Producto': ['AGUA'], 'Familia': ['BEBIDAS']})
+    indice = IndiceAutocompletar(cargar_familias=cargar)
+    indice.reconstruir(df)
+    assert llamadas == []
+    assert indice.familia_de('AGUA') == 'BEBIDAS'
+    indice.buscar('A')
+    assert llamadas == [1]
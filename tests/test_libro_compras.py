@@ -0,0 +1,94 @@
+"""
+Ida y vuelta del libro entre el almacén y el Excel: lo que se sustituye en
+el almacén y lo que se edita fuera en el Excel no debe perder ni duplicar
+filas al volver a abrir.
+"""
+import os
+
+import pandas as pd
+
+from almacen import AlmacenCompras
+from libro_compras import LibroCompras, normalizar_filas
+
+
+def fila(producto, importe):
+    return {'Producto': producto, 'Familia': 'BEBIDAS', 'Proveedor': 'VOLDIS', 'Cantidad': 1,
+            'Precio Unitario': importe, 'Importe': importe, 'Fecha': '01-02-2024'}
+
+
+def abrir(tmp_path, monkeypatch):
+    libro = LibroCompras(archivo=str(tmp_path / 'libro.xlsx'),
+                         almacen=AlmacenCompras(str(tmp_path / 'libro.db')))
+    # La exportación solo cuando la pide el test
+    monkeypatch.setattr(libro, '_programar_exportacion', lambda: None)
+    return libro
+
+
+def test_reemplazar_y_editar_fuera(tmp_path, monkeypatch):
+    libro = abrir(tmp_path, monkeypatch)
+    libro.agregar_filas([fila('A', 1.0), fila('B', 2.0), fila('C', 3.0)])
+    libro.exportar()
+    libro.agregar_filas([fila('D', 4.0)])  # aún sin exportar
+    df = libro.datos()
+    libro.reemplazar(df[df['Producto'] != 'B'])
+
+    # Edición externa del Excel (que aún tiene A, B y C) antes de exportar
+    excel = pd.read_excel(libro.archivo)
+    excel.loc[excel['Producto'] == 'A', 'Importe'] = 10.0
+    excel.to_excel(libro.archivo, index=False)
+    st = os.stat(libro.archivo)
+    os.utime(libro.archivo, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    df = abrir(tmp_path, monkeypatch).datos()
+    assert df['Producto'].tolist() == ['A', 'B', 'C', 'D']
+    assert df['Importe'].tolist() == [10.0, 2.0, 3.0, 4.0]
+
+
+def test_reemplazar_sin_exportadas(tmp_path, monkeypatch):
+    libro = abrir(tmp_path, monkeypatch)
+    libro.agregar_filas([fila('A', 1.0), fila('B', 2.0)])
+    libro.reemplazar(libro.datos().iloc[1:])
+    assert libro.almacen.leer_meta('ultimo_exportado') == '0'
+
+    df = abrir(tmp_path, monkeypatch).datos()
+    assert df['Producto'].tolist() == ['B']
+
+
+def test_fechas_con_separadores_mezclados():
+    # Excel y formulario con '/', OCR antiguo con '-', fechas del Excel en ISO
+    df = pd.DataFrame([dict(fila('A', 1.0), Fecha=f) for f in
+                       ('18/10/2026', '05-03-2026', '2026-03-05', '05/03/2026')])
+    fechas = normalizar_filas(df)['_fecha']
+    assert fechas.tolist() == [pd.Timestamp(2026, 10, 18)] + [pd.Timestamp(2026, 3, 5)] * 3
+
+
+class VistaAnotada:
+
+    def __init__(self, corregible=True):
+        self.llamadas = []
+        if corregible:
+            self.corregir = lambda antes, despues: self.llamadas.append(
+                ('corregir', antes['Importe'].tolist(), despues['Importe'].tolist()))
+
+    def reconstruir(self, df):
+        self.llamadas.append(('reconstruir', len(df)))
+
+    def agregar(self, df):
+        self.llamadas.append(('agregar', len(df)))
+
+
+def test_actualizar_fila_corrige_las_vistas(tmp_path, monkeypatch):
+    libro = abrir(tmp_path, monkeypatch)
+    libro.agregar_filas([fila('A', 1.0), fila('B', 2.0)])
+    (corregible, otra) = (VistaAnotada(), VistaAnotada(corregible=False))
+    libro.registrar_vista(corregible)
+    libro.registrar_vista(otra)
+    id_b = int(libro.datos().loc[libro.datos()['Producto'] == 'B', '_id'].iloc[0])
+    libro.actualizar_fila(id_b, {'Importe': 5.0, 'Fecha': '2024-02-03'})
+
+    assert corregible.llamadas[-1] == ('corregir', [2.0], [5.0])
+    assert otra.llamadas[-1] == ('reconstruir', 2)
+    df = libro.datos()
+    assert df['Importe'].tolist() == [1.0, 5.0]
+    assert df['_fecha'].iloc[1] == pd.Timestamp(2024, 2, 3)
+    assert abrir(tmp_path, monkeypatch).datos()['Importe'].tolist() == [1.0, 5.0]
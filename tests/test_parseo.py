@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import parseo
+from parseo import a_fechas, a_numero
+
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('0.125', 0.125),
+    ('-0.125', -0.125),
+    ('.125', 0.125),
+    ('3.750', 3750.0),
+    ('1.234.567', 1234567.0),
+    ('1.234,56', 1234.56),
+    ('1,234.56', 1234.56),
+    ('1,234', 1.234),
+    ('12,5', 12.5),
+    ('3.75', 3.75),
+    ('7', 7.0),
+])
+def test_a_numero(texto, esperado):
+    assert a_numero(texto) == esperado
+
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('3.750', 3.75),
+    ('0.125', 0.125),
+    ('1.234.567', 1234567.0),
+    ('1.234,56', 1234.56),
+    ('12,5 €', 12.5),
+])
+def test_a_numero_precio(texto, esperado):
+    assert a_numero(texto, precio=True) == esperado
+
+
+def test_a_numero_no_numero():
+    assert a_numero('abc') is None
+    assert a_numero('', 0.0) == 0.0
+    assert a_numero(None, 0.0) == 0.0
+
+
+def test_a_fechas_formatos_mezclados():
+    fechas = a_fechas(['18/10/2026', '05-03-2026', '2026-03-05', datetime(2026, 3, 5, 13, 30),
+                       '05/03/2026 00:00:00', '', None, 'abc'])
+    esperadas = [pd.Timestamp(2026, 10, 18)] + [pd.Timestamp(2026, 3, 5)] * 4 + [pd.NaT] * 3
+    assert fechas.tolist() == esperadas
+
+
+def test_corpus():
+    assert parseo.comprobar(aleatorios=500) == []
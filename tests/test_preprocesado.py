@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+
+import preprocesado
+from preprocesado import binarizar, enderezar, preparar_archivo, recortar_ticket, reducir
+
+
+def angulo_texto(gris):
+    _, tinta = cv2.threshold(gris, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return (cv2.minAreaRect(cv2.findNonZero(tinta))[-1] + 45) % 90 - 45
+
+
+def texto(angulo=0.0, alto=600, ancho=400):
+    """
+    Ticket blanco con renglones negros, girado `angulo` grados.
+    """
+    gris = np.full((alto, ancho), 255, np.uint8)
+    for y in range(150, alto - 150, 30):
+        cv2.line(gris, (80, y), (ancho - 80, y), 0, 6)
+    giro = cv2.getRotationMatrix2D((ancho / 2, alto / 2), angulo, 1.0)
+    return cv2.warpAffine(gris, giro, (ancho, alto), borderValue=255)
+
+
+def foto(ticket, margen=100):
+    """
+    El ticket sobre una mesa oscura.
+    """
+    return cv2.copyMakeBorder(ticket, margen, margen, margen, margen, cv2.BORDER_CONSTANT, value=40)
+
+
+def test_recorta_al_ticket():
+    recortada = recortar_ticket(foto(texto()))
+    assert abs(recortada.shape[0] - 600) <= 4 and abs(recortada.shape[1] - 400) <= 4
+
+
+def test_no_recorta_un_ticket_demasiado_pequeno():
+    gris = foto(texto(alto=100, ancho=100), margen=300)
+    assert recortar_ticket(gris) is gris
+
+
+def test_endereza_solo_giros_pequenos():
+    girado = texto(5.0)
+    assert abs(angulo_texto(girado)) > 4
+    assert abs(angulo_texto(enderezar(girado))) < 1
+    recto = texto()
+    assert enderezar(recto) is recto
+    muy_girado = texto(30.0)
+    assert enderezar(muy_girado) is muy_girado
+
+
+def test_reduce_solo_si_pasa_del_lado_maximo():
+    grande = np.full((3200, 1000), 255, np.uint8)
+    assert reducir(grande).shape == (1600, 500)
+    pequena = np.full((800, 300), 255, np.uint8)
+    assert reducir(pequena) is pequena
+
+
+def test_binariza_en_blanco_y_negro():
+    assert set(np.unique(binarizar(texto(5.0)))) <= {0, 255}
+
+
+def test_preparar_archivo_usa_la_cache(tmp_path):
+    ruta = tmp_path / 'ticket.png'
+    cv2.imwrite(str(ruta), foto(texto(3.0)))
+    destino = preparar_archivo(ruta, carpeta=str(tmp_path / 'cache'))
+    assert destino != str(ruta)
+    assert set(np.unique(cv2.imread(destino, cv2.IMREAD_GRAYSCALE))) <= {0, 255}
+    creado = (tmp_path / 'cache').stat().st_mtime_ns
+    assert preparar_archivo(ruta, carpeta=str(tmp_path / 'cache')) == destino
+    assert (tmp_path / 'cache').stat().st_mtime_ns == creado
+
+
+def test_sin_opencv_se_usa_el_original(tmp_path, monkeypatch):
+    ilegible = tmp_path / 'ticket.webp'
+    ilegible.write_bytes(b'no es una imagen')
+    assert preparar_archivo(ilegible, carpeta=str(tmp_path / 'cache')) == str(ilegible)
+
+    def falla(imagen, binario=True):
+        raise cv2.error('fallo de OpenCV')
+
+    ruta = tmp_path / 'ticket.png'
+    cv2.imwrite(str(ruta), foto(texto()))
+    monkeypatch.setattr(preprocesado, 'preparar', falla)
+    assert preparar_archivo(ruta, carpeta=str(tmp_path / 'cache')) == str(ruta)
+    assert not (tmp_path / 'cache').exists()
@@ -0,0 +1,144 @@
+"""
+La tabla virtual solo materializa la ventana visible, con un Treeview y una
+barra falsos que registran lo que se les pide.
+"""
+import itertools
+
+from tabla_virtual import TablaVirtual
+
+
+class BarraFalsa:
+
+    def __init__(self):
+        self.posicion = None
+        self.comando = None
+
+    def configure(self, command):
+        self.comando = command
+
+    def set(self, primero, ultimo):
+        self.posicion = (primero, ultimo)
+
+
+class TreeFalso:
+
+    def __init__(self, barra):
+        self.barra = barra
+        self.filas = {}  # iid -> valores, en orden
+        self.seleccion = ()
+        self.foco = ''
+        self._iids = itertools.count()
+        self.insertadas = 0
+
+    def __getitem__(self, clave):
+        return {'columns': ('Producto', 'Importe')}[clave]
+
+    def cget(self, opcion):
+        return {'yscrollcommand': '.barra set', 'style': 'Treeview'}[opcion]
+
+    def nametowidget(self, nombre):
+        assert nombre == '.barra'
+        return self.barra
+
+    def configure(self, **opciones):
+        pass
+
+    def bind(self, *args, **kwargs):
+        pass
+
+    def get_children(self):
+        return tuple(self.filas)
+
+    def delete(self, *iids):
+        for iid in iids:
+            del self.filas[iid]
+
+    def insert(self, padre, posicion, iid=None, values=(), tags=()):
+        iid = iid if iid is not None else f'I{next(self._iids)}'
+        self.filas[iid] = values
+        self.insertadas += 1
+        return iid
+
+    def selection(self):
+        return self.seleccion
+
+    def selection_set(self, iids):
+        self.seleccion = tuple([iids] if isinstance(iids, str) else iids)
+
+    def exists(self, iid):
+        return iid in self.filas
+
+    def focus(self, iid=None):
+        if iid is None:
+            return self.foco
+        self.foco = iid
+
+
+def crear(n=1000, visibles=20):
+    barra = BarraFalsa()
+    tree = TreeFalso(barra)
+    tabla = TablaVirtual(tree, filas_visibles=visibles)
+    productos = [f'P{i:04d}' for i in range(n)]
+    tabla.mostrar([productos, [str(i) for i in range(n)]], [productos, list(range(n))],
+                  iids=list(range(n)))
+    return (tabla, tree, barra)
+
+
+def valores(tree):
+    return [v[0] for v in tree.filas.values()]
+
+
+def test_solo_la_ventana_visible():
+    (tabla, tree, barra) = crear()
+    assert len(tabla) == 1000
+    assert valores(tree) == [f'P{i:04d}' for i in range(20)]
+    assert barra.comando == tabla.yview
+    assert barra.posicion == (0.0, 0.02)
+
+
+def test_barra_mueve_la_ventana():
+    (tabla, tree, barra) = crear()
+    tabla.yview('moveto', '0.5')
+    assert valores(tree)[0] == 'P0500'
+    assert len(tree.filas) == 20
+    assert barra.posicion == (0.5, 0.52)
+    tabla.yview('moveto', '1.0')
+    assert valores(tree)[-1] == 'P0999'
+    assert len(tree.filas) == 20
+    tabla.yview('scroll', '-1', 'pages')
+    assert valores(tree)[0] == 'P0960'
+    tabla.yview('scroll', '2', 'units')
+    assert valores(tree)[0] == 'P0962'
+
+
+def test_recorrer_no_acumula_filas():
+    (tabla, tree, _) = crear()
+    for _ in range(200):
+        tabla.yview('scroll', '1', 'pages')
+    assert len(tree.filas) == 20
+    assert valores(tree)[-1] == 'P0999'
+
+
+def test_ordenar_vuelve_al_principio():
+    (tabla, tree, _) = crear()
+    tabla.yview('moveto', '0.5')
+    tabla.ordenar('Importe', reverse=True)
+    assert tabla.inicio == 0
+    assert valores(tree)[:2] == ['P0999', 'P0998']
+
+
+def test_flecha_en_el_borde_desplaza_una_fila():
+    (tabla, tree, _) = crear()
+    tree.foco = tree.get_children()[-1]
+    assert tabla._al_mover_foco(1) == 'break'
+    assert valores(tree)[0] == 'P0001'
+    assert tree.foco == '20'
+    assert tree.seleccion == ('20',)
+
+
+def test_resultado_menor_que_la_ventana():
+    (tabla, tree, barra) = crear(n=5)
+    assert len(tree.filas) == 5
+    assert barra.posicion == (0.0, 1.0)
+    tabla.yview('scroll', '3', 'units')
+    assert tabla.inicio == 0
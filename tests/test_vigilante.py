@@ -0,0 +1,37 @@
+import threading
+
+from vigilante import VigilanteCarpeta
+
+from fakes import Reloj
+
+
+def crear(carpeta):
+    reloj = Reloj()
+    return (reloj, VigilanteCarpeta(carpeta, {'.pdf'}, estabilidad=3.0, reintento=60.0,
+                                    usar_watchdog=False, reloj=reloj))
+
+
+def test_entrega_los_archivos_estables(tmp_path):
+    (reloj, vigilante) = crear(tmp_path)
+    (tmp_path / 'a.pdf').write_bytes(b'%PDF')
+    (tmp_path / 'notas.txt').write_bytes(b'x')
+    assert vigilante.revisar() == []  # aún no se sabe si está completo
+    reloj.avanzar(3.0)
+    assert vigilante.revisar() == [[tmp_path / 'a.pdf']]
+    reloj.avanzar(3.0)
+    assert vigilante.revisar() == []  # ya entregado
+
+
+def test_reintentar_desde_otro_hilo(tmp_path):
+    (reloj, vigilante) = crear(tmp_path)
+    (tmp_path / 'a.pdf').write_bytes(b'%PDF')
+    vigilante.revisar()
+    reloj.avanzar(3.0)
+    lote = vigilante.revisar()[0]
+    # El trabajo del lote falla en su hilo mientras la ventana sigue revisando
+    hilo = threading.Thread(target=vigilante.reintentar, args=(lote,))
+    hilo.start()
+    hilo.join()
+    assert vigilante.revisar() == []
+    reloj.avanzar(60.0)
+    assert vigilante.revisar() == [lote]
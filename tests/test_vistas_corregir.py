@@ -0,0 +1,112 @@
+"""
+Las vistas del libro corregidas en su sitio deben quedar igual que
+reconstruidas desde cero con el libro ya corregido.
+"""
+import numpy as np
+import pandas as pd
+
+from busqueda import MotorBusqueda
+from libro_compras import normalizar_filas
+from precios import TablaPrecios, VENTANA
+
+PRODUCTOS = ['CERVEZA', 'CAFE', 'AGUA']
+PROVEEDORES = ['VOLDIS', 'CANDELAS']
+
+
+class LibroFalso:
+    """
+    Lo que las vistas usan del libro: datos() con las filas ya corregidas.
+    """
+
+    def __init__(self, df):
+        self.df = df
+
+    def datos(self):
+        return self.df
+
+
+def libro_aleatorio(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    cantidad = rng.integers(1, 10, n).astype(float)
+    precio = np.round(rng.uniform(0.5, 5.0, n), 2)
+    fechas = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 30, n), unit='D')
+    df = pd.DataFrame({
+        'Producto': rng.choice(PRODUCTOS, n),
+        'Familia': 'BEBIDAS',
+        'Proveedor': rng.choice(PROVEEDORES, n),
+        'Cantidad': cantidad,
+        'Precio Unitario': precio,
+        'Importe': np.round(cantidad * precio, 2),
+        'Fecha': fechas.strftime('%d/%m/%Y'),
+        '_id': np.arange(1, n + 1)})
+    return normalizar_filas(df)
+
+
+def corregir(libro, vista, pos, **valores):
+    df = libro.df.copy()
+    antes = df.loc[[pos]]
+    despues = antes[[c for c in antes.columns if not c.startswith('_') or c == '_id']].copy()
+    for col, valor in valores.items():
+        despues[col] = valor
+    despues = normalizar_filas(despues)
+    for col in despues.columns:
+        df.loc[[pos], col] = despues[col].to_numpy()
+    libro.df = df
+    vista.corregir(antes, despues)
+
+
+def ediciones(n, semilla=1):
+    rng = np.random.default_rng(semilla)
+    for _ in range(40):
+        yield (int(rng.integers(n)), {
+            'Producto': str(rng.choice(PRODUCTOS)),
+            'Proveedor': str(rng.choice(PROVEEDORES)),
+            'Precio Unitario': float(np.round(rng.uniform(0.5, 5.0), 2)),
+            'Fecha': pd.Timestamp('2024-01-01') + pd.Timedelta(days=int(rng.integers(0, 30)))})
+
+
+def resumen_precios(tabla):
+    return {(p, q): (h.compras, h._claves, h._precios)
+            for p, proveedores in tabla._por_producto.items() for q, h in proveedores.items()}
+
+
+def test_tabla_precios_corregir_igual_que_reconstruir():
+    libro = LibroFalso(libro_aleatorio(8 * VENTANA))
+    tabla = TablaPrecios(libro)
+    tabla.reconstruir(libro.df)
+    for pos, valores in ediciones(len(libro.df)):
+        valores['Fecha'] = valores['Fecha'].strftime('%d/%m/%Y')
+        corregir(libro, tabla, pos, **valores)
+        nueva = TablaPrecios()
+        nueva.reconstruir(libro.df)
+        assert resumen_precios(tabla) == resumen_precios(nueva)
+
+
+def test_tabla_precios_par_sin_compras_desaparece():
+    libro = LibroFalso(libro_aleatorio(1))
+    tabla = TablaPrecios(libro)
+    tabla.reconstruir(libro.df)
+    corregir(libro, tabla, 0, Producto='ZUMO')
+    assert tabla.proveedores_de(libro.df['Producto'].iloc[0]) != {}
+    assert set(tabla._por_producto) == {'ZUMO'}
+
+
+def test_motor_busqueda_corregir_igual_que_reconstruir():
+    libro = LibroFalso(libro_aleatorio(200))
+    motor = MotorBusqueda()
+    motor.reconstruir(libro.df)
+    filtros = [{}, {'producto': 'CAF'}, {'proveedor': 'VOL', 'producto': 'A'},
+               {'desde': pd.Timestamp('2024-01-10'), 'hasta': pd.Timestamp('2024-01-20')}]
+    for pos, valores in ediciones(len(libro.df)):
+        valores['Fecha'] = valores['Fecha'].strftime('%d/%m/%Y')
+        corregir(libro, motor, pos, **valores)
+        nuevo = MotorBusqueda()
+        nuevo.reconstruir(libro.df)
+        for kwargs in filtros:
+            filas = motor.buscar(**kwargs)
+            np.testing.assert_array_equal(filas, nuevo.buscar(**kwargs))
+            (textos, claves, ids) = motor.columnas(filas)
+            (textos_n, claves_n, ids_n) = nuevo.columnas(filas)
+            for a, b in zip(textos, textos_n):
+                np.testing.assert_array_equal(a, b)
+            np.testing.assert_array_equal(ids, ids_n)
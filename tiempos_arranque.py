@@ -0,0 +1,112 @@
+"""
+Informe de dónde se va el tiempo de arranque.
+
+Uso:
+    python tiempos_arranque.py [modulo ...] [-n 25]
+
+Importa los módulos en un proceso nuevo con `python -X importtime` y
+muestra los que más tardan en cargarse: por tiempo acumulado (con todo lo
+que importan) y por tiempo propio. Por defecto mide los módulos del
+proyecto que contabilidad_bar importa al arrancar; contabilidad_bar mismo
+no se puede importar tal cual (su código está en UTF-16).
+"""
+import argparse
+import importlib.util
+import re
+import subprocess
+import sys
+from collections import namedtuple
+
+Importacion = namedtuple('Importacion', ['modulo', 'propio', 'acumulado', 'nivel'])
+
+# Lo que contabilidad_bar importa del proyecto al arrancar
+ARRANQUE = ['libro_compras', 'indice_productos', 'precios', 'tabla_virtual', 'busqueda',
+            'altas_compras', 'familias', 'trabajos', 'vigilante', 'instrumentacion']
+
+_LINEA = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+_FALTA = re.compile(r"ModuleNotFoundError: No module named '([^']+)'")
+
+
+def comprobar_fuente(modulo):
+    """
+    Error claro (RuntimeError) si `modulo` no existe o su código no está en
+    UTF-8, antes de lanzar el intérprete.
+    """
+    spec = importlib.util.find_spec(modulo.split('.')[0])
+    if spec is None:
+        raise RuntimeError(f'No existe el módulo {modulo}')
+    if spec.origin and spec.origin.endswith('.py'):
+        with open(spec.origin, 'rb') as f:
+            inicio = f.read(2)
+        if inicio in (b'\xff\xfe', b'\xfe\xff'):
+            raise RuntimeError(f'{modulo} está guardado en UTF-16 y Python no puede importarlo: '
+                               f'mide los módulos que importa (por defecto: {" ".join(ARRANQUE)})')
+
+
+def medir(modulo, python=sys.executable):
+    """
+    Lista de Importacion (tiempos en milisegundos) al importar `modulo` en un
+    intérprete limpio.
+    """
+    comprobar_fuente(modulo)
+    proceso = subprocess.run([python, '-X', 'importtime', '-c', f'import {modulo}'],
+                             capture_output=True, text=True)
+    if proceso.returncode != 0:
+        error = proceso.stderr.strip().splitlines()
+        falta = _FALTA.search(proceso.stderr)
+        if falta:
+            raise RuntimeError(f'No se pudo importar {modulo}: falta el módulo {falta.group(1)}')
+        raise RuntimeError(f'No se pudo importar {modulo}: {error[-1] if error else proceso.returncode}')
+    importaciones = []
+    for linea in proceso.stderr.splitlines():
+        m = _LINEA.match(linea)
+        if m:
+            (propio, acumulado, sangria, nombre) = m.groups()
+            importaciones.append(Importacion(nombre, int(propio) / 1000, int(acumulado) / 1000, (len(sangria) - 1) // 2))
+    return importaciones
+
+
+def dependencias_directas(importaciones, modulo):
+    """
+    Lo que importa directamente `modulo`. -X importtime escribe cada módulo
+    después de los que importa, así que son las líneas de nivel 1 justo
+    antes de la suya.
+    """
+    fin = max(k for k, i in enumerate(importaciones) if i.nivel == 0 and i.modulo == modulo)
+    directas = []
+    for i in reversed(importaciones[:fin]):
+        if i.nivel == 0:
+            break
+        if i.nivel == 1:
+            directas.append(i)
+    return (importaciones[fin], directas)
+
+
+def informe(modulo, n=25):
+    importaciones = medir(modulo)
+    (raiz, directas) = dependencias_directas(importaciones, modulo)
+    total = raiz.acumulado
+    lineas = [f'== {modulo}: {total:.0f} ms en {len(importaciones)} módulos ==', '',
+              'Lo que importa directamente, con sus dependencias:']
+    for i in sorted(directas, key=lambda i: -i.acumulado)[:n]:
+        lineas.append(f'  {i.acumulado:9.1f} ms  {100 * i.acumulado / total:5.1f}%  {i.modulo}')
+    lineas += ['', 'Más lentos por sí solos:']
+    for i in sorted(importaciones, key=lambda i: -i.propio)[:n]:
+        lineas.append(f'  {i.propio:9.1f} ms  {i.modulo}')
+    return '\n'.join(lineas)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tiempos de importación al arrancar')
+    parser.add_argument('modulos', nargs='*', default=ARRANQUE)
+    parser.add_argument('-n', type=int, default=25, help='filas por tabla')
+    args = parser.parse_args()
+    fallos = 0
+    for modulo in args.modulos:
+        try:
+            print(informe(modulo, args.n))
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            fallos += 1
+        print()
+    sys.exit(1 if fallos else 0)
@@ -0,0 +1,138 @@
+"""
+Trabajos en segundo plano para la ventana de Tk.
+
+El trabajo pesado (leer y escribir el Excel, procesar facturas, llamar a la
+IA) se ejecuta en un grupo de hilos; sus resultados, errores y avisos de
+progreso llegan por una cola que la ventana vacía con `after`, de modo que
+los callbacks siempre se ejecutan en el hilo de Tk y la ventana no se
+congela. Cada trabajo se puede cancelar: la función recibe el Trabajo y
+deja de avanzar en cuanto llama a `progreso` o `comprobar` tras cancelarse.
+"""
+import itertools
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+HILOS = 2
+INTERVALO_MS = 50
+
+log = logging.getLogger(__name__)
+
+
+class Cancelado(Exception):
+    pass
+
+
+class Trabajo:
+
+    def __init__(self, id_, gestor, al_terminar, al_fallar, al_progresar):
+        self.id = id_
+        self._gestor = gestor
+        self._cancelado = threading.Event()
+        self.al_terminar = al_terminar
+        self.al_fallar = al_fallar
+        self.al_progresar = al_progresar
+        self.futuro = None
+
+    @property
+    def cancelado(self):
+        return self._cancelado.is_set()
+
+    def cancelar(self):
+        self._cancelado.set()
+        if self.futuro is not None:
+            self.futuro.cancel()  # si aún no había empezado, ya no empieza
+
+    def comprobar(self):
+        """
+        Lanza Cancelado si se ha pedido cancelar. Para llamarlo entre pasos.
+        """
+        if self._cancelado.is_set():
+            raise Cancelado()
+
+    def progreso(self, hechos, total):
+        """
+        Avisa del avance a la ventana (sirve directamente como
+        progreso_callback) y corta el trabajo si se ha cancelado.
+        """
+        self.comprobar()
+        self._gestor._avisar(self, 'progreso', (hechos, total))
+
+
+class GestorTrabajos:
+
+    def __init__(self, raiz, hilos=HILOS, intervalo=INTERVALO_MS):
+        self.raiz = raiz
+        self.intervalo = intervalo
+        self._pool = ThreadPoolExecutor(hilos, thread_name_prefix='trabajo')
+        self._cola = queue.Queue()
+        self._ids = itertools.count(1)
+        self._activos = 0
+        self._sondeando = False
+
+    def lanzar(self, funcion, *args, al_terminar=None, al_fallar=None, al_progresar=None, **kwargs):
+        """
+        Ejecuta `funcion(trabajo, *args, **kwargs)` en segundo plano. Los
+        callbacks se llaman en el hilo de Tk: al_terminar(resultado),
+        al_fallar(excepción) y al_progresar(hechos, total). Un trabajo
+        cancelado no llama a ninguno.
+        """
+        trabajo = Trabajo(next(self._ids), self, al_terminar, al_fallar, al_progresar)
+        self._activos += 1
+        trabajo.futuro = self._pool.submit(self._ejecutar, trabajo, funcion, args, kwargs)
+        trabajo.futuro.add_done_callback(lambda futuro: self._si_no_empezo(trabajo, futuro))
+        self._sondear()
+        return trabajo
+
+    def _si_no_empezo(self, trabajo, futuro):
+        # Cancelado antes de empezar: _ejecutar no llegará a avisar
+        if futuro.cancelled():
+            self._avisar(trabajo, 'fin', None)
+
+    def _ejecutar(self, trabajo, funcion, args, kwargs):
+        try:
+            resultado = funcion(trabajo, *args, **kwargs)
+        except Cancelado:
+            self._avisar(trabajo, 'fin', None)
+        except Exception as e:
+            log.exception('Error en segundo plano')
+            self._avisar(trabajo, 'error', e)
+        else:
+            self._avisar(trabajo, 'resultado', resultado)
+
+    def _avisar(self, trabajo, tipo, dato):
+        self._cola.put((trabajo, tipo, dato))
+
+    def _sondear(self):
+        if self._sondeando:
+            return
+        self._sondeando = True
+        self.raiz.after(self.intervalo, self._vaciar)
+
+    def _vaciar(self):
+        self._sondeando = False
+        while True:
+            try:
+                (trabajo, tipo, dato) = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if tipo != 'progreso':
+                self._activos -= 1
+            if trabajo.cancelado:
+                continue
+            try:
+                if tipo == 'progreso' and trabajo.al_progresar:
+                    trabajo.al_progresar(*dato)
+                elif tipo == 'resultado' and trabajo.al_terminar:
+                    trabajo.al_terminar(dato)
+                elif tipo == 'error' and trabajo.al_fallar:
+                    trabajo.al_fallar(dato)
+            except Exception:
+                log.exception('Error en el callback de un trabajo')
+        # Solo se sigue sondeando mientras quede algún trabajo en marcha
+        if self._activos > 0:
+            self._sondear()
+
+    def cerrar(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,160 @@
+"""
+Ventana de alta múltiple: una rejilla para teclear un albarán entero y
+guardarlo de una vez con altas_compras.agregar_lineas.
+
+El proveedor y la fecha de la cabecera se usan en las filas que los dejan
+en blanco, y la familia de los productos que no están en el libro se
+propone con la hoja Familias (familias.familias_del_libro). "Revisar" completa las familias y muestra las alertas de precio
+sin guardar; "Guardar todo" guarda las filas en segundo plano (ver
+trabajos.py) y cierra la ventana si no hay errores. Las líneas que ya están
+en el libro se marcan, pero se guardan: pueden ser una compra repetida de
+verdad.
+"""
+import tkinter as tk
+from tkinter import messagebox, ttk
+
+from altas_compras import preparar_lineas, agregar_lineas, NUEVO, MAS_CARO, MAS_BARATO, IGUAL
+from familias import familias_del_libro
+
+COLUMNAS = (('Producto', 25), ('Familia', 18), ('Proveedor', 18), ('Cantidad', 9), ('Importe', 9), ('Fecha', 11))
+FILAS_INICIALES = 15
+FILAS_MAS = 10
+
+TEXTOS_ALERTA = {
+    NUEVO: ('Proveedor nuevo', 'blue'),
+    MAS_CARO: ('Más caro que el último ({:.2f} €/u)', 'red'),
+    MAS_BARATO: ('Más barato que el último ({:.2f} €/u)', 'green'),
+    IGUAL: ('Igual que el último ({:.2f} €/u)', 'black')}
+
+
+class VentanaAltas:
+
+    def __init__(self, parent, trabajos, al_guardar=None):
+        self.trabajos = trabajos
+        self.al_guardar = al_guardar
+        self.ventana = tk.Toplevel(parent)
+        self.ventana.title('Alta múltiple')
+        self.ventana.transient(parent)
+        self.filas = []
+
+        cabecera = ttk.Frame(self.ventana, padding=10)
+        cabecera.pack(fill='x')
+        ttk.Label(cabecera, text='Proveedor').pack(side='left')
+        self.proveedor = ttk.Entry(cabecera, width=20)
+        self.proveedor.pack(side='left', padx=(5, 15))
+        ttk.Label(cabecera, text='Fecha (DD/MM/YYYY)').pack(side='left')
+        self.fecha = ttk.Entry(cabecera, width=12)
+        self.fecha.pack(side='left', padx=5)
+
+        contenedor = ttk.Frame(self.ventana)
+        contenedor.pack(fill='both', expand=True, padx=10)
+        lienzo = tk.Canvas(contenedor, highlightthickness=0, height=400)
+        barra = ttk.Scrollbar(contenedor, orient='vertical', command=lienzo.yview)
+        self.rejilla = ttk.Frame(lienzo)
+        self.rejilla.bind('<Configure>', lambda e: lienzo.configure(scrollregion=lienzo.bbox('all')))
+        lienzo.create_window((0, 0), window=self.rejilla, anchor='nw')
+        lienzo.configure(yscrollcommand=barra.set)
+        lienzo.pack(side='left', fill='both', expand=True)
+        barra.pack(side='right', fill='y')
+        for columna, (nombre, _) in enumerate(COLUMNAS):
+            ttk.Label(self.rejilla, text=nombre).grid(row=0, column=columna, sticky='w')
+        ttk.Label(self.rejilla, text='Aviso').grid(row=0, column=len(COLUMNAS), sticky='w')
+        self.agregar_filas(FILAS_INICIALES)
+
+        botones = ttk.Frame(self.ventana, padding=10)
+        botones.pack(fill='x')
+        self.estado = ttk.Label(botones)
+        self.estado.pack(side='left')
+        self.btn_guardar = ttk.Button(botones, text='Guardar todo', command=self.guardar)
+        self.btn_guardar.pack(side='right')
+        self.btn_revisar = ttk.Button(botones, text='Revisar', command=self.revisar)
+        self.btn_revisar.pack(side='right', padx=5)
+        ttk.Button(botones, text=f'+{FILAS_MAS} filas', command=lambda: self.agregar_filas(FILAS_MAS)).pack(side='right')
+
+    def agregar_filas(self, n):
+        for _ in range(n):
+            fila = len(self.filas) + 1
+            celdas = []
+            for columna, (_, ancho) in enumerate(COLUMNAS):
+                celda = ttk.Entry(self.rejilla, width=ancho)
+                celda.grid(row=fila, column=columna, padx=1, pady=1)
+                celdas.append(celda)
+            aviso = ttk.Label(self.rejilla, width=38)
+            aviso.grid(row=fila, column=len(COLUMNAS), sticky='w', padx=(5, 0))
+            self.filas.append((celdas, aviso))
+
+    def _lineas(self):
+        """
+        (número de fila en la rejilla, dict) de las filas no vacías.
+        """
+        comunes = {'Proveedor': self.proveedor.get(), 'Fecha': self.fecha.get()}
+        lineas = []
+        for numero, (celdas, aviso) in enumerate(self.filas):
+            valores = {nombre: celda.get().strip() for (nombre, _), celda in zip(COLUMNAS, celdas)}
+            aviso.config(text='')
+            if not any(valores.values()):
+                continue
+            for campo, valor in comunes.items():
+                if not valores[campo]:
+                    valores[campo] = valor
+            lineas.append((numero, valores))
+        return lineas
+
+    def _mostrar(self, numeros, lote):
+        repetidas = set(lote.repetidas)
+        for posicion, motivo in lote.errores:
+            self.filas[numeros[posicion]][1].config(text=motivo, foreground='red')
+        for fila, alerta in zip(lote.filas, lote.alertas):
+            (celdas, aviso) = self.filas[numeros[alerta.indice]]
+            familia = celdas[1]
+            if not familia.get().strip():
+                familia.insert(0, fila['Familia'])
+            if alerta.indice in repetidas:
+                aviso.config(text='Posible repetida: ya está en el libro', foreground='orange')
+            elif alerta.tipo in TEXTOS_ALERTA:
+                (texto, color) = TEXTOS_ALERTA[alerta.tipo]
+                aviso.config(text=texto.format(alerta.ultimo or 0), foreground=color)
+
+    def _lanzar(self, funcion, al_terminar):
+        lineas = self._lineas()
+        if not lineas:
+            return
+        numeros = [numero for numero, _ in lineas]
+        valores = [linea for _, linea in lineas]
+        self.btn_guardar.config(state='disabled')
+        self.btn_revisar.config(state='disabled')
+
+        def fin(lote):
+            self.btn_guardar.config(state='normal')
+            self.btn_revisar.config(state='normal')
+            self._mostrar(numeros, lote)
+            al_terminar(lote)
+
+        def fallido(error):
+            self.btn_guardar.config(state='normal')
+            self.btn_revisar.config(state='normal')
+            messagebox.showerror('Error', f'No se pudieron procesar las líneas: {error}', parent=self.ventana)
+
+        # Con la tabla de familias, los productos nuevos se clasifican solos
+        self.trabajos.lanzar(lambda trabajo: funcion(valores, familias_del_libro()),
+                             al_terminar=fin, al_fallar=fallido)
+
+    def revisar(self):
+        self._lanzar(preparar_lineas, lambda lote: self.estado.config(
+            text=f'{len(lote.filas)} líneas correctas, {len(lote.errores)} con errores, '
+                 f'{len(lote.repetidas)} posibles repetidas'))
+
+    def guardar(self):
+        def guardado(lote):
+            if lote.errores:
+                self.estado.config(text=f'No se ha guardado nada: {len(lote.errores)} líneas con errores')
+                return
+            messagebox.showinfo('Éxito', f'{len(lote.filas)} líneas añadidas', parent=self.ventana)
+            self.ventana.destroy()
+            if self.al_guardar:
+                self.al_guardar()
+        self._lanzar(agregar_lineas, guardado)
+
+
+def abrir_ventana_altas(parent, trabajos, al_guardar=None):
+    return VentanaAltas(parent, trabajos, al_guardar)
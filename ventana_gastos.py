@@ -0,0 +1,184 @@
+"""
+Ventana de totales y comparativas de gasto sobre los agregados del libro
+(agregados_gastos.obtener_agregados). Se abre junto a Control de Gastos
+(gastos.py), que sigue siendo la ventana de gastos de siempre.
+
+"Totales" muestra el gasto agrupado por mes, familia o proveedor con los
+filtros de la cabecera; "Comparar" pone dos periodos lado a lado con la
+diferencia y la variación. Las consultas se hacen en segundo plano (ver
+trabajos.py): la primera puede tener que cargar el libro.
+"""
+import re
+import tkinter as tk
+from tkinter import messagebox, ttk
+
+from agregados_gastos import obtener_agregados, DIMENSIONES
+
+COLUMNAS_TOTALES = (('importe', 'Importe', '{:,.2f} €'), ('cantidad', 'Cantidad', '{:,.2f}'),
+                    ('compras', 'Compras', '{:d}'))
+COLUMNAS_COMPARAR = (('importe_a', 'Periodo A', '{:,.2f} €'), ('importe_b', 'Periodo B', '{:,.2f} €'),
+                     ('diferencia', 'Diferencia', '{:+,.2f} €'), ('variacion', 'Variación', '{:+.1f} %'))
+
+_RE_MES = re.compile(r'(\d{1,2})[/-](\d{4})|(\d{4})-(\d{1,2})')
+
+
+def mes_de(texto):
+    """
+    'YYYY-MM' de un mes tecleado como 'MM/AAAA' o 'AAAA-MM'; None si está
+    en blanco. ValueError si no es un mes.
+    """
+    texto = texto.strip()
+    if not texto:
+        return None
+    m = _RE_MES.fullmatch(texto)
+    if m is None:
+        raise ValueError(f'Mes no válido: {texto} (MM/AAAA)')
+    (mes, anio) = (m.group(1), m.group(2)) if m.group(1) else (m.group(4), m.group(3))
+    if not 1 <= int(mes) <= 12:
+        raise ValueError(f'Mes no válido: {texto} (MM/AAAA)')
+    return f'{anio}-{int(mes):02d}'
+
+
+def _texto(formato, valor):
+    if valor != valor:  # NaN: variación sin importe en el periodo A
+        return ''
+    return formato.format(int(valor) if formato == '{:d}' else valor)
+
+
+def _crear_tabla(padre, columnas):
+    marco = ttk.Frame(padre)
+    marco.pack(fill='both', expand=True, pady=(10, 0))
+    tree = ttk.Treeview(marco, columns=['grupo'] + [c for c, _, _ in columnas], show='headings', height=18)
+    tree.heading('grupo', text='')
+    tree.column('grupo', width=220, anchor='w')
+    for columna, titulo, _ in columnas:
+        tree.heading(columna, text=titulo)
+        tree.column(columna, width=120, anchor='e')
+    barra = ttk.Scrollbar(marco, orient='vertical', command=tree.yview)
+    tree.configure(yscrollcommand=barra.set)
+    tree.pack(side='left', fill='both', expand=True)
+    barra.pack(side='right', fill='y')
+    return tree
+
+
+def _llenar(tree, df, columnas, titulo):
+    tree.delete(*tree.get_children())
+    tree.heading('grupo', text=titulo)
+    for grupo, fila in zip(df.index, df.itertuples(index=False)):
+        valores = fila._asdict()
+        etiqueta = ' / '.join(map(str, grupo)) if isinstance(grupo, tuple) else str(grupo)
+        tree.insert('', 'end', values=[etiqueta or '(sin fecha)'] +
+                    [_texto(formato, valores[c]) for c, _, formato in columnas])
+
+
+class VentanaGastos:
+
+    def __init__(self, parent, trabajos):
+        self.trabajos = trabajos
+        self.ventana = tk.Toplevel(parent)
+        self.ventana.title('Totales y comparativas de gasto')
+        self.ventana.transient(parent)
+        pestanas = ttk.Notebook(self.ventana)
+        pestanas.pack(fill='both', expand=True, padx=10, pady=10)
+        self._crear_totales(pestanas)
+        self._crear_comparar(pestanas)
+        self.estado = ttk.Label(self.ventana, padding=(10, 0, 10, 10))
+        self.estado.pack(fill='x')
+        self.totales()
+
+    def _entrada(self, padre, texto, ancho=10):
+        ttk.Label(padre, text=texto).pack(side='left')
+        entrada = ttk.Entry(padre, width=ancho)
+        entrada.pack(side='left', padx=(5, 15))
+        return entrada
+
+    def _crear_totales(self, pestanas):
+        pestana = ttk.Frame(pestanas, padding=10)
+        pestanas.add(pestana, text='Totales')
+        filtros = ttk.Frame(pestana)
+        filtros.pack(fill='x')
+        self.desde = self._entrada(filtros, 'Desde (MM/AAAA)')
+        self.hasta = self._entrada(filtros, 'Hasta (MM/AAAA)')
+        self.familia = self._entrada(filtros, 'Familia', 15)
+        self.proveedor = self._entrada(filtros, 'Proveedor', 15)
+        ttk.Label(filtros, text='Agrupar por').pack(side='left')
+        self.por = ttk.Combobox(filtros, values=DIMENSIONES, state='readonly', width=10)
+        self.por.set('mes')
+        self.por.pack(side='left', padx=5)
+        self.btn_totales = ttk.Button(filtros, text='Ver totales', command=self.totales)
+        self.btn_totales.pack(side='right')
+        self.tabla_totales = _crear_tabla(pestana, COLUMNAS_TOTALES)
+
+    def _crear_comparar(self, pestanas):
+        pestana = ttk.Frame(pestanas, padding=10)
+        pestanas.add(pestana, text='Comparar periodos')
+        periodos = ttk.Frame(pestana)
+        periodos.pack(fill='x')
+        self.periodos = []
+        for nombre in ('A', 'B'):
+            fila = ttk.Frame(periodos)
+            fila.pack(fill='x', pady=2)
+            ttk.Label(fila, text=f'Periodo {nombre}', width=10).pack(side='left')
+            self.periodos.append((self._entrada(fila, 'Desde (MM/AAAA)'), self._entrada(fila, 'Hasta (MM/AAAA)')))
+        opciones = ttk.Frame(pestana)
+        opciones.pack(fill='x', pady=(5, 0))
+        ttk.Label(opciones, text='Comparar por').pack(side='left')
+        self.por_comparar = ttk.Combobox(opciones, values=DIMENSIONES, state='readonly', width=10)
+        self.por_comparar.set('familia')
+        self.por_comparar.pack(side='left', padx=5)
+        self.btn_comparar = ttk.Button(opciones, text='Comparar', command=self.comparar)
+        self.btn_comparar.pack(side='right')
+        self.tabla_comparar = _crear_tabla(pestana, COLUMNAS_COMPARAR)
+
+    def _lanzar(self, consulta, al_terminar):
+        botones = (self.btn_totales, self.btn_comparar)
+        for boton in botones:
+            boton.config(state='disabled')
+
+        def fin(resultado):
+            for boton in botones:
+                boton.config(state='normal')
+            al_terminar(resultado)
+
+        def fallido(error):
+            for boton in botones:
+                boton.config(state='normal')
+            messagebox.showerror('Error', f'No se pudo consultar el gasto: {error}', parent=self.ventana)
+
+        self.trabajos.lanzar(lambda trabajo: consulta(), al_terminar=fin, al_fallar=fallido)
+
+    def totales(self):
+        try:
+            desde = mes_de(self.desde.get())
+            hasta = mes_de(self.hasta.get())
+        except ValueError as e:
+            messagebox.showerror('Error', str(e), parent=self.ventana)
+            return
+        por = self.por.get()
+        familia = self.familia.get().strip() or None
+        proveedor = self.proveedor.get().strip() or None
+
+        def mostrar(df):
+            _llenar(self.tabla_totales, df, COLUMNAS_TOTALES, por.capitalize())
+            self.estado.config(text=f'Total: {df["importe"].sum():,.2f} € en {int(df["compras"].sum())} compras')
+
+        self._lanzar(lambda: obtener_agregados().totales((por,), desde, hasta, familia, proveedor), mostrar)
+
+    def comparar(self):
+        try:
+            (periodo_a, periodo_b) = [(mes_de(desde.get()), mes_de(hasta.get())) for desde, hasta in self.periodos]
+        except ValueError as e:
+            messagebox.showerror('Error', str(e), parent=self.ventana)
+            return
+        por = self.por_comparar.get()
+
+        def mostrar(df):
+            _llenar(self.tabla_comparar, df, COLUMNAS_COMPARAR, por.capitalize())
+            diferencia = df['diferencia'].sum()
+            self.estado.config(text=f'Diferencia total: {diferencia:+,.2f} €')
+
+        self._lanzar(lambda: obtener_agregados().comparar(periodo_a, periodo_b, por), mostrar)
+
+
+def abrir_ventana_gastos(parent, trabajos):
+    return VentanaGastos(parent, trabajos)
@@ -0,0 +1,158 @@
+"""
+Vigilancia de la carpeta de entrada de facturas.
+
+En vez de recorrer toda la carpeta en cada escaneo, detecta solo los
+archivos nuevos y los entrega en lotes pequeños en cuanto están completos:
+  - Con watchdog instalado, el sistema avisa de los cambios (inotify,
+    ReadDirectoryChangesW...). Sin él, se mira la fecha de modificación de
+    la carpeta, que solo cambia cuando entra o sale un archivo, y solo
+    entonces se lista.
+  - Un archivo se da por completo cuando su tamaño y fecha no cambian
+    durante ESTABILIDAD segundos y se puede abrir (no se está copiando).
+  - Un archivo ya entregado no se vuelve a entregar salvo que cambie; los
+    que fallan se quedan en la carpeta sin reintentarse en bucle.
+No crea hilos propios para procesar: `revisar()` es barato y la ventana lo
+llama periódicamente con `after`, lanzando cada lote como un trabajo. El
+trabajo devuelve con `reintentar` los lotes que fallan desde su hilo, así
+que el estado de los archivos va protegido por un bloqueo.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+ESTABILIDAD = 3.0
+TAM_LOTE = 20
+REINTENTO = 60.0
+INTERVALO_MS = 2000
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+
+def _firma(ruta):
+    st = os.stat(ruta)
+    return (st.st_size, st.st_mtime_ns)
+
+
+class VigilanteCarpeta:
+
+    def __init__(self, carpeta, extensiones, estabilidad=ESTABILIDAD, tam_lote=TAM_LOTE,
+                 reintento=REINTENTO, usar_watchdog=True, reloj=time.monotonic):
+        self.carpeta = Path(carpeta)
+        self.extensiones = {e.lower() for e in extensiones}
+        self.estabilidad = estabilidad
+        self.tam_lote = tam_lote
+        self.reintento = reintento
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self._candidatos = {}  # ruta -> (firma, desde cuándo no cambia)
+        self._entregados = {}  # ruta -> firma con la que se entregó
+        self._firma_carpeta = None
+        self._cambios = threading.Event()
+        self._cambios.set()  # la primera revisión siempre lista la carpeta
+        self._observador = None
+        self._usar_watchdog = usar_watchdog and Observer is not None
+
+    def iniciar(self):
+        if self._usar_watchdog and self._observador is None:
+            cambios = self._cambios
+
+            class _Aviso(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    cambios.set()
+
+            self._observador = Observer()
+            self._observador.schedule(_Aviso(), str(self.carpeta), recursive=False)
+            self._observador.daemon = True
+            self._observador.start()
+        return self
+
+    def detener(self):
+        if self._observador is not None:
+            self._observador.stop()
+            self._observador = None
+
+    def _hay_cambios(self):
+        if self._observador is not None:
+            hay = self._cambios.is_set()
+            self._cambios.clear()
+            return hay
+        firma = os.stat(self.carpeta).st_mtime_ns
+        if firma != self._firma_carpeta or self._cambios.is_set():
+            self._firma_carpeta = firma
+            self._cambios.clear()
+            return True
+        return False
+
+    def _listar(self):
+        ahora = self._reloj()
+        presentes = set()
+        with os.scandir(self.carpeta) as entradas:
+            for entrada in entradas:
+                ruta = Path(entrada.path)
+                if not entrada.is_file() or ruta.suffix.lower() not in self.extensiones:
+                    continue
+                presentes.add(ruta)
+                entregado = self._entregados.get(ruta)
+                if entregado is not None:
+                    st = entrada.stat()
+                    if entregado == (st.st_size, st.st_mtime_ns):
+                        continue
+                    # Se ha sustituido desde que se entregó: vuelve a ser nuevo
+                    del self._entregados[ruta]
+                if ruta not in self._candidatos:
+                    self._candidatos[ruta] = (None, ahora)
+        # Lo que ya no está (movido a destino o borrado) se olvida
+        for ruta in set(self._entregados) - presentes:
+            del self._entregados[ruta]
+        for ruta in set(self._candidatos) - presentes:
+            del self._candidatos[ruta]
+
+    def revisar(self):
+        """
+        Lotes (listas de rutas, como mucho tam_lote cada una) de archivos
+        nuevos ya completos. Marca como entregados los que devuelve.
+        """
+        with self._lock:
+            if self._hay_cambios():
+                self._listar()
+            ahora = self._reloj()
+            listos = []
+            for ruta, (firma, desde) in list(self._candidatos.items()):
+                try:
+                    actual = _firma(ruta)
+                except OSError:
+                    del self._candidatos[ruta]
+                    continue
+                if actual != firma:
+                    self._candidatos[ruta] = (actual, ahora)
+                elif ahora - desde >= self.estabilidad and actual[0] > 0 and self._se_puede_abrir(ruta):
+                    listos.append(ruta)
+            listos.sort()
+            for ruta in listos:
+                self._entregados[ruta] = self._candidatos.pop(ruta)[0]
+        return [listos[i:i + self.tam_lote] for i in range(0, len(listos), self.tam_lote)]
+
+    def reintentar(self, lote):
+        """
+        Devuelve un lote que no se pudo procesar: se volverá a entregar
+        pasados `reintento` segundos. Se puede llamar desde cualquier hilo.
+        """
+        cuando = self._reloj() + self.reintento - self.estabilidad
+        with self._lock:
+            for ruta in lote:
+                firma = self._entregados.pop(ruta, None)
+                if firma is not None:
+                    self._candidatos[ruta] = (firma, cuando)
+
+    @staticmethod
+    def _se_puede_abrir(ruta):
+        try:
+            with open(ruta, 'rb'):
+                return True
+        except OSError:
+            return False